@@ -1,10 +1,12 @@
 import numpy as np
 
-from backend.sensors_manager import distToPointSingleIRSensor, sensorArray
-from backend.utils import get_timestamp, twoPointDistance
+from backend.measurement_store import MeasurementStore
+from backend.sensors_manager import sensorCalibration
+from backend.utils import get_timestamp
 
 sample_description = ""
-saved_measurement = []
+# captured measurements, sorted by Z
+saved_measurement = MeasurementStore()
 
 # calibration settings
 ring_diameter = 0.0
@@ -42,18 +44,19 @@ def set_sampleDescription(description):
     sample_description = description
 
 
-def save_measurements(array):
+def save_measurements(array, number_of_samples=None):
     global saved_measurement
 
-    saved_measurement.append(array)
+    saved_measurement.add(array, number_of_samples)
 
 
-# Sorts the measurements list for preview display and text file generation.
+# Sorts a list of measurements by Z, their last value. The saved measurements are always
+# sorted already.
 def sort_ByZeta(array):
     if not array:
         print("Array must not be empty")
 
-    array.sort(key=lambda x: x[len(array) - 1])
+    array.sort(key=lambda x: x[-1])
 
     return array
 
@@ -66,80 +69,59 @@ def delete_measurement(array):
     """
     global saved_measurement
 
-    if not array:
-        return saved_measurement
-
-    adjust = 0
-    for i in range(0, len(array)):
-        del saved_measurement[array[i] - adjust]
-        adjust += 1
+    saved_measurement.delete(array)
 
     return saved_measurement
 
 
-def extract_data_from_saved_measurements():
+def extract_data_from_saved_measurements(measurements=None, calibration=None):
     """
     Translates recorded distances into rectangular coordinates.
 
+    :param measurements: MeasurementStore to translate; the saved measurements if None
+    :param calibration: SensorCalibration of the ring they were taken with; the program's if None
     :return: x, y, z coordinates for each snapshot, along with its centroid and average diameter
     return format = ((xS, yS, zS), (centroid_xS, centroid_yS, centroid_zS), avg_diameters)
     """
-    # surface coordinates
-    temp_xS = []
-    temp_yS = []
-    temp_zS = []
-
-    # centroid coordinates
-    temp_centroid_xS = []
-    temp_centroid_yS = []
-    temp_centroid_zS = []
-
-    # average diameters; correspond to the centroid zS
-    temp_average_diameters = []
-
-    # convert captured measurements into rectangular coordinates
-    for sensor_data in saved_measurement:
-        # reading from sensor Z * applied calibration factor
-        z = sensor_data[-1] * sensorArray[-1].factor
-
-        # store diameters here to calculate average
-        temp_diameters = []
+    measurements = saved_measurement if measurements is None else measurements
+    calibration = sensorCalibration if calibration is None else calibration
 
-        # convert IR sensor readings to x, y
-        for i in range(len(sensor_data) - 1):
-            (x, y) = distToPointSingleIRSensor(s=sensorArray[i], distanceMeasured=sensor_data[i])
+    if not measurements:
+        return ([], [], []), ([], [], []), []
 
-            # radius
-            r = twoPointDistance((x, y), (0.0, 0.0))
+    # one row per snapshot, one column per sensor; sensor Z is the last one
+    (snapshots, samples) = measurements.snapshot()
 
-            # save diameter for average
-            temp_diameters.append(r * 2.0)
+    # reading from sensor Z * applied calibration factor
+    zS = snapshots[:, -1] * calibration.z_factor
 
-            # save them separately
-            temp_xS.append(x)
-            temp_yS.append(y)
-            temp_zS.append(z)
+    # convert IR sensor readings to x, y; one row per snapshot
+    (xS, yS) = calibration.dist_to_points(snapshots[:, :-1])
 
-        # calculate centroid for this group of sensor data
-        centroid_x = np.mean(temp_xS)
-        centroid_y = np.mean(temp_yS)
+    # centroid of each snapshot
+    centroid_xS = xS.mean(axis=1)
+    centroid_yS = yS.mean(axis=1)
 
-        # save them separately
-        temp_centroid_xS.append(centroid_x)
-        temp_centroid_yS.append(centroid_y)
-        temp_centroid_zS.append(z)
+    # average diameter of each snapshot
+    average_diameters = (np.hypot(xS, yS) * 2.0).mean(axis=1)
 
-        # calculate average diameter
-        average_diameter = np.mean(temp_diameters)
-        temp_average_diameters.append(average_diameter)
+    # every point of a snapshot is at its Z
+    point_zS = np.repeat(zS, xS.shape[1])
 
-    return ((temp_xS, temp_yS, temp_zS), (temp_centroid_xS, temp_centroid_yS, temp_centroid_zS), temp_average_diameters)
+    return ((xS.ravel().tolist(), yS.ravel().tolist(), point_zS.tolist()),
+            (centroid_xS.tolist(), centroid_yS.tolist(), zS.tolist()), average_diameters.tolist())
 
 
-def generate_text_file(file_path):
+def generate_text_file(file_path, measurements=None, calibration=None):
+    """
+    Writes the coordinates of the saved measurements, or of those of a ring given by measurements and calibration.
+    """
     global sample_description
 
-    ((xS, yS, zS), (centroid_xS, centroid_yS, centroid_zS), avg_diameters) = extract_data_from_saved_measurements()
+    measurements = saved_measurement if measurements is None else measurements
+
+    ((xS, yS, zS), (centroid_xS, centroid_yS, centroid_zS), avg_diameters) = \
+        extract_data_from_saved_measurements(measurements, calibration)
 
     try:
         f = open(file_path, "w+")
@@ -172,6 +154,14 @@ def generate_text_file(file_path):
             f.write("%s, %s\n" % (z, avg_diameter))
         f.write("\n")
 
+        # write how many samples each measurement was taken from
+        f.write("Samples per measurement:\n")
+        f.write("z, samples\n")
+        (snapshots, samples) = measurements.snapshot()
+        for (z, number_of_samples) in zip(centroid_zS, samples):
+            f.write("%s, %s\n" % (z, number_of_samples or None))
+        f.write("\n")
+
         f.close()
         return True
 
@@ -0,0 +1,115 @@
+"""
+Benchmark of the BPC acquisition pipeline: connection, live feed, and captures, through the acquisition service.
+
+Runs against the simulated Arduino by default, so no hardware is needed; pass --url to use another port. With
+several rigs (--url more than once, or --rigs), they capture at the same time, each with its own acquisition service.
+
+Usage:
+    python -m backend.bpc_benchmark [--url URL ...] [--rigs N] [--captures N] [--fixed-samples N | --adaptive]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import backend.sensors_manager as sensors_manager
+from backend.bpc_rigs import Rig, connect_rigs, capture_all, shutdown_rigs
+
+DEFAULT_URL = "arduinosim://?rate=100&noise=0.05&seed=0"
+
+
+def connect(rigs, timeout):
+    """
+    Connects every rig and waits for their handshakes.
+
+    :return: seconds it took
+    :raise IOError: if an Arduino is missing, or didn't answer in time
+    """
+    start = time.perf_counter()
+
+    if len(connect_rigs(rigs, timeout)) < len(rigs):
+        raise IOError("could not connect to every Arduino")
+
+    return time.perf_counter() - start
+
+
+def run_benchmark(rigs, captures, timeout=30, out=sys.stdout):
+    """
+    Connects, takes a number of captures one after the other on every rig at once, and reports how long everything
+    took.
+
+    :param rigs: the rigs to benchmark
+    :param captures: number of captures per rig
+    :param timeout: seconds to wait for each step
+    :param out: stream to write the report on
+    """
+    connect_time = connect(rigs, timeout)
+    out.write("%s rig(s) connected in %.3fs\n" % (len(rigs), connect_time))
+
+    feed_start = time.perf_counter()
+    latencies = []
+    samples = []
+
+    for i in range(captures):
+        start = time.perf_counter()
+        results = capture_all(rigs, timeout)
+        latencies.append(time.perf_counter() - start)
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise IOError("capture failed: %s" % result)
+            samples.append(result[1])
+
+    feed_time = time.perf_counter() - feed_start
+    frames = sum(rig.acquisition.recent_frames.count for rig in rigs if rig.acquisition.recent_frames is not None)
+    malformed = sum(rig.connection.malformed_frames for rig in rigs)
+
+    latencies = np.array(latencies) * 1000.0
+    out.write("%s captures per rig in %.3fs (%.1f captures/sec over all rigs)\n" % (
+        captures, feed_time, captures * len(rigs) / feed_time if feed_time > 0 else 0.0))
+    out.write("capture latency (ms): mean %.1f, min %.1f, p95 %.1f, max %.1f\n" % (
+        latencies.mean(), latencies.min(), np.percentile(latencies, 95), latencies.max()))
+    out.write("samples per capture: mean %.1f, min %s, max %s\n" % (np.mean(samples), min(samples), max(samples)))
+    out.write("feed: %s frames (%.1f frames/sec), %s malformed\n" % (
+        frames, frames / feed_time if feed_time > 0 else 0.0, malformed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the BPC acquisition pipeline.")
+    parser.add_argument("--url", action="append",
+                        help="port or pyserial URL of an Arduino; once per rig (default: %s)" % DEFAULT_URL)
+    parser.add_argument("--rigs", type=int, default=1,
+                        help="number of simulated rigs, when no --url is given (default: 1)")
+    parser.add_argument("--captures", type=int, default=20, help="number of captures per rig (default: 20)")
+    samples = parser.add_mutually_exclusive_group()
+    samples.add_argument("--fixed-samples", type=int,
+                         help="take this many samples per capture (default: %s)" % sensors_manager.numberOfSamples)
+    samples.add_argument("--adaptive", action="store_true",
+                         help="sample each capture until the readings are steady, as BAMBOO_ADAPTIVE_SAMPLING=1 does")
+
+    args = parser.parse_args(argv)
+
+    # simulated rigs differ by their seed
+    urls = args.url or [DEFAULT_URL.replace("seed=0", "seed=%s" % i) for i in range(args.rigs)]
+    rigs = [Rig(url, name="rig%s" % (i + 1)) for (i, url) in enumerate(urls)]
+
+    if args.fixed_samples is not None:
+        sensors_manager.adaptiveSampling = False
+        sensors_manager.numberOfSamples = args.fixed_samples
+    elif args.adaptive:
+        sensors_manager.adaptiveSampling = True
+
+    try:
+        run_benchmark(rigs, args.captures)
+    except IOError as e:
+        print(e)
+        return 1
+    finally:
+        shutdown_rigs(rigs)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Several measuring rings read at once, each with an Arduino of its own.
+
+A rig has its own serial connection, acquisition service (with its own thread), sensor calibration, and
+measurements, so a slow or unplugged Arduino holds up nothing but its own ring. Rigs are found with
+findArduinoPorts: every port with an Arduino, or the ports and URLs in BAMBOO_ARDUINO_URL, separated by spaces.
+
+Run it to measure with every rig at once: each one is connected and calibrated, captures a measurement whenever
+Enter is pressed (or a fixed number of them, one after the other, with --captures), and its coordinates are written
+to a text file of its own.
+
+Usage:
+    python -m backend.bpc_rigs --ring-diameter CM --object-diameter CM --z-distance CM [--url URL ...]
+                               [--captures N] [--output-dir DIR]
+"""
+import argparse
+import os
+import sys
+import threading
+from datetime import datetime
+
+from backend.bpc import generate_text_file
+from backend.bpc_threading import AcquisitionService
+from backend.measurement_store import MeasurementStore
+from backend.sensors_manager import ArduinoConnection, SensorCalibration, findArduinoPorts
+
+
+class Rig(object):
+    """
+    One measuring ring and its Arduino.
+
+    :param url: port or pyserial URL of the Arduino
+    :param name: name to tell the rig apart by; the URL if None
+    """
+
+    def __init__(self, url, name=None):
+        self.url = url
+        self.name = url if name is None else name
+
+        self.connection = ArduinoConnection(url)
+        self.calibration = SensorCalibration()
+        self.measurements = MeasurementStore()
+
+        self.acquisition = AcquisitionService(self.connection, self.calibration, self.measurements,
+                                              name="AcquisitionService-%s" % self.name)
+
+    def connect(self, timeout):
+        """
+        Connects the acquisition service and waits for the handshake.
+
+        :return: whether the Arduino answered in time
+        """
+        events = []
+        answered = threading.Event()
+
+        def on_event(event, *args):
+            events.append(event)
+            answered.set()
+
+        self.acquisition.add_listener(on_event)
+
+        try:
+            self.acquisition.connect()
+            return answered.wait(timeout) and events[0] == "connected"
+        finally:
+            self.acquisition.remove_listener(on_event)
+
+    def calibrate(self, ring_diameter, calibration_obj_diameter, rail_z_distance):
+        """
+        Calibrates the rig's sensors with fresh readings of the calibration object.
+
+        :return: a Future that is done when the sensors are calibrated
+        """
+        return self.acquisition.calibrate(ring_diameter, calibration_obj_diameter, rail_z_distance)
+
+    def capture(self):
+        """
+        Captures a measurement and saves it in the rig's measurements.
+
+        :return: a Future with a tuple: (the clean reading of each sensor, number of frames captured)
+        """
+        future = self.acquisition.capture()
+
+        def save(f):
+            if not f.cancelled() and f.exception() is None:
+                data, number_of_samples = f.result()
+                self.measurements.add(data, number_of_samples)
+
+        future.add_done_callback(save)
+
+        return future
+
+
+def find_rigs():
+    """
+    :return: a Rig for each Arduino found
+    """
+    return [Rig(url, name="rig%s" % (i + 1)) for (i, url) in enumerate(findArduinoPorts())]
+
+
+def connect_rigs(rigs, timeout=10):
+    """
+    Connects every rig at once.
+
+    :return: the rigs that connected; the others are shut down
+    """
+    results = [None] * len(rigs)
+
+    def connect(i):
+        results[i] = rigs[i].connect(timeout)
+
+    threads = [threading.Thread(target=connect, args=(i,)) for i in range(len(rigs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for (rig, connected) in zip(rigs, results):
+        if not connected:
+            print("%s: could not connect to the Arduino at %s" % (rig.name, rig.url))
+            rig.acquisition.shutdown()
+
+    return [rig for (rig, connected) in zip(rigs, results) if connected]
+
+
+def calibrate_all(rigs, ring_diameter, calibration_obj_diameter, rail_z_distance, timeout=None):
+    """
+    Calibrates every rig at once, and waits for all of them.
+
+    :return: the rigs that were calibrated
+    """
+    futures = [rig.calibrate(ring_diameter, calibration_obj_diameter, rail_z_distance) for rig in rigs]
+    calibrated = []
+
+    for (rig, future) in zip(rigs, futures):
+        try:
+            future.result(timeout)
+            calibrated.append(rig)
+        except Exception as e:
+            print("%s: calibration failed: %r" % (rig.name, e))
+
+    return calibrated
+
+
+def capture_all(rigs, timeout=None):
+    """
+    Captures a measurement on every rig at once, and waits for all of them.
+
+    :return: list with the result of each rig's capture (see Rig.capture), or the exception it failed with
+    """
+    futures = [rig.capture() for rig in rigs]
+    results = []
+
+    for future in futures:
+        try:
+            results.append(future.result(timeout))
+        except Exception as e:
+            results.append(e)
+
+    return results
+
+
+def shutdown_rigs(rigs):
+    for rig in rigs:
+        rig.acquisition.shutdown()
+
+
+def write_results(rigs, output_dir):
+    """
+    Writes the coordinates of each rig's measurements to a text file of its own.
+
+    :return: paths of the files written
+    """
+    date = datetime.now().strftime('%Y-%m-%d_%H%M%S')
+    paths = []
+
+    for rig in rigs:
+        path = os.path.join(output_dir, "BPC_%s_%s.txt" % (rig.name, date))
+        if generate_text_file(path, measurements=rig.measurements, calibration=rig.calibration):
+            paths.append(path)
+
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure with several BPC rigs at once.")
+    parser.add_argument("--url", action="append",
+                        help="port or pyserial URL of an Arduino; once per rig (default: every Arduino found)")
+    parser.add_argument("--ring-diameter", type=float, required=True, help="diameter of the rings, in cm")
+    parser.add_argument("--object-diameter", type=float, required=True,
+                        help="diameter of the calibration object, in cm")
+    parser.add_argument("--z-distance", type=float, required=True,
+                        help="distance from the Z sensor to the end of the rail, in cm")
+    parser.add_argument("--captures", type=int,
+                        help="take this many captures one after the other, without waiting for Enter")
+    parser.add_argument("--output-dir", default=".", help="folder to write each rig's coordinates in (default: .)")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for each step (default: 30)")
+
+    args = parser.parse_args(argv)
+    interactive = args.captures is None
+
+    if args.url:
+        all_rigs = [Rig(url, name="rig%s" % (i + 1)) for (i, url) in enumerate(args.url)]
+    else:
+        all_rigs = find_rigs()
+    if not all_rigs:
+        print("No Arduino found")
+        return 1
+
+    try:
+        rigs = connect_rigs(all_rigs, args.timeout)
+        if not rigs:
+            return 1
+        print("%s rig(s) connected: %s" % (len(rigs), ", ".join(rig.name for rig in rigs)))
+
+        if interactive:
+            input("Place the calibration object in every ring, and press Enter to calibrate: ")
+        rigs = calibrate_all(rigs, args.ring_diameter, args.object_diameter, args.z_distance, args.timeout)
+        if not rigs:
+            return 1
+
+        captures = 0
+        while interactive or captures < args.captures:
+            if interactive and input("Press Enter to capture on every rig, or q and Enter to finish: ").strip():
+                break
+
+            for (rig, result) in zip(rigs, capture_all(rigs, args.timeout)):
+                if isinstance(result, Exception):
+                    print("%s: capture failed: %r" % (rig.name, result))
+                else:
+                    print("%s: captured at Z %.2f (%s samples)" % (rig.name, result[0][-1], result[1]))
+            captures += 1
+
+        for path in write_results(rigs, args.output_dir):
+            print("Saved", path)
+    finally:
+        shutdown_rigs(all_rigs)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,118 +1,489 @@
+import asyncio
+import os
+import queue
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from serial import SerialException
 
-from backend.bpc import save_measurements, get_calibration_settings
+from backend.bpc import saved_measurement
+from backend.frame_buffer import FrameRingBuffer
+from backend.frame_log import FrameRecorder, FRAME_LOG_EXTENSION
+from backend.running_stats import RunningStats
 from backend.sensors_manager import *
 
-# Semaphore lock to guarantee only 1 thread at a time
-port_lock = threading.Semaphore()
+# Frames of the live feed kept in memory
+liveBufferSize = 1000
 
-# Error flags
-no_arduino = threading.Event()
-disconnected = threading.Event()
+# Continuous scan: frames per station, and recent frames whose median Z tells where the carriage is
+scanNumberOfSamples = 3
+scanZWindow = 5
 
-# Main program was closed
-main_quit = threading.Event()
+# Folder where every frame of the feed is recorded, one frame log per connection; not recorded if None
+recordingDir = os.environ.get("BAMBOO_RECORDING_DIR")
 
 
-class LiveFeedThread(threading.Thread):
+class FrameCollector(object):
     """
-    A thread to display live sensor data, capture it, or calibrate sensors.
+    Gathers the next frames of the feed for a command. Its future is done once the capture is complete.
+
+    :param command: number of the command, for recordings
+    :param is_complete: decides, given the running stats of the frames so far, if the capture is complete
     """
 
-    def __init__(self, widget):
-        threading.Thread.__init__(self)
+    def __init__(self, loop, command=0, is_complete=isCaptureComplete):
+        self.command = command
+        self.is_complete = is_complete
+        self.frames = []
+        self.stats = None
+        self.future = loop.create_future()
+
+    def add(self, frame):
+        """
+        :return: whether the frame was taken
+        """
+        if self.future.done():
+            return False
+
+        self.frames.append(frame)
+
+        if self.stats is None:
+            self.stats = RunningStats(len(frame))
+        self.stats.add(frame)
+
+        if self.is_complete(self.stats):
+            # one row per sensor, with its samples
+            self.future.set_result(np.array(self.frames).T)
+
+        return True
+
+
+class AcquisitionService(object):
+    """
+    Owns the serial stream to an Arduino.
+
+    An asyncio loop, in a thread of its own, reads frames as they arrive and keeps the latest one for the live feed.
+    Capture and calibrate are commands served from that same stream, one at a time; they can be called from any
+    thread, and return a concurrent.futures.Future with their result.
+
+    In continuous scan mode, a station is captured from the same stream each time the Z sensor moves by a given
+    step, and saved in the BPC measurements.
+
+    Listeners are called from the acquisition thread with an event name: "connected", "no_arduino", "disconnected",
+    or "scan_capture", which comes with the clean reading of each sensor and the number of frames captured.
+
+    Each measuring ring gets its own service, with its own thread; see backend/bpc_rigs.py.
+
+    :param connection: the ArduinoConnection to read; the program's if None
+    :param calibration: the SensorCalibration of the ring; the program's if None
+    :param measurements: the MeasurementStore stations of a continuous scan are saved in; the BPC measurements if
+                         None
+    :param name: name of the acquisition thread
+    """
+
+    def __init__(self, connection=None, calibration=None, measurements=None, name="AcquisitionService"):
+        self.connection = arduinoConnection if connection is None else connection
+        self.calibration = sensorCalibration if calibration is None else calibration
+        self.measurements = saved_measurement if measurements is None else measurements
+        self.name = name
+
+        self.loop = None
+        self.thread = None
+
+        # blocking serial calls run here, one at a time
+        self.serial_executor = ThreadPoolExecutor(max_workers=1)
+
+        # the task reading the feed, while connected
+        self.feed_task = None
+        # the port is open and the handshake is done
+        self.connected = False
+        # commands waiting for frames
+        self.collectors = []
+        # one command at a time
+        self.command_lock = None
+        # connect and disconnect in the order they were asked for
+        self.connection_lock = None
+
+        # most recent frames; read by the GUI for the live feed
+        self.recent_frames = None
+        # records every frame, if recordingDir is set
+        self.recorder = None
+        # number of the last capture or calibration
+        self.commands_issued = 0
+
+        # continuous scan: Z step between stations, or None when not scanning
+        self.scan_step = None
+        # Z of the last station
+        self.scan_z = None
+        # the station being captured
+        self.scan_collector = None
+
+        self.listeners = []
+
+    def start(self):
+        """
+        Starts the acquisition thread, if it's not running already.
+        """
+        if self.thread is not None:
+            return
+
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.command_lock = asyncio.Lock()
+            self.connection_lock = asyncio.Lock()
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name=self.name, daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def shutdown(self, timeout=5):
+        """
+        Disconnects from the Arduino and stops the acquisition thread.
+        """
+        if self.thread is None:
+            return
+
+        try:
+            asyncio.run_coroutine_threadsafe(self.stop_feed(), self.loop).result(timeout)
+        except Exception as e:
+            print("error stopping the acquisition service:", e)
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.thread = None
+
+    @property
+    def latest_frame(self):
+        """
+        The most recent frame of the feed, or None if not connected.
+        """
+        recent_frames = self.recent_frames
+        if recent_frames is None:
+            return None
+
+        return recent_frames.latest()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self, event, *args):
+        for callback in list(self.listeners):
+            callback(event, *args)
+
+    # COMMANDS; can be called from any thread
+
+    def connect(self):
+        """
+        Opens the serial port and starts reading the feed. Listeners are told "connected" right away if it's open
+        already.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.start_feed(), self.loop)
+
+    def disconnect(self):
+        """
+        Stops reading the feed and closes the serial port.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self.stop_feed(), self.loop)
+
+    def capture(self):
+        """
+        Captures frames until the reading of every sensor is steady enough, and removes their outliers.
+
+        :return: a Future with a tuple: (the clean reading of each sensor, number of frames captured)
+        """
+        return asyncio.run_coroutine_threadsafe(self.do_capture(), self.loop)
+
+    def calibrate(self, ring_diameter, calibration_obj_diameter, rail_z_distance):
+        """
+        Calibrates the sensors with fresh readings of the calibration object.
+
+        :return: a Future that is done when the sensors are calibrated
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.do_calibrate(ring_diameter, calibration_obj_diameter, rail_z_distance), self.loop)
+
+    def start_scan(self, z_step):
+        """
+        Starts capturing a station every z_step cm the Z sensor moves, starting right away.
+        """
+        return asyncio.run_coroutine_threadsafe(self.do_start_scan(z_step), self.loop)
+
+    def stop_scan(self):
+        """
+        Stops capturing stations; a station being captured is dropped.
+        """
+        return asyncio.run_coroutine_threadsafe(self.do_stop_scan(), self.loop)
+
+    # ACQUISITION THREAD
+
+    def run_serial(self, function, *args):
+        return self.loop.run_in_executor(self.serial_executor, function, *args)
+
+    async def start_feed(self):
+        async with self.connection_lock:
+            if self.feed_task is None or self.feed_task.done():
+                self.feed_task = self.loop.create_task(self.read_feed())
+
+            # still connected from before; nothing to wait for
+            elif self.connected:
+                self.notify("connected")
+
+    async def stop_feed(self):
+        async with self.connection_lock:
+            if self.feed_task is not None and not self.feed_task.done():
+                self.feed_task.cancel()
+                try:
+                    await self.feed_task
+                except asyncio.CancelledError:
+                    pass
+            self.feed_task = None
+
+    async def read_feed(self):
+        # open serial port
+        try:
+            await self.run_serial(self.connection.open)
+        except (IOError, SerialException):
+            print("no arduino found")
+            self.notify("no_arduino")
+            return
+        except asyncio.CancelledError:
+            # the port may still open after all; close it once it does
+            await self.run_serial(self.connection.close)
+            raise
 
-        # the widget who creates this thread; for writing data to its queue
+        self.connected = True
+        self.notify("connected")
+
+        try:
+            while True:
+                # whatever has arrived; waits up to the port's read timeout
+                frames, arrival_times = await self.run_serial(self.connection.read_available)
+
+                if not frames:
+                    continue
+
+                # sized once the number of sensors is known
+                if self.recent_frames is None:
+                    self.recent_frames = FrameRingBuffer(liveBufferSize, len(frames[0]))
+                    self.start_recording(len(frames[0]))
+                self.recent_frames.extend(frames)
+
+                # command each frame was taken by, if any
+                commands = [0] * len(frames)
+
+                for i, frame in enumerate(frames):
+                    for collector in self.collectors:
+                        if collector.add(frame):
+                            commands[i] = collector.command
+
+                self.collectors = [c for c in self.collectors if not c.future.done()]
+
+                if self.scan_step is not None:
+                    self.check_scan()
+
+                if self.recorder is not None:
+                    self.recorder.write(frames, arrival_times, commands=commands)
+                    self.recorder.flush()
+
+        except SerialException as e:
+            self.connected = False
+
+            # reset sensor manager
+            self.connection.hard_reset()
+            self.recent_frames = None
+            self.stop_recording()
+            self.fail_collectors(e)
+            self.scan_step = None
+
+            print("arduino disconnected")
+            self.notify("disconnected")
+
+        except asyncio.CancelledError:
+            self.connected = False
+            self.fail_collectors(None)
+            self.scan_step = None
+
+            # close serial port
+            try:
+                await self.run_serial(self.connection.close)
+            except SerialException:
+                self.connection.hard_reset()
+            self.recent_frames = None
+            self.stop_recording()
+
+            raise
+
+    def start_recording(self, number_of_sensors):
+        if recordingDir is None:
+            return
+
+        path = os.path.join(recordingDir, "BPC_" + time.strftime("%Y%m%d_%H%M%S") + FRAME_LOG_EXTENSION)
+
+        try:
+            if not os.path.isdir(recordingDir):
+                os.makedirs(recordingDir)
+            self.recorder = FrameRecorder(path, number_of_sensors)
+            print("recording sensor feed to", path)
+        except (IOError, OSError, ValueError) as e:
+            print("could not record sensor feed:", e)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def fail_collectors(self, exception):
+        # commands waiting for frames are cancelled if exception is None
+        for collector in self.collectors:
+            if collector.future.done():
+                continue
+            if exception is None:
+                collector.future.cancel()
+            else:
+                collector.future.set_exception(exception)
+        self.collectors = []
+
+    def collect_frames(self):
+        if self.feed_task is None or self.feed_task.done():
+            raise SerialException("not connected to the Arduino")
+
+        self.commands_issued += 1
+        collector = FrameCollector(self.loop, self.commands_issued)
+        self.collectors.append(collector)
+
+        return collector.future
+
+    def current_z(self):
+        # median of the last frames, so a noisy reading doesn't trigger a station
+        z = float(np.median(self.recent_frames.window(scanZWindow)[:, -1]))
+
+        # calibrated, if the sensors are
+        return z * self.calibration.z_factor
+
+    def check_scan(self):
+        # one station at a time
+        if self.scan_collector is not None:
+            return
+
+        z = self.current_z()
+        if self.scan_z is not None and abs(z - self.scan_z) < self.scan_step:
+            return
+
+        # a new station
+        self.scan_z = z
+        self.commands_issued += 1
+        self.scan_collector = FrameCollector(self.loop, self.commands_issued,
+                                             is_complete=lambda stats: stats.count >= scanNumberOfSamples)
+        self.collectors.append(self.scan_collector)
+        self.scan_collector.future.add_done_callback(self.on_scan_capture)
+
+    def on_scan_capture(self, future):
+        self.scan_collector = None
+
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        structuredData = future.result()
+        data = cleanSensorData(structuredData)
+        number_of_samples = len(structuredData[0])
+
+        self.measurements.add(data, number_of_samples)
+        self.notify("scan_capture", data, number_of_samples)
+
+    async def do_start_scan(self, z_step):
+        if self.feed_task is None or self.feed_task.done():
+            raise SerialException("not connected to the Arduino")
+
+        self.scan_step = z_step
+        self.scan_z = None
+
+    async def do_stop_scan(self):
+        self.scan_step = None
+
+        if self.scan_collector is not None:
+            self.scan_collector.future.cancel()
+            self.collectors.remove(self.scan_collector)
+            self.scan_collector = None
+
+    async def do_capture(self):
+        async with self.command_lock:
+            structuredData = await self.collect_frames()
+
+            return cleanSensorData(structuredData), len(structuredData[0])
+
+    async def do_calibrate(self, ring_diameter, calibration_obj_diameter, rail_z_distance):
+        async with self.command_lock:
+            structuredData = await self.collect_frames()
+            measuredDistances = cleanSensorData(structuredData)
+
+            # init sensors
+            self.calibration.init_sensors(ring_diameter * 0.5, len(measuredDistances))
+
+            # run calibration
+            self.calibration.calibrate((calibration_obj_diameter * 0.5) + 0.8, rail_z_distance, measuredDistances)
+
+
+# The acquisition service of the program's Arduino
+acquisition = AcquisitionService()
+
+
+class TkBridge(object):
+    """
+    Hands calls from other threads over to the Tk main loop, where they run in order.
+
+    :param widget: any Tk widget; its after() drives the bridge
+    :param interval: milliseconds between checks for pending calls
+    """
+
+    def __init__(self, widget, interval=20):
         self.widget = widget
+        self.interval = interval
+        self.calls = queue.Queue()
+        self.job = None
 
-        # an event to kill this thread
-        self.kill_thread = threading.Event()
+    def call(self, callback, *args):
+        """
+        Queues a call to run on the Tk main loop. Safe to use from any thread.
+        """
+        self.calls.put((callback, args))
 
-        # Signals port is open
-        self.reading_sensors = threading.Event()
+    def start(self):
+        if self.job is None:
+            self.job = self.widget.after(self.interval, self.run_pending)
 
-        # Tells the thread to capture data; cleared when data is ready
-        self.capture_now = threading.Event()
-        # Tell the gui to grab the captured data
-        self.capture_done = threading.Event()
+    def stop(self):
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
 
-        # Tells the thread to calibrate sensors; cleared when done
-        self.calibrate_now = threading.Event()
-        # Tell the gui to grab the calibration data
-        self.calibration_done = threading.Event()
+        # drop calls that didn't make it
+        with self.calls.mutex:
+            self.calls.queue.clear()
 
-    def run(self):
-        # Semaphore lock to guarantee only 1 thread at a time
-        with port_lock:
+    def run_pending(self):
+        try:
+            while True:
+                callback, args = self.calls.get_nowait()
 
-            # don't bother if the user has already left the tool
-            if not main_quit.is_set() and not self.kill_thread.is_set():
-                # open serial port
+                # one failing callback shouldn't stop the ones after it
                 try:
-                    openArduinoSerial()
-                except IOError:
-                    no_arduino.set()
-                    print("no arduino found")
-                    return
-
-                # Notify we are reading
-                self.reading_sensors.set()
-
-                # Keep reading sensors
-                while not main_quit.is_set() and not self.kill_thread.is_set():
-                    try:
-                        # User wants to capture data
-                        if self.capture_now.is_set() and not self.capture_done.is_set():
-                            # Get sensor data
-                            data = getCleanSensorData()
-
-                            # don't save if the user has already left the tool
-                            if not main_quit.is_set() and not self.kill_thread.is_set():
-                                # Save data in backend
-                                save_measurements(data)
-
-                                # signal data has been captured
-                                self.capture_done.set()
-                            else:
-                                print("capture aborted")
-
-                        # User wants to calibrate sensors
-                        elif self.calibrate_now.is_set() and not self.calibration_done.is_set():
-                            # fetch calibration settings
-                            ring_diameter, calibration_obj_diameter, rail_z_distance = get_calibration_settings()
-
-                            # init sensors
-                            initSensors(structureRadius=ring_diameter * 0.5)
-
-                            # run calibration
-                            calibrateAllSensors(testRadius=(calibration_obj_diameter * 0.5)+0.8, testDistance=rail_z_distance)
-
-                            # don't give the signal if the user has already left the tool
-                            if not main_quit.is_set() and not self.kill_thread.is_set():
-                                # signal calibration is done
-                                self.calibration_done.set()
-
-                        # Show live feed
-                        else:
-                            data = getInstantRawSensorData()
-                            # Place data in queue so widget can access it in a non-blocking way
-                            self.widget.add_to_queue(data)
-
-                    except SerialException:
-                        disconnected.set()
-
-                        # reset sensor manager
-                        hardResetArduinoSerial()
-
-                        # clear live feed queue
-                        self.widget.clear_queue()
-
-                        print("arduino disconnected")
-                        return
-
-                # close serial port
-                closeArduinoSerial()
-
-            print("thread finished")
+                    callback(*args)
+                except Exception as e:
+                    print("error in", callback, ":", e)
+        except queue.Empty:
+            pass
+
+        self.job = self.widget.after(self.interval, self.run_pending)
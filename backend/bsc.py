@@ -1,90 +1,362 @@
-import copy
+import math
+import os
+import time
+from functools import lru_cache
 
 import cv2
 import numpy as np
 from PIL import Image
 from imutils import perspective
 
+from backend.detection_cache import DetectionCache
+from backend.pipeline import StagedPipeline
+from backend.preview import PreviewOverlay, make_preview_base
 from backend.utils import get_timestamp, midpoint, twoPointDistance
 
-__image_path = None
-__original_image = None
-__config_image = None
-__contour_boxes = []
-__original_circumferences = []  # keeps all the circumferences originally found
-__circumferences = []  # list of tuples: (contour, (centroidX, centroidY))
-__final_circumferences = []   # list of tuples: ((contour_x, contour_y), (centroid_x, centroid_y), avg_diameter)
-__pixels_per_metric = None
-__output_image = None
+# everything computed from the image being processed; see the stages before process_image
+__pipeline = StagedPipeline()
+
+# largest size of rendered previews; they are displayed on screen, no need for full resolution
+PREVIEW_MAX_SIZE = (1920, 1080)
+# how many rendered previews to keep around
+PREVIEW_CACHE_SIZE = 8
+
+# detection parameters
+BLUR_KERNEL_SIZE = 5
+CANNY_THRESHOLDS = (0, 60)
+MIN_CONTOUR_AREA = 10000
+MIN_CIRCUMFERENCE_SIZE = 25
+CIRCUMFERENCE_ASPECT_RATIO = (0.8, 1.2)
+# sides of the polygon approximating a circumference, exclusive
+CIRCUMFERENCE_SIDES = (10, 20)
+MIN_CIRCUMFERENCE_SOLIDITY = 0.9
+
+# detections are cached here, by image content; see backend/detection_cache.py. Set BAMBOO_DETECTION_CACHE to an
+# empty string to turn it off
+DETECTION_CACHE_DIR = os.environ.get("BAMBOO_DETECTION_CACHE",
+                                     os.path.join(os.path.expanduser("~"), ".bamboo_scanner", "detections"))
+DETECTION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+__detection_cache = DetectionCache(DETECTION_CACHE_DIR, DETECTION_CACHE_MAX_BYTES) if DETECTION_CACHE_DIR else None
 
 
 def get_image_path():
-    return __image_path
+    return __pipeline.get("image_path")
+
+
+def get_stage(name, default=None):
+    """
+    :param name: name of a stage of the pipeline
+    :return: its value for the image being processed, computed if needed; default if there's no image
+    """
+    if __pipeline.get("image_path") is None:
+        return default
+
+    return __pipeline.get(name)
 
 
 def get_config_image():
-    return __config_image
+    return get_stage("config_image")
+
+
+def get_original_image():
+    """
+    The image being processed, in OpenCV (BGR) format. Decoded when first needed, since detections read from the
+    cache don't need it.
+    """
+    return get_stage("image")
+
+
+def detection_parameters(pyramid_levels=0):
+    """
+    :return: dict of everything detect_contours depends on, besides the image
+    """
+    return dict(blur_kernel_size=BLUR_KERNEL_SIZE, canny_thresholds=CANNY_THRESHOLDS, min_contour_area=MIN_CONTOUR_AREA,
+                min_circumference_size=MIN_CIRCUMFERENCE_SIZE, circumference_aspect_ratio=CIRCUMFERENCE_ASPECT_RATIO,
+                circumference_sides=CIRCUMFERENCE_SIDES, min_circumference_solidity=MIN_CIRCUMFERENCE_SOLIDITY,
+                pyramid_levels=pyramid_levels)
+
+
+def set_detection_parameters(**parameters):
+    """
+    Changes detection parameters of the image being processed, and of the ones processed next. Only the stages that
+    depend on them are computed again: changing the contour filters keeps the edges and the contours found.
+
+    :param parameters: any of the keys of detection_parameters, except pyramid_levels (see process_image)
+    :raise ValueError: if a parameter doesn't exist
+    """
+    defaults = detection_parameters()
+    del defaults["pyramid_levels"]
+
+    for (name, value) in parameters.items():
+        if name not in defaults:
+            raise ValueError("unknown detection parameter: %s" % name)
+
+        __pipeline.set(name, value)
+
+    # renders show the circumferences and boxes found
+    clear_preview_cache()
 
 
 def get_number_original_circumferences():
-    return len(__original_circumferences)
+    return len(get_stage("original_circumferences", []))
+
 
+def get_number_slices():
+    return len(get_stage("slices", []))
 
-def do_pre_processing(image):
+
+def do_pre_processing(image, blur_kernel_size=BLUR_KERNEL_SIZE, canny_thresholds=CANNY_THRESHOLDS):
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     # OPTION 1
-    gray = cv2.GaussianBlur(gray, ksize=(5, 5), sigmaX=0)
+    gray = cv2.GaussianBlur(gray, ksize=(blur_kernel_size, blur_kernel_size), sigmaX=0)
 
     # OPTION 2
     # smooth out any background noise and preserve edges
     # gray = cv2.bilateralFilter(gray, d=5, sigmaColor=75, sigmaSpace=50)
 
     # perform edge detection, then perform a dilation + erosion to close gaps in between object edges
-    edged = cv2.Canny(gray, threshold1=0, threshold2=60)
+    edged = cv2.Canny(gray, threshold1=canny_thresholds[0], threshold2=canny_thresholds[1])
     edged = cv2.dilate(edged, kernel=None, iterations=1)
     edged = cv2.erode(edged, kernel=None, iterations=1)
 
     return edged
 
 
-def process_image(image_path):
+def detect_contours(image, pyramid_levels=0, stats=None):
     """
-    Retrieves contours of circumferences and other (reference) objects.
+    Finds the bounding box of every large object in an image, and the circumferences among them.
+    Does not touch the module's state, so it's safe to call on several images at once.
 
-    :param image_path: path to source image in filesystem.
-    :return: number of circumferences found, or None if error reading image
+    With pyramid_levels > 0, candidates are first detected on a downscaled copy of the image (each level halves it),
+    and only the region around each candidate is processed at full resolution.
+
+    :param image: source image in OpenCV (BGR) format.
+    :param pyramid_levels: number of times the image is halved for the detection pass
+    :param stats: a ContourFilterStats to count the contours each filter stage rejected in, if given
+    :return: (boxes, circumferences); circumferences is a list of tuples (contour, (centroidX, centroidY))
     """
-    global __image_path, __original_image, __config_image, __contour_boxes, __original_circumferences, __circumferences
+    if pyramid_levels > 0:
+        cnts = find_contours_multiscale(image, pyramid_levels)
+    else:
+        cnts = find_contours(image)
 
-    # load the image
-    __original_image = cv2.imread(image_path)
-    if __original_image is None:
-        return None
+    return filter_contours(cnts, stats=stats)
 
-    # save image path
-    __image_path = image_path
 
-    # the image we'll display in the configuration screen, with all the detected circumferences
-    __config_image = __original_image.copy()
+def find_contours(image, offset=(0, 0), blur_kernel_size=BLUR_KERNEL_SIZE, canny_thresholds=CANNY_THRESHOLDS):
+    # Reduce background noise and apply canny edge detection
+    temp_image = do_pre_processing(image, blur_kernel_size, canny_thresholds)
 
-    # reset boxes and circumferences
-    __contour_boxes.clear()
-    __original_circumferences.clear()
-    __circumferences.clear()
+    return find_edge_contours(temp_image, offset)
 
-    # Reduce background noise and apply canny edge detection
-    temp_image = do_pre_processing(__original_image)
 
-    # find contours
-    _, cnts, _ = cv2.findContours(image=temp_image, mode=cv2.RETR_CCOMP, method=cv2.CHAIN_APPROX_NONE)
+def find_edge_contours(edges, offset=(0, 0)):
+    # findContours changes its input in OpenCV 3.3; keep the edge map as it is
+    _, cnts, _ = cv2.findContours(image=edges.copy(), mode=cv2.RETR_CCOMP, method=cv2.CHAIN_APPROX_NONE, offset=offset)
 
-    for c in cnts:
-        area = cv2.contourArea(c)
+    return cnts
+
+
+def find_contours_multiscale(image, pyramid_levels, min_area=MIN_CONTOUR_AREA, margin=8, min_overlap=0.8,
+                             blur_kernel_size=BLUR_KERNEL_SIZE, canny_thresholds=CANNY_THRESHOLDS):
+    """
+    Detects candidate contours on a downscaled copy of the image, then refines each of them at full resolution,
+    processing only its region of interest.
+
+    :param image: source image in OpenCV (BGR) format.
+    :param pyramid_levels: number of times the image is halved for the detection pass
+    :param min_area: area of the smallest contour of interest, at full resolution
+    :param margin: pixels added around each region of interest, at full resolution
+    :param min_overlap: how much a full resolution contour's bounding rectangle must overlap the candidate's
+    :param blur_kernel_size: see do_pre_processing
+    :param canny_thresholds: see do_pre_processing
+    :return: the refined full resolution contours
+    """
+    # downscale
+    small = image
+    for level in range(pyramid_levels):
+        small = cv2.pyrDown(small)
+
+    # full resolution pixels per downscaled pixel
+    scale_x = image.shape[1] / small.shape[1]
+    scale_y = image.shape[0] / small.shape[0]
+
+    # area threshold shrinks with the pyramid level
+    small_min_area = min_area / (scale_x * scale_y)
+    candidates = [c for c in find_contours(small, blur_kernel_size=blur_kernel_size, canny_thresholds=canny_thresholds)
+                  if cv2.contourArea(c) >= small_min_area]
+
+    # biggest first, so the regions of inner contours are usually covered by an outer one
+    candidates.sort(key=cv2.contourArea, reverse=True)
+
+    # processed regions of interest: list of tuples ((x0, y0, x1, y1), contours in region)
+    regions = []
+    refined = []
+    refined_keys = set()
+
+    for c in candidates:
+        # candidate's bounding rectangle at full resolution
+        x, y, w, h = cv2.boundingRect(c)
+        rect = (int(x * scale_x), int(y * scale_y), int(w * scale_x), int(h * scale_y))
+
+        # region of interest, padded by the margin plus one downscaled pixel, clipped to the image
+        pad_x = margin + int(scale_x)
+        pad_y = margin + int(scale_y)
+        x0 = max(rect[0] - pad_x, 0)
+        y0 = max(rect[1] - pad_y, 0)
+        x1 = min(rect[0] + rect[2] + pad_x, image.shape[1])
+        y1 = min(rect[1] + rect[3] + pad_y, image.shape[0])
+
+        # reuse a region that has already been processed, if it covers this one
+        region_contours = None
+        for ((rx0, ry0, rx1, ry1), contours) in regions:
+            if rx0 <= x0 and ry0 <= y0 and rx1 >= x1 and ry1 >= y1:
+                region_contours = contours
+                break
+
+        if region_contours is None:
+            region_contours = find_contours(image[y0:y1, x0:x1], offset=(x0, y0), blur_kernel_size=blur_kernel_size,
+                                            canny_thresholds=canny_thresholds)
+            regions.append(((x0, y0, x1, y1), region_contours))
+
+        # the full resolution contours that overlap the candidate; usually both sides of the same edge
+        for region_contour in region_contours:
+            region_rect = cv2.boundingRect(region_contour)
+            if rect_overlap(rect, region_rect) < min_overlap:
+                continue
+
+            # neighbouring candidates can end up on the same contours
+            key = region_rect + (len(region_contour),)
+            if key not in refined_keys:
+                refined.append(region_contour)
+                refined_keys.add(key)
+
+    return refined
+
+
+def rect_overlap(rect_a, rect_b):
+    """
+    Intersection over union of two rectangles.
+
+    :param rect_a: (x, y, w, h)
+    :param rect_b: (x, y, w, h)
+    :return: 0.0 if they don't overlap, 1.0 if they're the same
+    """
+    (ax, ay, aw, ah) = rect_a
+    (bx, by, bw, bh) = rect_b
+
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+
+    intersection = float(w * h)
+    return intersection / (aw * ah + bw * bh - intersection)
+
+
+class ContourFilterStats(object):
+    """
+    How many contours each stage of filter_contours rejected, and the time spent on each stage. Add up the stats of
+    several images with add.
+    """
+
+    # stages, cheapest first; "ellipse" takes the place of "polygon" and "solidity" with an EllipseDetector (see
+    # backend/detectors.py)
+    STAGES = ("points", "bounding_rect", "area", "box", "circle_shape", "polygon", "solidity", "ellipse")
+
+    def __init__(self):
+        self.contours = 0
+        self.rejected = dict.fromkeys(self.STAGES, 0)
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+
+    def add(self, other):
+        self.contours += other.contours
+        for stage in self.STAGES:
+            self.rejected[stage] += other.rejected[stage]
+            self.seconds[stage] += other.seconds[stage]
+
+    def report(self):
+        """
+        :return: one line per stage that was run, with the contours it rejected and the time it took
+        """
+        lines = ["%s contours" % self.contours]
+        for stage in self.STAGES:
+            if not (self.rejected[stage] or self.seconds[stage]):
+                continue
+            lines.append("  %-14s rejected %7s  %8.2f ms" % (stage, self.rejected[stage], self.seconds[stage] * 1000.0))
+
+        return "\n".join(lines)
+
+
+def bounding_rects(cnts):
+    """
+    Bounding rectangles of many contours at once, in a single pass over all their points.
+
+    :return: array with one row (x, y, w, h) per contour, like cv2.boundingRect
+    """
+    if not len(cnts):
+        return np.zeros((0, 4), dtype=np.int64)
+
+    points = np.concatenate([c.reshape(-1, 2) for c in cnts])
+    starts = np.cumsum([0] + [len(c) for c in cnts[:-1]])
+
+    low = np.minimum.reduceat(points, starts)
+    high = np.maximum.reduceat(points, starts)
+
+    return np.hstack((low, high - low + 1)).astype(np.int64)
+
+
+def find_objects(cnts, min_area=MIN_CONTOUR_AREA, stats=None):
+    """
+    Keeps the contours of large objects, and finds their bounding boxes.
+
+    Contours go through stages, cheapest first, and each one only sees what the ones before it kept: number of
+    points, then bounding rectangles of the rest at once (a contour can't cover more than its rectangle), then
+    areas, then the bounding boxes of the large objects, which are kept but not filtered on.
+
+    :param cnts: contours found in the image, with every point (CHAIN_APPROX_NONE), like find_contours returns
+    :param min_area: smaller contours are ignored
+    :param stats: a ContourFilterStats to count rejections and time each stage in, if given
+    :return: (boxes, objects); objects is a list of tuples (contour, bounding rectangle (x, y, w, h), area)
+    """
+    boxes = []
+    objects = []
+    if stats is None:
+        stats = ContourFilterStats()
+
+    contours = len(cnts)
+    stats.contours += contours
+    rejected = stats.rejected
+    seconds = stats.seconds
+
+    # a contour as big as min_area is at least sqrt(min_area) pixels wide or high, and goes there and back one
+    # pixel at a time
+    start = time.perf_counter()
+    min_points = 2 * (int(math.ceil(math.sqrt(min_area))) - 1)
+    cnts = [c for c in cnts if len(c) >= min_points]
+    rejected["points"] += contours - len(cnts)
+    seconds["points"] += time.perf_counter() - start
+
+    # one pass over every contour left
+    start = time.perf_counter()
+    rects = bounding_rects(cnts)
+    candidates = np.flatnonzero(rects[:, 2] * rects[:, 3] >= min_area)
+    rejected["bounding_rect"] += len(cnts) - len(candidates)
+    seconds["bounding_rect"] += time.perf_counter() - start
+
+    for i in candidates:
+        c = cnts[i]
 
         # ignore small contours
-        if area < 10000:
+        start = time.perf_counter()
+        area = cv2.contourArea(c)
+        seconds["area"] += time.perf_counter() - start
+        if area < min_area:
+            rejected["area"] += 1
             continue
 
+        start = time.perf_counter()
+
         # rotated bounding box of the contour
         box = cv2.minAreaRect(c)
         box = cv2.boxPoints(box)
@@ -94,195 +366,599 @@ def process_image(image_path):
         box = perspective.order_points(box)
 
         # save these boxes so we can browse them in the GUI
-        __contour_boxes.append(box)
+        boxes.append(box)
+        seconds["box"] += time.perf_counter() - start
+
+        objects.append((c, rects[i], area))
 
+    return boxes, objects
+
+
+def is_circle_shaped(rect, min_size=MIN_CIRCUMFERENCE_SIZE, aspect_ratio=CIRCUMFERENCE_ASPECT_RATIO):
+    """
+    :param rect: bounding rectangle (x, y, w, h) of an object
+    :return: whether the rectangle is big enough and roughly square
+    """
+    (x, y, w, h) = rect
+
+    return w > min_size and h > min_size and aspect_ratio[0] <= float(w) / h <= aspect_ratio[1]
+
+
+def filter_contours(cnts, min_area=MIN_CONTOUR_AREA, min_size=MIN_CIRCUMFERENCE_SIZE,
+                    aspect_ratio=CIRCUMFERENCE_ASPECT_RATIO, sides=CIRCUMFERENCE_SIDES,
+                    min_solidity=MIN_CIRCUMFERENCE_SOLIDITY, stats=None):
+    """
+    Keeps the contours of large objects (see find_objects), and finds the circumferences among them: the large
+    objects with a roughly square bounding rectangle, then with a polygon of CIRCUMFERENCE_SIDES sides, then solid
+    enough. Stages are cheapest first, like in find_objects.
+
+    :param cnts: contours found in the image, with every point (CHAIN_APPROX_NONE), like find_contours returns
+    :param min_area: smaller contours are ignored
+    :param min_size: minimum width and height of a circumference
+    :param aspect_ratio: (min, max) width over height of a circumference's bounding rectangle
+    :param sides: (min, max) sides of the polygon approximating a circumference, exclusive
+    :param min_solidity: a circumference covers more than this fraction of its convex hull
+    :param stats: a ContourFilterStats to count rejections and time each stage in, if given
+    :return: (boxes, circumferences); circumferences is a list of tuples (contour, (centroidX, centroidY))
+    """
+    circumferences = []
+    if stats is None:
+        stats = ContourFilterStats()
+
+    rejected = stats.rejected
+    seconds = stats.seconds
+
+    boxes, objects = find_objects(cnts, min_area, stats)
+
+    for (c, rect, area) in objects:
+        # Look for circular objects
+
+        # Bounding rectangle size and aspect ratio
+        start = time.perf_counter()
+        circle_shaped = is_circle_shaped(rect, min_size, aspect_ratio)
+        seconds["circle_shape"] += time.perf_counter() - start
+        if not circle_shaped:
+            rejected["circle_shape"] += 1
+            continue
+
+        start = time.perf_counter()
         perimeter = cv2.arcLength(c, closed=True)
         approx = cv2.approxPolyDP(c, epsilon=0.01 * perimeter, closed=True)
+        seconds["polygon"] += time.perf_counter() - start
+        if not sides[0] < len(approx) < sides[1]:
+            rejected["polygon"] += 1
+            continue
 
-        # Look for circular objects
-        if len(approx) > 10 and len(approx) < 20:
-            # filter with contour properties
+        # solidity
+        start = time.perf_counter()
+        hull = cv2.convexHull(c)
+        hull_area = cv2.contourArea(hull)
+        solidity = float(area) / hull_area
+        seconds["solidity"] += time.perf_counter() - start
+        if not solidity > min_solidity:
+            rejected["solidity"] += 1
+            continue
 
-            # Bounding rectangle
-            x, y, w, h = cv2.boundingRect(c)
+        # get centroid
+        M = cv2.moments(c)
+        (cx, cy) = int(M['m10'] / M['m00']), int(M['m01'] / M['m00'])
 
-            # aspect ratio
-            aspect_ratio = float(w) / h
+        # Save circumference and centroid
+        circumferences.append((c, (cx, cy)))
 
-            # solidity
-            hull = cv2.convexHull(c)
-            hull_area = cv2.contourArea(hull)
-            solidity = float(area) / hull_area
+    return boxes, circumferences
 
-            # valid properties
-            size_ok = w > 25 and h > 25
-            solidity_ok = solidity > 0.9
-            aspect_ratio_ok = aspect_ratio >= 0.8 and aspect_ratio <= 1.2
 
-            if size_ok and solidity_ok and aspect_ratio_ok:
-                # get centroid
-                M = cv2.moments(c)
-                (cx, cy) = int(M['m10'] / M['m00']), int(M['m01'] / M['m00'])
+def select_slice_circumferences(circumferences, min_wall_thickness=10):
+    """
+    Picks the circumferences of one bamboo slice without user input: the biggest slice found by
+    pair_slice_circumferences.
 
-                # Save circumference and centroid
-                circumference = (c, (cx, cy))
-                __circumferences.append(circumference)
+    :param circumferences: list of tuples (contour, (centroidX, centroidY))
+    :param min_wall_thickness: pixels between outer and inner; closer contours are both sides of the same edge
+    :return: list with the outer circumference first, followed by the inner one if found
+    """
+    slices = pair_slice_circumferences(circumferences, min_wall_thickness)
+    if not slices:
+        return []
 
-                # Draw circumferences to display all of them in the configuration screen
-                cv2.drawContours(__config_image, [c], 0, color=(0, 255, 0), thickness=5)
+    return max(slices, key=lambda circumferences: cv2.contourArea(circumferences[0][0]))
 
-    # convert config image to pil
-    __config_image = convert_cv_to_pil(__config_image)
 
-    # keep a copy of the originals before selecting finals
-    if len(__circumferences) > 2:
-        __original_circumferences = copy.copy(__circumferences)
+def pair_slice_circumferences(circumferences, min_wall_thickness=10):
+    """
+    Finds every bamboo slice in an image, pairing each outer circumference with the inner one of its hole.
+
+    Circumferences are taken biggest first. One that doesn't sit inside a slice found so far is the outer
+    circumference of a new slice; one that does is the inner circumference of that slice, unless it's too close to
+    the outer one to be anything but the other side of its edge, or the slice has its inner circumference already.
+    Bounding rectangles of the slices are checked before their contours, so each circumference is only tested
+    against the slices around it.
+
+    :param circumferences: list of tuples (contour, (centroidX, centroidY))
+    :param min_wall_thickness: pixels between outer and inner; closer contours are both sides of the same edge
+    :return: list of slices, in reading order: top to bottom, then left to right; each slice is a list with the
+             outer circumference first, followed by the inner one if found
+    """
+    # biggest first
+    by_area = sorted(circumferences, key=lambda circumference: cv2.contourArea(circumference[0]), reverse=True)
 
-    return len(__circumferences)
+    slices = []
+    # bounding rectangle of each slice, as (x0, y0, x1, y1) rows
+    rects = np.zeros((len(by_area), 4), dtype=np.int64)
 
+    for (contour, centroid) in by_area:
+        (cx, cy) = centroid
 
-def render_all_circumferences():
-    circumference_images = []
+        # slices whose bounding rectangle holds the centroid
+        found = rects[:len(slices)]
+        near = np.flatnonzero((found[:, 0] <= cx) & (found[:, 1] <= cy) & (found[:, 2] >= cx) & (found[:, 3] >= cy))
+
+        owner = None
+        for i in near:
+            if cv2.pointPolygonTest(slices[i][0][0], (float(cx), float(cy)), False) > 0:
+                owner = slices[i]
+                break
+
+        # not inside any slice; the outer circumference of a new one
+        if owner is None:
+            (x, y, w, h) = cv2.boundingRect(contour)
+            rects[len(slices)] = (x, y, x + w, y + h)
+            slices.append([(contour, centroid)])
+            continue
 
-    for circumference in __original_circumferences:
-        cnt = circumference[0]
-        circ_image = __original_image.copy()
+        if len(owner) > 1:
+            continue
 
-        cv2.drawContours(circ_image, [cnt], 0, color=(0, 255, 0), thickness=5)
+        # distance from the leftmost point of the candidate to the outer circumference
+        (x, y) = contour[contour[:, :, 0].argmin()][0]
+        if cv2.pointPolygonTest(owner[0][0], (float(x), float(y)), True) > min_wall_thickness:
+            owner.append((contour, centroid))
 
-        # convert to PIL and add to result
-        circumference_images.append(convert_cv_to_pil(circ_image))
+    return sort_slices(slices)
 
-    return circumference_images
 
+def sort_slices(slices):
+    """
+    Sorts slices in reading order. Slices whose centroids are less than half the typical slice height apart
+    vertically are on the same row, and go left to right.
 
-def set_final_circumferences(selected):
-    global __circumferences
+    :param slices: list of slices, each a list with the outer circumference first
+    :return: a new sorted list
+    """
+    if len(slices) <= 1:
+        return list(slices)
 
-    final_circumferences = []
+    half_height = np.median([cv2.boundingRect(s[0][0])[3] for s in slices]) / 2.0
 
-    for i, circumference in enumerate(__original_circumferences):
-        if i in selected:
-            final_circumferences.append(circumference)
+    # top to bottom, then split into rows
+    by_y = sorted(slices, key=lambda s: s[0][1][1])
+    rows = [[by_y[0]]]
+    for s in by_y[1:]:
+        if s[0][1][1] - rows[-1][0][0][1][1] > half_height:
+            rows.append([])
+        rows[-1].append(s)
 
-    __circumferences = final_circumferences
+    return [s for row in rows for s in sorted(row, key=lambda s: s[0][1][0])]
 
 
-def render_boxes():
+def get_box_dimensions(box):
     """
-    Generates images of each contour's bounding box (with horizontal and vertical bisections)
+    Width and height of an ordered bounding box, measured between the midpoints of its sides.
 
-    :return: a list of bounding boxes in the following format: { "horizontal": (TkImage, width), "vertical": (TkImage, height) }
+    :param box: box points ordered top-left, top-right, bottom-right, and bottom-left
+    :return: (width, height) in pixels
     """
-    global __original_image, __contour_boxes
+    (tl, tr, br, bl) = box
 
-    boxes = []
+    # calculate the box's width and height
+    box_height = twoPointDistance(midpoint(tl, tr), midpoint(bl, br))
+    box_width = twoPointDistance(midpoint(tl, bl), midpoint(tr, br))
+
+    return box_width, box_height
+
+
+# pipeline stages; each gets the parameters and stages it needs from the pipeline, which keeps track of what
+# depends on what
+
+def compute_image(pipeline):
+    image_path = pipeline.get("image_path")
+    image = cv2.imread(image_path)
+    if image is None:
+        raise IOError("could not read image %s" % image_path)
+
+    return image
+
+
+def compute_detection_key(pipeline):
+    # None if there's no cache
+    if __detection_cache is None:
+        return None
+
+    parameters = dict((name, pipeline.get(name, default)) for (name, default) in detection_parameters().items())
+
+    return __detection_cache.file_key(pipeline.get("image_path"), parameters)
+
+
+def compute_cached_detection(pipeline):
+    key = pipeline.get("detection_key")
+
+    return None if key is None else __detection_cache.get(key)
+
+
+def compute_edges(pipeline):
+    return do_pre_processing(pipeline.get("image"), pipeline.get("blur_kernel_size", BLUR_KERNEL_SIZE),
+                             pipeline.get("canny_thresholds", CANNY_THRESHOLDS))
 
-    for box in __contour_boxes:
 
-        # 1st of 2 output images: horizontal and vertical bisections
-        orig_horizontal_line = __original_image.copy()
+def compute_contours(pipeline):
+    pyramid_levels = pipeline.get("pyramid_levels", 0)
 
-        # draw the actual boxes
-        cv2.drawContours(orig_horizontal_line, [box.astype("int")], -1, color=(0, 255, 0), thickness=5)
+    if pyramid_levels > 0:
+        return find_contours_multiscale(pipeline.get("image"), pyramid_levels,
+                                        min_area=pipeline.get("min_contour_area", MIN_CONTOUR_AREA),
+                                        blur_kernel_size=pipeline.get("blur_kernel_size", BLUR_KERNEL_SIZE),
+                                        canny_thresholds=pipeline.get("canny_thresholds", CANNY_THRESHOLDS))
 
-        # loop over the original points and draw them
-        for (x, y) in box:
-            cv2.circle(orig_horizontal_line, (int(x), int(y)), 5, (0, 0, 255), -1)
+    return find_edge_contours(pipeline.get("edges"))
 
-        # unpack the ordered bounding box, then compute the midpoint
-        # between the top-left and top-right coordinates, followed by
-        # the midpoint between bottom-left and bottom-right coordinates
-        (tl, tr, br, bl) = box
 
-        # Midpoints
-        # Forms vertical bisection
-        (tl_tr_x, tl_tr_y) = midpoint(tl, tr)  # top-left and top-right
-        (bl_br_x, bl_br_y) = midpoint(bl, br)  # bottom-left and bottom-right
+def compute_detections(pipeline):
+    # a detection seen before needs neither the image nor its contours
+    cached = pipeline.get("cached_detection")
+    if cached is not None:
+        (boxes, circumferences, preview) = cached
+        return boxes, circumferences
 
-        # Forms horizontal bisection
-        (tl_bl_x, tl_bl_y) = midpoint(tl, bl)  # top-left and bottom-left
-        (tr_br_x, tr_br_y) = midpoint(tr, br)  # top-right and bottom-right
+    boxes, circumferences = filter_contours(
+        pipeline.get("contours"),
+        min_area=pipeline.get("min_contour_area", MIN_CONTOUR_AREA),
+        min_size=pipeline.get("min_circumference_size", MIN_CIRCUMFERENCE_SIZE),
+        aspect_ratio=pipeline.get("circumference_aspect_ratio", CIRCUMFERENCE_ASPECT_RATIO),
+        sides=pipeline.get("circumference_sides", CIRCUMFERENCE_SIDES),
+        min_solidity=pipeline.get("min_circumference_solidity", MIN_CIRCUMFERENCE_SOLIDITY))
 
-        # 2nd output image; Here is where the images deviate
-        orig_vertical_line = orig_horizontal_line.copy()
+    key = pipeline.get("detection_key")
+    if key is not None:
+        preview_base, preview_scale = pipeline.get("preview")
+        preview = cv2.cvtColor(np.asarray(preview_base), cv2.COLOR_RGB2BGR)
+        __detection_cache.put(key, boxes, circumferences, (preview, preview_scale))
 
-        # draw the midpoints on the image
-        cv2.circle(orig_vertical_line, (int(tl_tr_x), int(tl_tr_y)), 5, (255, 0, 0), -1)
-        cv2.circle(orig_vertical_line, (int(bl_br_x), int(bl_br_y)), 5, (255, 0, 0), -1)
-        cv2.circle(orig_horizontal_line, (int(tl_bl_x), int(tl_bl_y)), 5, (255, 0, 0), -1)
-        cv2.circle(orig_horizontal_line, (int(tr_br_x), int(tr_br_y)), 5, (255, 0, 0), -1)
+    return boxes, circumferences
 
-        # draw lines between the midpoints
-        cv2.line(orig_vertical_line, (int(tl_tr_x), int(tl_tr_y)), (int(bl_br_x), int(bl_br_y)), (0, 0, 255), thickness=5)
-        cv2.line(orig_horizontal_line, (int(tl_bl_x), int(tl_bl_y)), (int(tr_br_x), int(tr_br_y)), (0, 0, 255), thickness=5)
 
-        # draw text on midpoint of lines
-        # vertical
-        (m_vertical_x, m_vertical_y) = midpoint((tl_tr_x, tl_tr_y), (bl_br_x, bl_br_y))
-        cv2.putText(orig_vertical_line, "? cm", (int(m_vertical_x + 10), int(m_vertical_y)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 3.0, (255, 255, 0), thickness=5)
-        # horizontal
-        (m_horizontal_x, m_horizontal_y) = midpoint((tl_bl_x, tl_bl_y), (tr_br_x, tr_br_y))
-        cv2.putText(orig_horizontal_line, "? cm", (int(m_horizontal_x), int(m_horizontal_y - 10)),
-                    cv2.FONT_HERSHEY_SIMPLEX, 3.0, (255, 255, 0), thickness=5)
+def compute_preview(pipeline):
+    # (original image at display resolution in PIL format, preview pixels per original pixel)
+    # the cached preview saves decoding the image; once it's decoded, the preview doesn't depend on the detection
+    # parameters the cache entry is keyed by
+    if not pipeline.is_computed("image"):
+        cached = pipeline.get("cached_detection")
+        if cached is not None and cached[2] is not None:
+            (preview_image, preview_scale) = cached[2]
+            return convert_cv_to_pil(preview_image), preview_scale
 
-        # calculate the box's width and height
-        box_height = twoPointDistance((tl_tr_x, tl_tr_y), (bl_br_x, bl_br_y))
-        box_width = twoPointDistance((tl_bl_x, tl_bl_y), (tr_br_x, tr_br_y))
+    preview_base, preview_scale, offset = make_preview_base(pipeline.get("image"), PREVIEW_MAX_SIZE)
 
-        contour_box = {
-            "horizontal": (convert_cv_to_pil(orig_horizontal_line), box_width),
-            "vertical": (convert_cv_to_pil(orig_vertical_line), box_height)
-        }
+    return preview_base, preview_scale
 
-        boxes.append(contour_box)
 
-    return boxes
+def compute_config_image(pipeline):
+    # the image we'll display in the configuration screen, with all the detected circumferences
+    preview_base, preview_scale = pipeline.get("preview")
+    boxes, circumferences = pipeline.get("detections")
+
+    overlay = PreviewOverlay(preview_base, preview_scale)
+    for (c, centroid) in circumferences:
+        overlay.draw_contour(c, color=(0, 255, 0))
+
+    return overlay.composite()
+
+
+def compute_slices(pipeline):
+    # the outer and inner circumferences of each slice
+    boxes, circumferences = pipeline.get("detections")
+
+    return pair_slice_circumferences(circumferences)
+
+
+def compute_original_circumferences(pipeline):
+    # the circumferences to choose from; none if there's nothing to choose
+    boxes, circumferences = pipeline.get("detections")
+
+    if len(pipeline.get("slices")) == 1 or len(circumferences) <= 2:
+        return []
+
+    return list(circumferences)
+
+
+def compute_measured_slices(pipeline):
+    # the circumferences of each slice measured, outer first: the chosen ones, or every slice found
+    selected = pipeline.get("selected")
+
+    if selected is not None:
+        circumferences = [circumference for (i, circumference) in enumerate(pipeline.get("original_circumferences"))
+                          if i in selected]
+        return [sort_circumferences(circumferences)]
+
+    slices = pipeline.get("slices")
+    if slices:
+        return slices
+
+    boxes, circumferences = pipeline.get("detections")
+    return [sort_circumferences(circumferences)]
+
+
+def compute_circumferences(pipeline):
+    # the circumferences of the slice shown, outer first
+    measured_slices = pipeline.get("measured_slices")
+
+    return measured_slices[min(pipeline.get("slice_index", 0), len(measured_slices) - 1)]
+
+
+def compute_final_slices(pipeline):
+    # final circumferences of each slice measured, like final_circumferences
+    pixels_per_metric = pipeline.get("pixels_per_metric")
+
+    return [translate_circumferences(circumferences, pixels_per_metric)
+            for circumferences in pipeline.get("measured_slices")]
+
+
+def compute_final_circumferences(pipeline):
+    # list of tuples: ((contour_x, contour_y), (centroid_x, centroid_y), avg_diameter)
+    return translate_circumferences(pipeline.get("circumferences"), pipeline.get("pixels_per_metric"))
+
+
+def compute_slice_roi(pipeline):
+    circumferences = pipeline.get("circumferences")
+    contour, centroid = circumferences[0]  # outer circumference
+
+    # extract region of interest from original image, at display resolution
+    roi, scale, offset = make_preview_base(pipeline.get("image"), PREVIEW_MAX_SIZE, region=cv2.boundingRect(contour))
+    overlay = PreviewOverlay(roi, scale, offset)
+
+    # red and blue to match matplotlib
+    colors = ((0, 0, 255), (179, 115, 24))
+
+    # outline the circumferences
+    for ((contour, centroid), color) in zip(circumferences, colors):
+        overlay.draw_contour(contour, color=color)
+
+    return overlay.composite()
+
+
+__pipeline.add_stage("image", compute_image)
+__pipeline.add_stage("detection_key", compute_detection_key)
+__pipeline.add_stage("cached_detection", compute_cached_detection)
+__pipeline.add_stage("edges", compute_edges)
+__pipeline.add_stage("contours", compute_contours)
+__pipeline.add_stage("detections", compute_detections)
+__pipeline.add_stage("preview", compute_preview)
+__pipeline.add_stage("config_image", compute_config_image)
+__pipeline.add_stage("slices", compute_slices)
+__pipeline.add_stage("original_circumferences", compute_original_circumferences)
+__pipeline.add_stage("measured_slices", compute_measured_slices)
+__pipeline.add_stage("circumferences", compute_circumferences)
+__pipeline.add_stage("final_slices", compute_final_slices)
+__pipeline.add_stage("final_circumferences", compute_final_circumferences)
+__pipeline.add_stage("slice_roi", compute_slice_roi)
+
+
+def process_image(image_path, pyramid_levels=0):
+    """
+    Retrieves contours of circumferences and other (reference) objects.
+
+    Detections are cached by image content: an image seen before isn't decoded or processed again.
+
+    :param image_path: path to source image in filesystem.
+    :param pyramid_levels: detect on an image halved this many times, then refine at full resolution
+    :return: number of circumferences found, or None if error reading image
+    """
+    parameters = dict(image_path=image_path, pyramid_levels=pyramid_levels, selected=None, slice_index=0)
+    previous = dict((name, __pipeline.get(name)) for name in parameters)
+
+    # start over, even if it's the same path; the file may have changed
+    for (name, value) in parameters.items():
+        __pipeline.set(name, value)
+    __pipeline.invalidate("image_path")
+    clear_preview_cache()
+
+    try:
+        boxes, circumferences = __pipeline.get("detections")
+        __pipeline.get("circumferences")
+    except (IOError, OSError) as e:
+        print(e)
+
+        # keep processing the previous image
+        for (name, value) in previous.items():
+            __pipeline.set(name, value)
+        return None
+
+    return len(circumferences)
+
+
+def get_preview_base():
+    """
+    The original image at display resolution, in PIL format. Made once per image; previews are drawn over it.
+
+    :return: (preview base, preview pixels per original pixel)
+    """
+    return get_stage("preview")
+
+
+def new_preview_overlay():
+    base, scale = get_preview_base()
+    return PreviewOverlay(base, scale)
+
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def render_circumference(index):
+    """
+    Renders one of the circumferences originally found, at display resolution.
+
+    :param index: position of the circumference in the originally found list
+    :return: image in PIL format
+    """
+    cnt = get_stage("original_circumferences", [])[index][0]
+
+    overlay = new_preview_overlay()
+    overlay.draw_contour(cnt, color=(0, 255, 0))
+
+    return overlay.composite()
+
+
+def get_number_boxes():
+    boxes, circumferences = get_stage("detections", ([], []))
+
+    return len(boxes)
+
+
+def set_final_circumferences(selected):
+    """
+    Measures a single slice, of the chosen circumferences, instead of every slice found.
+
+    :param selected: positions of the chosen circumferences in the originally found list
+    """
+    __pipeline.set("selected", list(selected))
+    __pipeline.set("slice_index", 0)
+
+
+def measure_all_slices():
+    """
+    Measures every slice found, instead of the chosen circumferences.
+    """
+    __pipeline.set("selected", None)
+    __pipeline.set("slice_index", 0)
+
+
+def get_number_measured_slices():
+    return len(get_stage("measured_slices", []))
+
+
+def set_slice_index(index):
+    """
+    :param index: position of the slice whose circumferences, coordinates, and region of interest are shown, among
+                  the slices measured
+    """
+    __pipeline.set("slice_index", index)
+
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def render_box(index, dimension):
+    """
+    Renders a contour's bounding box with one of its bisections, at display resolution.
+
+    :param index: position of the box in the list of contour boxes
+    :param dimension: "horizontal" or "vertical" bisection
+    :return: (image in PIL format, width or height of the box in original image pixels)
+    """
+    boxes, circumferences = get_stage("detections", ([], []))
+    box = boxes[index]
+
+    # full resolution dimensions, for pixels-per-metric
+    box_width, box_height = get_box_dimensions(box)
+
+    overlay = new_preview_overlay()
+
+    # draw the actual box
+    overlay.draw_contour(box, color=(0, 255, 0))
+
+    # loop over the original points and draw them
+    for point in box:
+        overlay.draw_point(point, (0, 0, 255))
+
+    # unpack the ordered bounding box
+    (tl, tr, br, bl) = box
+
+    if dimension == "vertical":
+        # midpoints of top-left and top-right, and of bottom-left and bottom-right
+        start = midpoint(tl, tr)
+        end = midpoint(bl, br)
+        size = box_height
+    else:
+        # midpoints of top-left and bottom-left, and of top-right and bottom-right
+        start = midpoint(tl, bl)
+        end = midpoint(tr, br)
+        size = box_width
+
+    # draw the midpoints on the image
+    overlay.draw_point(start, (255, 0, 0))
+    overlay.draw_point(end, (255, 0, 0))
+
+    # draw line between the midpoints
+    overlay.draw_line(start, end, (0, 0, 255))
+
+    # draw text on midpoint of line
+    (m_x, m_y) = midpoint(start, end)
+    if dimension == "vertical":
+        text_origin = (m_x + 10, m_y)
+    else:
+        text_origin = (m_x, m_y - 10)
+    overlay.draw_text("? cm", text_origin, (255, 255, 0))
+
+    return overlay.composite(), size
+
+
+def clear_preview_cache():
+    render_circumference.cache_clear()
+    render_box.cache_clear()
 
 
 def set_pixels_per_metric(value):
-    global __pixels_per_metric
+    __pipeline.set("pixels_per_metric", value)
 
-    __pixels_per_metric = value
 
+def sort_circumferences(circumferences):
+    """
+    :param circumferences: list of tuples (contour, (centroidX, centroidY))
+    :return: a new list, with the outer circumference first
+    """
+    circumferences = list(circumferences)
 
-def sort_circumferences():
     # don't sort if there's only 1
-    if len(__circumferences) <= 1:
-        return
+    if len(circumferences) <= 1:
+        return circumferences
 
     # get a reference of each circumference tuple (contour, centroid)
-    circumference_1 = __circumferences[0]
-    circumference_2 = __circumferences[1]
+    circumference_1 = circumferences[0]
+    circumference_2 = circumferences[1]
 
     # find out which contour is bigger
-    area_1 = len(circumference_1[0])
-    area_2 = len(circumference_2[0])
+    area_1 = cv2.contourArea(circumference_1[0])
+    area_2 = cv2.contourArea(circumference_2[0])
 
     # outer circumference should come first
     if area_2 > area_1:
-        __circumferences.reverse()
+        circumferences.reverse()
         print("circumferences order reversed")
 
+    return circumferences
+
 
 def translate_coordinates():
-    global __final_circumferences
+    # 2 rows for each circumference: contains ((contour_xS, contour_yS), (centroid_x, centroid_y), avg_diameter)
+    return get_stage("final_circumferences", [])
 
-    # sort circumferences; Outer always first
-    sort_circumferences()
 
-    # 2 rows for each circumference: contains ((contour_xS, contour_yS), (centroid_x, centroid_y), avg_diameter)
-    __final_circumferences.clear()
+def translate_slices():
+    # the final circumferences of every slice measured, in reading order
+    return get_stage("final_slices", [])
+
+
+def translate_circumferences(circumferences, pixels_per_metric):
+    """
+    Translates circumferences into rectangular coordinates, with the origin at the bottom-left of the outer one.
+
+    :param circumferences: list of tuples (contour, (centroidX, centroidY)); outer circumference first
+    :param pixels_per_metric: pixels per centimeter of the source image
+    :return: a list of tuples ((contour_xS, contour_yS), (centroid_x, centroid_y), avg_diameter); contour_xS and
+             contour_yS are float arrays
+    """
+    final_circumferences = []
 
     x0 = None
     y0 = None
 
-    for i, (contour, centroid) in enumerate(__circumferences):
-        temp_contour_x = []
-        temp_contour_y = []
-        temp_diameters = []
-
+    for i, (contour, centroid) in enumerate(circumferences):
         # outer contour gives axis information
         if i == 0:
             # leftmost point gives x0
@@ -298,73 +974,80 @@ def translate_coordinates():
         (cx, cy) = centroid
 
         # translate in relation to calculated origin, and scaled with pixels-per-metric
-        cx_final = abs(cx - x0) / __pixels_per_metric
-        cy_final = abs(cy - y0) / __pixels_per_metric
+        cx_final = abs(cx - x0) / pixels_per_metric
+        cy_final = abs(cy - y0) / pixels_per_metric
 
-        # translate the contour x & y coordinates
-        for points in contour:
-            for (x, y) in points:
-                # translate in relation to calculated origin, and scaled with pixels-per-metric
-                x_final = abs(x - x0) / __pixels_per_metric
-                y_final = abs(y - y0) / __pixels_per_metric
+        # translate all the contour points at once; (N, 1, 2) contour -> (N, 2) points
+        points = contour.reshape(-1, 2)
 
-                # calculate radius
-                radius = twoPointDistance((x_final, y_final), (cx_final, cy_final))
-                # save diameters for average diameter
-                temp_diameters.append(radius * 2.0)
+        # translate in relation to calculated origin, and scaled with pixels-per-metric
+        contour_x = np.abs(points[:, 0] - x0) / pixels_per_metric
+        contour_y = np.abs(points[:, 1] - y0) / pixels_per_metric
 
-                # store x and y separately
-                temp_contour_x.append(x_final)
-                temp_contour_y.append(y_final)
+        # radius of each point, same arithmetic as twoPointDistance
+        delta_x = contour_x - cx_final
+        delta_y = contour_y - cy_final
+        diameters = np.sqrt(delta_x * delta_x + delta_y * delta_y) * 2.0
 
         # calculate average diameter
-        average_diameter = np.mean(temp_diameters)
+        average_diameter = np.mean(diameters)
 
         # save
-        __final_circumferences.append(((temp_contour_x, temp_contour_y), (cx_final, cy_final), average_diameter))
+        final_circumferences.append(((contour_x, contour_y), (cx_final, cy_final), average_diameter))
 
-    return __final_circumferences
+    return final_circumferences
 
 
 def get_slice_roi():
-    global __output_image
+    return get_stage("slice_roi")
 
-    # make sure outer is first
-    sort_circumferences()
 
-    # a copy of the original image
-    temp = __original_image.copy()
+def get_text_file_paths(file_path):
+    """
+    :return: the text file of each slice measured; numbered in reading order when there are several, like
+             bsc_batch --all-slices names them
+    """
+    number_slices = get_number_measured_slices()
+    if number_slices <= 1:
+        return [file_path]
 
-    # red and blue to match matplotlib
-    colors = ((0, 0, 255), (179, 115, 24))
+    (root, extension) = os.path.splitext(file_path)
+    return ["%s_%02d%s" % (root, i + 1, extension) for i in range(number_slices)]
 
-    # outline the circumferences
-    for ((contour, centroid), color) in zip(__circumferences, colors):
-        temp = cv2.drawContours(temp, [contour], 0, color=color, thickness=5)
 
-    contour, centroid = __circumferences[0]  # outer circumference
+def generate_text_file(file_path):
+    """
+    Writes a text file for each slice measured; see get_text_file_paths.
 
-    # extract region of interest from original image
-    x, y, w, h = cv2.boundingRect(contour)
-    roi = temp[y:y+h, x:x+w]
+    :return: True if every file was written
+    """
+    image_path = get_image_path()
 
-    __output_image = convert_cv_to_pil(roi)
+    for (path, final_circumferences) in zip(get_text_file_paths(file_path), translate_slices()):
+        if not write_text_file(path, image_path, final_circumferences):
+            return False
 
-    return __output_image
+    return True
 
 
-def generate_text_file(file_path):
-    global __circumferences
+def write_text_file(file_path, image_path, final_circumferences):
+    """
+    Writes the rectangular coordinates, centroids, and average diameters of a slice to a text file.
 
+    :param file_path: destination of the text file
+    :param image_path: path of the processed image
+    :param final_circumferences: translated circumferences, as returned by translate_circumferences
+    :return: True if the file was written
+    """
     try:
         f = open(file_path, "w+")
-        f.write("Image processed: %s\n" % __image_path)
+        f.write("Image processed: %s\n" % image_path)
         f.write("\n")
         f.write(get_timestamp())
         f.write("\n")
 
         tags = ("Outer Circumference", "Inner Circumference")
-        for (((contour_xS, contour_yS), (centroid_x, centroid_y), avg_diameter), tag) in zip(__final_circumferences, tags):
+        for (((contour_xS, contour_yS), (centroid_x, centroid_y), avg_diameter), tag) in zip(final_circumferences, tags):
 
             # Write circumference tag
             f.write("*%s*\n" % tag)
@@ -403,18 +1086,9 @@ def generate_text_file(file_path):
 
 
 def reset_bsc_backend():
-    global __image_path, __original_image, __config_image, __pixels_per_metric, __contour_boxes,\
-        __original_circumferences, __circumferences, __final_circumferences, __output_image
-
-    __image_path = None
-    __original_image = None
-    __config_image = None
-    __contour_boxes.clear()
-    __original_circumferences.clear()
-    __circumferences.clear()
-    __final_circumferences.clear()
-    __pixels_per_metric = None
-    __output_image = None
+    # detection parameters go back to their defaults too
+    __pipeline.clear()
+    clear_preview_cache()
 
 
 def convert_cv_to_pil(image):
@@ -0,0 +1,422 @@
+"""
+Headless batch characterization of bamboo slice images.
+
+Runs the same steps as the BSC tool (detection, circumference selection, pixels-per-metric and coordinate
+translation) on every image of a folder or glob, without the GUI, and writes one text file per slice. With
+--all-slices, every slice of an image (a tray of them, say) is characterized, not just the biggest one. Slices are
+found with the BSC tool's detector, or another one of backend/detectors.py with --detector.
+
+Usage:
+    python -m backend.bsc_batch SOURCE [SOURCE ...] --output-dir DIR (--ppm PPM | --dpi DPI | --ref-width CM)
+                                [--all-slices] [--detector NAME] [-j JOBS]
+"""
+import argparse
+import collections
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import cv2
+
+from backend.bsc import ContourFilterStats, pair_slice_circumferences, select_slice_circumferences, get_box_dimensions, \
+    translate_circumferences, write_text_file
+from backend.detectors import DETECTORS, get_detector
+
+# same formats the BSC tool accepts
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
+
+CM_PER_INCH = 2.54
+
+
+class SliceResult(object):
+    """
+    Everything the pipeline computed for one image. Holds the per-image state that the BSC tool keeps in
+    module globals, so several images can be processed at the same time.
+    """
+
+    def __init__(self, image_path):
+        self.image_path = image_path
+        self.boxes = []  # ordered bounding boxes of all the objects found
+        self.circumferences = []  # list of tuples: (contour, (centroidX, centroidY)); outer first
+        self.number_circumferences = 0  # circumferences found before selecting the slice
+        self.pixels_per_metric = None
+        self.final_circumferences = []  # list of tuples: ((contour_x, contour_y), (centroid_x, centroid_y), avg_diameter)
+        self.output_path = None
+
+        # every slice characterized, in reading order; the one above is the first
+        self.slices = []  # circumferences of each slice, like circumferences
+        self.final_slices = []  # final circumferences of each slice, like final_circumferences
+        self.slice_axes = []  # (major, minor) axes of each circumference of each slice, in cm, as detected
+        self.output_paths = []
+
+        self.filter_stats = ContourFilterStats()  # contours each stage of the contour filter rejected
+        self.error = None
+        self.elapsed = 0.0  # seconds spent on this image
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def find_image_paths(sources):
+    """
+    Expands folders and glob patterns into a sorted list of image paths.
+
+    :param sources: folders, glob patterns, or paths to image files
+    :return: list of image paths, without duplicates
+    """
+    paths = set()
+
+    for source in sources:
+        if os.path.isdir(source):
+            candidates = [os.path.join(source, name) for name in os.listdir(source)]
+        else:
+            candidates = glob.glob(source)
+
+        for candidate in candidates:
+            if os.path.isfile(candidate) and os.path.splitext(candidate)[1].lower() in IMAGE_EXTENSIONS:
+                paths.add(candidate)
+
+    return sorted(paths)
+
+
+def find_reference_box(boxes, outer_contours):
+    """
+    The reference object is the leftmost object that is not part of a slice.
+
+    :param boxes: ordered bounding boxes of all the objects found
+    :param outer_contours: outer circumference of each slice
+    :return: the box of the reference object, or None if there isn't one
+    """
+    candidates = []
+
+    for box in boxes:
+        (center_x, center_y) = box.mean(axis=0)
+
+        # skip the slices themselves
+        if any(cv2.pointPolygonTest(outer_contour, (float(center_x), float(center_y)), False) >= 0
+               for outer_contour in outer_contours):
+            continue
+
+        candidates.append(box)
+
+    if not candidates:
+        return None
+
+    # leftmost top-left corner
+    return min(candidates, key=lambda b: b[0][0])
+
+
+def process_slice_image(image_path, pixels_per_metric=None, reference_width=None, output_dir=None, pyramid_levels=None,
+                        all_slices=False, detector="polygon"):
+    """
+    Characterizes the bamboo slice of a single image, or all of them.
+
+    Scale is given either as a known pixels_per_metric, or as the real width of a reference object placed to the
+    left of the slice.
+
+    :param image_path: path to source image in filesystem
+    :param pixels_per_metric: pixels per centimeter of the image
+    :param reference_width: real width of the reference object, in centimeters
+    :param output_dir: where to write the text file of the slice; nothing is written if None
+    :param pyramid_levels: detect on an image halved this many times (see backend/detectors.py); the detector's
+                           default if None
+    :param all_slices: characterize every slice of the image, each with a text file of its own; only the biggest
+                       one otherwise
+    :param detector: name of the circumference detector, one of detectors.DETECTORS
+    :return: a SliceResult; its error attribute says what went wrong, if anything
+    """
+    result = SliceResult(image_path)
+    start = time.perf_counter()
+
+    try:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise IOError("could not read image")
+
+        # detection
+        result.boxes, circumferences, axes = get_detector(detector, pyramid_levels).detect(image,
+                                                                                        stats=result.filter_stats)
+        result.number_circumferences = len(circumferences)
+
+        # circumference selection
+        if all_slices:
+            result.slices = pair_slice_circumferences(circumferences)
+        else:
+            result.slices = [select_slice_circumferences(circumferences)]
+
+        if not result.slices or not result.slices[0]:
+            raise ValueError("no circumferences found")
+        result.circumferences = result.slices[0]
+
+        # pixels per metric
+        if pixels_per_metric is not None:
+            result.pixels_per_metric = pixels_per_metric
+        elif reference_width is not None:
+            box = find_reference_box(result.boxes, [circumferences[0][0] for circumferences in result.slices])
+            if box is None:
+                raise ValueError("no reference object found")
+            box_width, box_height = get_box_dimensions(box)
+            result.pixels_per_metric = box_width / reference_width
+        else:
+            raise ValueError("no pixels per metric or reference width given")
+
+        # axes of each circumference, by the contour they were fitted to
+        axes_by_contour = dict((id(c), a) for ((c, centroid), a) in zip(circumferences, axes))
+        result.slice_axes = [[tuple(length / result.pixels_per_metric for length in axes_by_contour[id(c)])
+                              for (c, centroid) in circumferences] for circumferences in result.slices]
+
+        # rectangular coordinates
+        result.final_slices = [translate_circumferences(circumferences, result.pixels_per_metric)
+                               for circumferences in result.slices]
+        result.final_circumferences = result.final_slices[0]
+
+        if output_dir is not None:
+            name = os.path.splitext(os.path.basename(image_path))[0]
+
+            for i, final_circumferences in enumerate(result.final_slices):
+                # numbered in reading order when there may be several
+                suffix = "_%02d" % (i + 1) if all_slices else ""
+                output_path = os.path.join(output_dir, "BSC_" + name + suffix + ".txt")
+
+                if not write_text_file(output_path, image_path, final_circumferences):
+                    raise IOError("could not write " + output_path)
+                result.output_paths.append(output_path)
+
+            result.output_path = result.output_paths[0]
+
+    except (IOError, ValueError, cv2.error) as e:
+        result.error = str(e)
+
+    except Exception as e:
+        # an odd image doesn't stop the batch, whether it runs on a pool or not
+        result.error = "failed: %r" % e
+
+    result.elapsed = time.perf_counter() - start
+
+    return result
+
+
+def positive_float(text):
+    """
+    argparse type for scales; a scale of 0 or less can't be divided by.
+    """
+    value = float(text)
+    if not value > 0:
+        raise argparse.ArgumentTypeError("expected a positive number, got %s" % text)
+
+    return value
+
+
+def non_negative_int(text):
+    """
+    argparse type for worker counts; 0 stands for all CPUs, below that is meaningless.
+    """
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError("expected 0 or more, got %s" % text)
+
+    return value
+
+
+def process_batch(image_paths, **kwargs):
+    """
+    Processes images one after the other.
+
+    :param image_paths: paths to source images
+    :param kwargs: passed on to process_slice_image
+    :return: a generator of SliceResult, in the same order as image_paths
+    """
+    for image_path in image_paths:
+        yield process_slice_image(image_path, **kwargs)
+
+
+def process_slice_image_in_worker(image_path, **kwargs):
+    # each worker process gets a core; keep OpenCV from spawning threads of its own
+    cv2.setNumThreads(1)
+
+    return process_slice_image(image_path, **kwargs)
+
+
+def wait_for_result(image_path, future):
+    """
+    Waits for an image submitted to the pool. Errors other than a broken pool are reported in the result.
+
+    :raise BrokenProcessPool: if a worker died before the image was processed
+    """
+    try:
+        return future.result()
+
+    except BrokenProcessPool:
+        raise
+
+    except Exception as e:
+        result = SliceResult(image_path)
+        result.error = "worker failed: %r" % e
+        return result
+
+
+def process_batch_parallel(image_paths, workers=None, max_in_flight=None, **kwargs):
+    """
+    Processes images on a pool of worker processes.
+
+    At most max_in_flight images are submitted at any time, so memory stays capped no matter how many images there
+    are. An image that fails is reported in its result without stopping the run; if it takes its worker down, the
+    pool is restarted and the images that were in flight are submitted again.
+
+    :param image_paths: paths to source images
+    :param workers: number of worker processes; defaults to the number of CPUs
+    :param max_in_flight: images submitted but not yet yielded; defaults to twice the number of workers
+    :param kwargs: passed on to process_slice_image
+    :return: a generator of SliceResult, in the same order as image_paths
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+
+    task = partial(process_slice_image_in_worker, **kwargs)
+    pending = collections.deque()  # tuples: (image_path, future)
+    paths = iter(image_paths)
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            # keep the pool busy, up to the limit
+            while len(pending) < max_in_flight:
+                image_path = next(paths, None)
+                if image_path is None:
+                    break
+                pending.append((image_path, executor.submit(task, image_path)))
+
+            if not pending:
+                break
+
+            # wait for the oldest one, so results come out in order
+            image_path, future = pending.popleft()
+            try:
+                result = wait_for_result(image_path, future)
+
+            except BrokenProcessPool:
+                # a worker died and took every image in flight with it; start over with a fresh pool
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=workers)
+
+                # run this image on its own to find out if it's the one that crashed
+                try:
+                    result = wait_for_result(image_path, executor.submit(task, image_path))
+                except BrokenProcessPool:
+                    result = SliceResult(image_path)
+                    result.error = "worker crashed while processing this image"
+
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=workers)
+
+                # submit the rest again
+                in_flight = [path for (path, f) in pending]
+                pending.clear()
+                for path in in_flight:
+                    pending.append((path, executor.submit(task, path)))
+
+            yield result
+    finally:
+        executor.shutdown(wait=True)
+
+
+def run_batch(image_paths, results, out=sys.stdout, filter_stats=False):
+    """
+    Reports each result as it arrives, followed by a summary with the throughput of the run.
+
+    :param image_paths: paths to source images
+    :param results: an iterable of SliceResult, such as the one returned by process_batch
+    :param out: stream to write the report on
+    :param filter_stats: add the contours each stage of the contour filter rejected, over all images, to the summary
+    :return: the number of images that failed
+    """
+    failed = 0
+    slices = 0
+    total_filter_stats = ContourFilterStats()
+    start = time.perf_counter()
+
+    for i, result in enumerate(results, start=1):
+        total_filter_stats.add(result.filter_stats)
+
+        if result.ok:
+            slices += len(result.final_slices)
+            diameters = "; ".join(", ".join("%.2f" % c[2] for c in final_circumferences)
+                                  for final_circumferences in result.final_slices)
+            label = "diameters" if len(result.final_slices) == 1 else "%s slices, diameters" % len(result.final_slices)
+            out.write("[%s/%s] %s: %s %s cm (%.2fs)\n" % (i, len(image_paths), result.image_path, label, diameters,
+                                                          result.elapsed))
+        else:
+            failed += 1
+            out.write("[%s/%s] %s: FAILED, %s\n" % (i, len(image_paths), result.image_path, result.error))
+
+    elapsed = time.perf_counter() - start
+    throughput = len(image_paths) / elapsed if elapsed > 0 else 0.0
+
+    out.write("\n%s images processed, %s failed, in %.2fs (%.2f images/sec)\n" % (len(image_paths), failed, elapsed,
+                                                                                 throughput))
+    out.write("%s slices characterized (%.2f slices/sec)\n" % (slices, slices / elapsed if elapsed > 0 else 0.0))
+
+    if filter_stats:
+        out.write("\ncontour filter: %s\n" % total_filter_stats.report())
+
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Characterize a batch of bamboo slice images.")
+    parser.add_argument("sources", nargs="+", help="image folders, glob patterns, or image files")
+    parser.add_argument("-o", "--output-dir", required=True, help="where to write one text file per slice")
+
+    scale = parser.add_mutually_exclusive_group(required=True)
+    scale.add_argument("--ppm", type=positive_float, help="pixels per centimeter of the images")
+    scale.add_argument("--dpi", type=positive_float, help="resolution the images were scanned at")
+    scale.add_argument("--ref-width", type=positive_float,
+                       help="real width (cm) of a reference object placed to the left of each slice")
+
+    parser.add_argument("--pyramid-levels", type=int,
+                        help="halve large images this many times for detection (default: 0, 2 for hough)")
+    parser.add_argument("--all-slices", action="store_true",
+                        help="characterize every slice of each image, not just the biggest one")
+    parser.add_argument("--detector", choices=list(DETECTORS), default="polygon",
+                        help="how circumferences are found; see backend/detectors.py (default: polygon)")
+    parser.add_argument("--filter-stats", action="store_true",
+                        help="report how many contours each stage of the contour filter rejected, and its time")
+    parser.add_argument("-j", "--jobs", type=non_negative_int, default=1,
+                        help="number of worker processes; 0 uses all CPUs (default: 1)")
+
+    args = parser.parse_args(argv)
+
+    image_paths = find_image_paths(args.sources)
+    if not image_paths:
+        print("No images found")
+        return 1
+
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    pixels_per_metric = args.ppm
+    if args.dpi is not None:
+        pixels_per_metric = args.dpi / CM_PER_INCH
+
+    settings = dict(pixels_per_metric=pixels_per_metric, reference_width=args.ref_width, output_dir=args.output_dir,
+                    pyramid_levels=args.pyramid_levels, all_slices=args.all_slices, detector=args.detector)
+
+    if args.jobs == 1:
+        results = process_batch(image_paths, **settings)
+    else:
+        results = process_batch_parallel(image_paths, workers=args.jobs or None, **settings)
+
+    failed = run_batch(image_paths, results, filter_stats=args.filter_stats)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
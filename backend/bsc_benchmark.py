@@ -0,0 +1,195 @@
+"""
+Benchmark of the circumference detectors (see backend/detectors.py): how fast each one is, and how well it agrees
+with the BSC tool's own (polygon) detector, on the same images.
+
+Slices found by a detector are matched to the polygon detector's by the centroids of their outer circumferences.
+For each matched circumference, the benchmark reports how far apart the centroids are, and how much the detector's
+diameter (the mean of its major and minor axes) differs from the diameter the BSC tool reports (the mean distance
+of the contour's points to the centroid, doubled).
+
+Usage:
+    python -m backend.bsc_benchmark SOURCE [SOURCE ...] [--detector NAME ...] [--repeat N] [--pyramid-levels N]
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from backend.bsc import pair_slice_circumferences, translate_circumferences
+from backend.bsc_batch import find_image_paths
+from backend.detectors import DETECTORS, get_detector
+
+
+class DetectorStats(object):
+    """
+    What a detector found over all the images of a benchmark, compared to the reference detector.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = []  # best time on each image
+        self.slices = 0
+        self.matched = 0
+        self.missed = 0  # slices the reference found, but not this detector
+        self.extra = 0  # slices this detector found, but not the reference
+        self.centroid_offsets = []  # pixels
+        self.diameter_errors = []  # fraction of the reference diameter
+
+
+def detect_slices(detector, image, repeat):
+    """
+    :param repeat: times the detector runs, at least 1
+    :return: tuple: (slices, axes of each circumference of each slice, best time of detection in seconds)
+    """
+    assert repeat >= 1, "the detector has to run at least once"
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        boxes, circumferences, axes = detector.detect(image)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    slices = pair_slice_circumferences(circumferences)
+
+    axes_by_contour = dict((id(c), a) for ((c, centroid), a) in zip(circumferences, axes))
+    slice_axes = [[axes_by_contour[id(c)] for (c, centroid) in circumferences] for circumferences in slices]
+
+    return slices, slice_axes, best
+
+
+def match_slices(reference, slices):
+    """
+    Pairs each reference slice with the slice whose outer centroid is closest to its own, if it's less than half
+    its outer radius away.
+
+    :return: list of tuples: (index of the reference slice, index of the slice)
+    """
+    matches = []
+    taken = set()
+
+    for (i, reference_slice) in enumerate(reference):
+        (contour, (cx, cy)) = reference_slice[0]
+        (x, y, w, h) = cv2.boundingRect(contour)
+        max_distance = min(w, h) / 4.0
+
+        distances = [(np.hypot(s[0][1][0] - cx, s[0][1][1] - cy), j) for (j, s) in enumerate(slices)
+                     if j not in taken]
+        if distances:
+            distance, j = min(distances)
+            if distance <= max_distance:
+                matches.append((i, j))
+                taken.add(j)
+
+    return matches
+
+
+def compare(stats, reference, slices, slice_axes):
+    """
+    Adds how a detector's slices compare to the reference's to its stats.
+    """
+    matches = match_slices(reference, slices)
+
+    stats.slices += len(slices)
+    stats.matched += len(matches)
+    stats.missed += len(reference) - len(matches)
+    stats.extra += len(slices) - len(matches)
+
+    for (i, j) in matches:
+        # diameters the BSC tool reports, in pixels
+        reference_diameters = [d for (points, centroid, d) in translate_circumferences(reference[i], 1.0)]
+
+        for (k, (contour, (cx, cy))) in enumerate(slices[j][:len(reference[i])]):
+            (rx, ry) = reference[i][k][1]
+            stats.centroid_offsets.append(np.hypot(cx - rx, cy - ry))
+
+            (major, minor) = slice_axes[j][k]
+            diameter = (major + minor) / 2.0
+            stats.diameter_errors.append(abs(diameter - reference_diameters[k]) / reference_diameters[k])
+
+
+def run_benchmark(image_paths, detector_names, repeat=3, pyramid_levels=None, out=sys.stdout):
+    """
+    Runs every detector on every image, and reports their speed and agreement with the polygon detector.
+
+    :param image_paths: paths to source images
+    :param detector_names: detectors to compare, besides the polygon one
+    :param repeat: times each detector runs on each image; the best time counts
+    :param pyramid_levels: passed on to every detector; each one's default if None
+    :param out: stream to write the report on
+    :return: list with the DetectorStats of each detector, the polygon one first
+    """
+    reference_detector = get_detector("polygon", pyramid_levels)
+    detectors = [get_detector(name, pyramid_levels) for name in detector_names if name != "polygon"]
+
+    reference_stats = DetectorStats("polygon")
+    all_stats = [reference_stats] + [DetectorStats(detector.name) for detector in detectors]
+
+    for image_path in image_paths:
+        image = cv2.imread(image_path)
+        if image is None:
+            out.write("%s: could not read image\n" % image_path)
+            continue
+
+        reference, reference_axes, seconds = detect_slices(reference_detector, image, repeat)
+        reference_stats.seconds.append(seconds)
+        compare(reference_stats, reference, reference, reference_axes)
+
+        line = ["%s: polygon %s slices %.1f ms" % (image_path, len(reference), seconds * 1000)]
+
+        for (detector, stats) in zip(detectors, all_stats[1:]):
+            slices, slice_axes, seconds = detect_slices(detector, image, repeat)
+            stats.seconds.append(seconds)
+            compare(stats, reference, slices, slice_axes)
+            line.append("%s %s slices %.1f ms" % (detector.name, len(slices), seconds * 1000))
+
+        out.write(", ".join(line) + "\n")
+
+    if not reference_stats.seconds:
+        return all_stats
+
+    reference_time = sum(reference_stats.seconds)
+
+    out.write("\n%-8s %9s %8s %7s %6s %6s %6s %15s %19s\n" % ("detector", "ms/image", "speedup", "slices", "match",
+                                                              "missed", "extra", "centroid px", "diameter diff %"))
+    for stats in all_stats:
+        total = sum(stats.seconds)
+        offsets = stats.centroid_offsets or [0.0]
+        errors = np.array(stats.diameter_errors or [0.0]) * 100.0
+
+        out.write("%-8s %9.1f %7.2fx %7s %6s %6s %6s %7.2f (%5.1f) %9.3f (%6.2f)\n" % (
+            stats.name, total * 1000 / len(stats.seconds), reference_time / total if total > 0 else 0.0,
+            stats.slices, stats.matched, stats.missed, stats.extra, np.mean(offsets), np.max(offsets),
+            np.mean(errors), np.max(errors)))
+    out.write("(centroid and diameter differences to the polygon detector: mean (max))\n")
+
+    return all_stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the circumference detectors on a set of images.")
+    parser.add_argument("sources", nargs="+", help="image folders, glob patterns, or image files")
+    parser.add_argument("--detector", action="append", choices=list(DETECTORS),
+                        help="detector to compare to the polygon one; once per detector (default: all of them)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="times each detector runs on each image; the best time counts (default: 3)")
+    parser.add_argument("--pyramid-levels", type=int,
+                        help="halve the images this many times for detection (default: each detector's own)")
+
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    image_paths = find_image_paths(args.sources)
+    if not image_paths:
+        print("No images found")
+        return 1
+
+    run_benchmark(image_paths, args.detector or list(DETECTORS), args.repeat, args.pyramid_levels)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+On-disk cache of the contours detected in slice images.
+
+Entries are keyed by a hash of the image file's bytes and of the detection parameters, so an image is recognized
+whatever its name, and changing a parameter never returns stale contours. Files hashed before are recognized by
+their size and modification time, without reading them again. Each entry is an .npz file with the boxes,
+the circumferences (all their points in one array), and optionally a preview of the image, so a hit needs neither
+decoding the image nor detecting anything.
+
+The cache is kept under a size limit by evicting the least recently used entries; a hit touches its entry.
+"""
+import hashlib
+import os
+import zipfile
+
+import cv2
+import numpy as np
+
+# bump when the layout of the entries changes
+CACHE_FORMAT = 1
+
+CACHE_EXTENSION = ".npz"
+
+
+def detection_key(image_bytes, parameters):
+    """
+    :param image_bytes: contents of the image file, or a hash of them
+    :param parameters: dict of everything the detection depends on
+    :return: hex digest identifying the detection of that image with those parameters
+    """
+    digest = hashlib.sha256(image_bytes)
+
+    # same parameters, same text, whatever order they were given in
+    settings = sorted(parameters.items()) + [("format", CACHE_FORMAT), ("opencv", cv2.__version__)]
+    digest.update(repr(settings).encode())
+
+    return digest.hexdigest()
+
+
+class DetectionCache(object):
+    """
+    Detection results of slice images, in a folder.
+
+    :param directory: where entries are kept; created if it doesn't exist
+    :param max_bytes: entries are evicted, least recently used first, once they add up to more than this
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        # content hash of the files hashed so far, by (path, size, modification time)
+        self.file_hashes = {}
+
+        # stats
+        self.hits = 0
+        self.misses = 0
+
+    def file_key(self, image_path, parameters):
+        """
+        Same as detection_key, for an image file.
+
+        :raise IOError: if the file can't be read
+        """
+        info = os.stat(image_path)
+        file_id = (os.path.abspath(image_path), info.st_size, info.st_mtime_ns)
+
+        content_hash = self.file_hashes.get(file_id)
+        if content_hash is None:
+            with open(image_path, "rb") as f:
+                content_hash = hashlib.sha256(f.read()).digest()
+            self.file_hashes[file_id] = content_hash
+
+        return detection_key(content_hash, parameters)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def get(self, key):
+        """
+        :return: tuple: (boxes, circumferences, preview), as given to put, or None if the key isn't cached
+        """
+        path = self.path(key)
+
+        try:
+            with np.load(path) as entry:
+                boxes = list(entry["boxes"])
+
+                # split the points back into one contour each, shaped like findContours gives them
+                ends = np.cumsum(entry["contour_lengths"])
+                contours = np.split(entry["contour_points"].reshape(-1, 1, 2), ends[:-1]) if len(ends) else []
+                circumferences = [(contour, (int(cx), int(cy)))
+                                  for (contour, (cx, cy)) in zip(contours, entry["centroids"])]
+
+                preview = None
+                if len(entry["preview"]):
+                    preview = (cv2.imdecode(entry["preview"], cv2.IMREAD_COLOR), float(entry["preview_scale"]))
+
+        except (IOError, OSError):
+            # not cached
+            self.misses += 1
+            return None
+
+        except (KeyError, ValueError, zipfile.BadZipFile) as e:
+            # written by another version, or cut short; start over
+            print("dropping unreadable detection cache entry %s: %s" % (path, e))
+            self.remove(path)
+            self.misses += 1
+            return None
+
+        # most recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return boxes, circumferences, preview
+
+    def put(self, key, boxes, circumferences, preview=None):
+        """
+        :param boxes: ordered bounding boxes of the objects found
+        :param circumferences: list of tuples (contour, (centroidX, centroidY))
+        :param preview: tuple: (image in OpenCV (BGR) format, preview pixels per source pixel), or None
+        """
+        contours = [contour.reshape(-1, 2) for (contour, centroid) in circumferences]
+
+        arrays = dict(
+            boxes=np.array(boxes, dtype=np.float32).reshape(-1, 4, 2),
+            contour_points=np.concatenate(contours).astype(np.int32) if contours else np.zeros((0, 2), np.int32),
+            contour_lengths=np.array([len(c) for c in contours], dtype=np.int64),
+            centroids=np.array([centroid for (contour, centroid) in circumferences], dtype=np.int64).reshape(-1, 2),
+            preview=np.zeros(0, dtype=np.uint8),
+            preview_scale=np.float64(1.0),
+        )
+
+        if preview is not None:
+            (image, scale) = preview
+            ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            if ok:
+                arrays["preview"] = encoded.ravel()
+                arrays["preview_scale"] = np.float64(scale)
+
+        path = self.path(key)
+        temp_path = "%s.%s.tmp" % (path, os.getpid())
+
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+            # written aside, then moved in place, so a reader never sees half an entry
+            with open(temp_path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(temp_path, path)
+
+        except (IOError, OSError) as e:
+            print("could not cache detection:", e)
+            self.remove(temp_path)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+
+        for name in names:
+            if not name.endswith(CACHE_EXTENSION):
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+
+        total = sum(size for (mtime, size, path) in entries)
+
+        # oldest first
+        for (mtime, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        previous = self.max_bytes
+        self.max_bytes = 0
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = previous
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,249 @@
+"""
+Circumference detectors: different ways of finding the bamboo slices in an image, behind the same interface.
+
+    polygon  the BSC tool's own: contours with a polygon of CIRCUMFERENCE_SIDES sides, solid enough
+    ellipse  contours an ellipse fits, by the area of the fitted ellipse; no polygon or convex hull
+    hough    circles found with the Hough transform on a downscaled image, around the objects found there
+
+Every detector returns the bounding boxes of the large objects (to pick a reference object from), the
+circumferences as contours with their centroids (so slices are paired, translated and written the same way whatever
+found them), and the major and minor axes of each circumference, computed from the shape fitted to it rather than
+by averaging the distances of its points.
+
+Compare them on a set of images with backend/bsc_benchmark.py.
+"""
+import abc
+import collections
+import math
+import time
+
+import cv2
+import numpy as np
+
+from backend.bsc import BLUR_KERNEL_SIZE, CANNY_THRESHOLDS, MIN_CIRCUMFERENCE_SIZE, MIN_CONTOUR_AREA, \
+    ContourFilterStats, detect_contours, find_contours, find_contours_multiscale, find_objects, is_circle_shaped
+
+# a circumference's area is within this fraction of the area of the ellipse fitted to it
+ELLIPSE_MAX_AREA_ERROR = 0.05
+
+# the Hough transform runs on the image halved this many times
+HOUGH_PYRAMID_LEVELS = 2
+# votes a circle needs, at the downscaled size
+HOUGH_ACCUMULATOR_THRESHOLD = 30
+
+
+def rect_axes(contour):
+    """
+    :return: (major, minor) sides of the rotated bounding box of a contour, in pixels; the axes of the ellipse it
+             bounds
+    """
+    (center, (width, height), angle) = cv2.minAreaRect(contour)
+
+    return max(width, height), min(width, height)
+
+
+def circle_contour(center, radius):
+    """
+    :return: contour of a circle, one point per degree, shaped like findContours gives them
+    """
+    points = cv2.ellipse2Poly((int(round(center[0])), int(round(center[1]))), (int(round(radius)),) * 2,
+                              0, 0, 360, 1)
+
+    # the last point closes the circle on the first one
+    return points[:-1].reshape(-1, 1, 2).astype(np.int32)
+
+
+class CircumferenceDetector(abc.ABC):
+    """
+    Finds the bounding box of every large object in an image, and the circumferences among them. Detectors keep no
+    state between images, so one can be used on several images at once. Subclasses implement detect.
+
+    :param pyramid_levels: number of times the image is halved for the detection pass
+    """
+
+    name = None
+
+    def __init__(self, pyramid_levels=0):
+        self.pyramid_levels = pyramid_levels
+
+    @abc.abstractmethod
+    def detect(self, image, stats=None):
+        """
+        :param image: source image in OpenCV (BGR) format
+        :param stats: a ContourFilterStats to count the contours each filter stage rejected in, if given
+        :return: (boxes, circumferences, axes); circumferences is a list of tuples (contour, (centroidX, centroidY)),
+                 and axes has a tuple (major, minor) for each circumference, in pixels
+        """
+
+    def find_contours(self, image):
+        if self.pyramid_levels > 0:
+            return find_contours_multiscale(image, self.pyramid_levels)
+
+        return find_contours(image)
+
+
+class PolygonDetector(CircumferenceDetector):
+    """
+    The BSC tool's detector; see bsc.filter_contours. Axes are the sides of each circumference's rotated bounding
+    box.
+    """
+
+    name = "polygon"
+
+    def detect(self, image, stats=None):
+        boxes, circumferences = detect_contours(image, self.pyramid_levels, stats)
+
+        return boxes, circumferences, [rect_axes(c) for (c, centroid) in circumferences]
+
+
+class EllipseDetector(CircumferenceDetector):
+    """
+    Circumferences are the large objects with a roughly square bounding rectangle (like PolygonDetector) whose area
+    is close to the area of the ellipse fitted to them; a single fit instead of a polygon approximation and a convex
+    hull. The centroid and axes are the fitted ellipse's.
+
+    Regular polygons of fewer sides than PolygonDetector accepts get through, if they're close enough to round.
+
+    :param max_area_error: a circumference's area is within this fraction of its ellipse's area
+    """
+
+    name = "ellipse"
+
+    def __init__(self, pyramid_levels=0, max_area_error=ELLIPSE_MAX_AREA_ERROR):
+        super(EllipseDetector, self).__init__(pyramid_levels)
+        self.max_area_error = max_area_error
+
+    def detect(self, image, stats=None):
+        circumferences = []
+        axes = []
+        if stats is None:
+            stats = ContourFilterStats()
+
+        boxes, objects = find_objects(self.find_contours(image), MIN_CONTOUR_AREA, stats)
+
+        for (c, rect, area) in objects:
+            start = time.perf_counter()
+            circle_shaped = is_circle_shaped(rect)
+            stats.seconds["circle_shape"] += time.perf_counter() - start
+            if not circle_shaped:
+                stats.rejected["circle_shape"] += 1
+                continue
+
+            start = time.perf_counter()
+            ((cx, cy), (width, height), angle) = cv2.fitEllipse(c)
+            ellipse_area = math.pi * width * height / 4.0
+            stats.seconds["ellipse"] += time.perf_counter() - start
+            if not abs(area / ellipse_area - 1.0) <= self.max_area_error:
+                stats.rejected["ellipse"] += 1
+                continue
+
+            circumferences.append((c, (int(cx), int(cy))))
+            axes.append((max(width, height), min(width, height)))
+
+        return boxes, circumferences, axes
+
+
+class HoughCircleDetector(CircumferenceDetector):
+    """
+    Circles found with the Hough transform, on the image halved pyramid_levels times. Circumferences are circles,
+    drawn back at full size; their axes are their diameter.
+
+    The transform only runs on the bounding rectangle of each large, roughly square object of the downscaled image
+    (the same objects its bounding boxes come from), looking for a single circle about as big as the object. Clutter
+    elsewhere costs nothing, and the outer and inner circumferences of a slice are found separately, although the
+    transform keeps a single circle per center. Nothing is refined at full size, so centers and radii are only as
+    precise as a pixel of the downscaled image, and slices that are far from round get the circle that fits them
+    best.
+
+    :param accumulator_threshold: votes a circle needs, at the downscaled size
+    """
+
+    name = "hough"
+
+    def __init__(self, pyramid_levels=HOUGH_PYRAMID_LEVELS, accumulator_threshold=HOUGH_ACCUMULATOR_THRESHOLD):
+        super(HoughCircleDetector, self).__init__(pyramid_levels)
+        self.accumulator_threshold = accumulator_threshold
+
+    def find_circle(self, gray, rect, margin=2):
+        """
+        :param rect: bounding rectangle (x, y, w, h) of an object
+        :return: the strongest circle (x, y, radius) about as big as the object, in image coordinates, or None
+        """
+        (x, y, w, h) = rect
+        x0, y0 = max(x - margin, 0), max(y - margin, 0)
+        roi = gray[y0:y + h + margin, x0:x + w + margin]
+
+        # the circle that fits an ellipse best is between its axes; the hole of a slice is smaller than that
+        circles = cv2.HoughCircles(roi, cv2.HOUGH_GRADIENT, dp=1, minDist=max(roi.shape),
+                                   param1=CANNY_THRESHOLDS[1], param2=self.accumulator_threshold,
+                                   minRadius=int(min(w, h) / 2.0 * 0.95), maxRadius=int(max(w, h) / 2.0) + margin)
+        if circles is None:
+            return None
+
+        # strongest first
+        (cx, cy, r) = circles[0][0]
+        return cx + x0, cy + y0, r
+
+    def detect(self, image, stats=None):
+        scale = 2 ** self.pyramid_levels
+        if stats is None:
+            stats = ContourFilterStats()
+
+        small = image
+        for level in range(self.pyramid_levels):
+            small = cv2.pyrDown(small)
+
+        # the large objects, as the other detectors find them; boxes are kept for reference objects
+        boxes, objects = find_objects(find_contours(small), MIN_CONTOUR_AREA / float(scale * scale), stats)
+        boxes = [box * scale for box in boxes]
+
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, ksize=(BLUR_KERNEL_SIZE, BLUR_KERNEL_SIZE), sigmaX=0)
+
+        circumferences = []
+        axes = []
+        rects = set()
+
+        for (c, rect, area) in objects:
+            start = time.perf_counter()
+            circle_shaped = is_circle_shaped(rect, MIN_CIRCUMFERENCE_SIZE / float(scale))
+            stats.seconds["circle_shape"] += time.perf_counter() - start
+            if not circle_shaped:
+                stats.rejected["circle_shape"] += 1
+                continue
+
+            # both sides of an edge have the same rectangle
+            if tuple(rect) in rects:
+                continue
+            rects.add(tuple(rect))
+
+            circle = self.find_circle(gray, tuple(int(v) for v in rect))
+            if circle is None:
+                continue
+
+            (x, y, r) = circle
+            center = (x * scale, y * scale)
+            circumferences.append((circle_contour(center, r * scale), (int(center[0]), int(center[1]))))
+            axes.append((2.0 * r * scale, 2.0 * r * scale))
+
+        return boxes, circumferences, axes
+
+
+DETECTORS = collections.OrderedDict((detector.name, detector)
+                                    for detector in (PolygonDetector, EllipseDetector, HoughCircleDetector))
+
+
+def get_detector(name, pyramid_levels=None):
+    """
+    :param name: one of DETECTORS
+    :param pyramid_levels: number of times the image is halved for the detection pass; the detector's default if
+                           None
+    :raise ValueError: if there's no detector with that name
+    """
+    if name not in DETECTORS:
+        raise ValueError("unknown detector: %s (expected one of %s)" % (name, ", ".join(DETECTORS)))
+
+    if pyramid_levels is None:
+        return DETECTORS[name]()
+
+    return DETECTORS[name](pyramid_levels=pyramid_levels)
@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class FrameRingBuffer(object):
+    """
+    The most recent frames of the sensor feed, in a fixed amount of memory.
+
+    Frames are written into a preallocated array, one row per frame, overwriting the oldest ones once it's full.
+
+    :param capacity: number of frames kept
+    :param number_of_sensors: readings per frame
+    """
+
+    def __init__(self, capacity, number_of_sensors):
+        self.capacity = capacity
+        self.number_of_sensors = number_of_sensors
+
+        self.data = np.zeros((capacity, number_of_sensors), dtype=np.float64)
+
+        # frames written since the buffer was created or cleared; the next one goes to count % capacity
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def clear(self):
+        self.count = 0
+
+    def append(self, frame):
+        """
+        :param frame: one reading per sensor
+        """
+        self.data[self.count % self.capacity] = frame
+        self.count += 1
+
+    def extend(self, frames):
+        """
+        :param frames: array with one row per frame, oldest first
+        """
+        frames = np.asarray(frames, dtype=np.float64).reshape(-1, self.number_of_sensors)
+
+        # only the last ones would survive anyway
+        skipped = max(len(frames) - self.capacity, 0)
+        frames = frames[skipped:]
+
+        rows = np.arange(self.count + skipped, self.count + skipped + len(frames)) % self.capacity
+        self.data[rows] = frames
+        self.count += skipped + len(frames)
+
+    def latest(self):
+        """
+        :return: a copy of the most recent frame, or None if there are no frames
+        """
+        if self.count == 0:
+            return None
+
+        return self.data[(self.count - 1) % self.capacity].copy()
+
+    def window(self, size=None):
+        """
+        The most recent frames, oldest first.
+
+        :param size: number of frames; all the frames kept if None
+        :return: a copy, with one row per frame and one column per sensor
+        """
+        size = len(self) if size is None else min(size, len(self))
+
+        rows = np.arange(self.count - size, self.count) % self.capacity
+        return self.data[rows]
+
+
+    def mean(self, size=None):
+        """
+        :param size: number of recent frames; all the frames kept if None
+        :return: mean reading of each sensor over the window, or None if there are no frames
+        """
+        window = self.window(size)
+        if len(window) == 0:
+            return None
+
+        return window.mean(axis=0)
+
+    def stdev(self, size=None):
+        """
+        :param size: number of recent frames; all the frames kept if None
+        :return: sample standard deviation of each sensor over the window, or None if there are less than 2 frames
+        """
+        window = self.window(size)
+        if len(window) < 2:
+            return None
+
+        return window.std(axis=0, ddof=1)
@@ -0,0 +1,165 @@
+"""
+Recordings of the raw sensor feed.
+
+A frame log is a 16-byte header followed by fixed-width records, one per frame: the time it arrived, the capture or
+calibration it was part of (0 if none), and the reading of each sensor, as the same float64 the live feed has them in.
+Records are only ever appended, and logs are read back memory-mapped, so weeks of recordings can be replayed without
+loading them. Logs of the first version, which stored readings as float32, can still be read and appended to.
+
+Usage:
+    python -m backend.frame_log LOG [LOG ...]
+"""
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from backend.sensors_manager import cleanSensorData
+
+FRAME_LOG_MAGIC = b"BPCLOG02"
+# type the readings are stored as, by the magic of each version
+FRAME_LOG_READINGS_TYPES = {b"BPCLOG01": "<f4", FRAME_LOG_MAGIC: "<f8"}
+# magic, number of sensors, reserved
+FRAME_LOG_HEADER = struct.Struct("<8sI4x")
+
+FRAME_LOG_EXTENSION = ".bpclog"
+
+
+def frame_log_dtype(number_of_sensors, readings_type="<f8"):
+    """
+    :param readings_type: type the readings are stored as; see FRAME_LOG_READINGS_TYPES
+    :return: the numpy dtype of a frame log record
+    """
+    return np.dtype([("time", "<f8"), ("command", "<i4"), ("readings", readings_type, (number_of_sensors,))])
+
+
+def read_frame_log_header(path):
+    """
+    :return: tuple: (number of sensors of the frame log, type its readings are stored as)
+    :raise ValueError: if the file is not a frame log
+    """
+    with open(path, "rb") as f:
+        header = f.read(FRAME_LOG_HEADER.size)
+
+    if len(header) < FRAME_LOG_HEADER.size:
+        raise ValueError("%s is not a frame log" % path)
+
+    (magic, number_of_sensors) = FRAME_LOG_HEADER.unpack(header)
+    if magic not in FRAME_LOG_READINGS_TYPES:
+        raise ValueError("%s is not a frame log" % path)
+
+    return number_of_sensors, FRAME_LOG_READINGS_TYPES[magic]
+
+
+class FrameRecorder(object):
+    """
+    Appends frames to a frame log, creating it if it doesn't exist. An existing log is appended to in its own version.
+
+    :param path: path to the frame log
+    :param number_of_sensors: readings per frame; must match the log's if it exists
+    """
+
+    def __init__(self, path, number_of_sensors):
+        self.path = path
+        self.number_of_sensors = number_of_sensors
+        self.frames_written = 0
+
+        is_new = not os.path.isfile(path) or os.path.getsize(path) == 0
+        readings_type = FRAME_LOG_READINGS_TYPES[FRAME_LOG_MAGIC]
+        if not is_new:
+            (log_number_of_sensors, readings_type) = read_frame_log_header(path)
+            if log_number_of_sensors != number_of_sensors:
+                raise ValueError("%s has a different number of sensors" % path)
+
+        self.dtype = frame_log_dtype(number_of_sensors, readings_type)
+
+        self.file = open(path, "ab")
+        if is_new:
+            self.file.write(FRAME_LOG_HEADER.pack(FRAME_LOG_MAGIC, number_of_sensors))
+
+    def write(self, frames, arrival_times=None, commands=0):
+        """
+        :param frames: array with one row per frame and one column per sensor
+        :param arrival_times: time each frame arrived, or one time for all; now if None
+        :param commands: capture or calibration each frame was part of, or 0 for all
+        """
+        records = np.zeros(len(frames), dtype=self.dtype)
+        records["time"] = time.time() if arrival_times is None else arrival_times
+        records["command"] = commands
+        records["readings"] = frames
+
+        self.file.write(records.tobytes())
+        self.frames_written += len(records)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def open_frame_log(path):
+    """
+    Memory-maps a frame log. A record cut short at the end, by a crash while recording, is left out.
+
+    :return: read-only structured array of records, with fields "time", "command", and "readings"
+    """
+    dtype = frame_log_dtype(*read_frame_log_header(path))
+    count = (os.path.getsize(path) - FRAME_LOG_HEADER.size) // dtype.itemsize
+
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode="r", offset=FRAME_LOG_HEADER.size, shape=(count,))
+
+
+def split_commands(records):
+    """
+    Groups the frames of each capture or calibration in a frame log.
+
+    :param records: records of a frame log
+    :return: list of tuples: (command, array with one row per frame and one column per sensor)
+    """
+    commands = records["command"]
+
+    # where one run of equal commands ends and the next one starts
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(commands)) + 1))
+    ends = np.concatenate((starts[1:], [len(commands)]))
+
+    return [(int(commands[start]), np.asarray(records["readings"][start:end], dtype=np.float64))
+            for (start, end) in zip(starts, ends) if len(commands) and commands[start] != 0]
+
+
+def clean_recorded_commands(path):
+    """
+    Cleans the frames of every capture and calibration of a frame log again, as they were when recorded.
+
+    :return: list of tuples: (command, clean reading of each sensor, number of frames)
+    """
+    return [(command, cleanSensorData(frames.T), len(frames)) for (command, frames) in
+            split_commands(open_frame_log(path))]
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print(__doc__.strip())
+        return 1
+
+    for path in paths:
+        records = open_frame_log(path)
+        duration = float(records["time"][-1] - records["time"][0]) if len(records) else 0.0
+
+        print("%s: %s frames of %s sensors over %.1fs" % (path, len(records), records.dtype["readings"].shape[0],
+                                                          duration))
+
+        for (command, readings, number_of_samples) in clean_recorded_commands(path):
+            print("  #%s (%s samples): %s" % (command, number_of_samples, ", ".join("%.2f" % r for r in readings)))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
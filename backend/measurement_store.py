@@ -0,0 +1,142 @@
+import threading
+
+import numpy as np
+
+
+class MeasurementStore(object):
+    """
+    The measurements captured by the BPC tool, kept sorted by Z.
+
+    Readings live in one preallocated array, one row per measurement and one column per sensor, with sensor Z last;
+    it grows by doubling. A binary search on the Z column finds where each new measurement goes.
+
+    Snapshots are read-only views, shared without copying: the store copies its arrays before the next change
+    instead, so a snapshot never changes under whoever holds it. Every method can be called from any thread.
+
+    :param capacity: measurements to make room for up front
+    """
+
+    def __init__(self, capacity=64):
+        self.lock = threading.RLock()
+        self.capacity = capacity
+
+        # allocated once the number of sensors is known
+        self.readings = None
+        # frames each measurement was taken from; 0 if unknown
+        self.samples = np.zeros(capacity, dtype=np.int32)
+        self.count = 0
+
+        # a snapshot holds a view of the current arrays
+        self.shared = False
+
+    def __len__(self):
+        return self.count
+
+    def prepare_change(self, extra=0):
+        # make room for extra measurements, and stop sharing the arrays with snapshots
+        needed = self.count + extra
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+
+        if capacity == self.capacity and not self.shared:
+            return
+
+        if self.readings is not None:
+            readings = np.zeros((capacity, self.readings.shape[1]), dtype=np.float64)
+            readings[:self.count] = self.readings[:self.count]
+            self.readings = readings
+
+        samples = np.zeros(capacity, dtype=np.int32)
+        samples[:self.count] = self.samples[:self.count]
+        self.samples = samples
+
+        self.capacity = capacity
+        self.shared = False
+
+    def add(self, readings, number_of_samples=None):
+        """
+        :param readings: the clean reading of each sensor; sensor Z is the last one
+        :param number_of_samples: frames the readings were taken from, if known
+        :return: index of the new measurement, in Z order
+        """
+        readings = np.asarray(readings, dtype=np.float64)
+
+        with self.lock:
+            if self.readings is None:
+                self.readings = np.zeros((self.capacity, len(readings)), dtype=np.float64)
+            elif len(readings) != self.readings.shape[1]:
+                raise ValueError("expected %s readings, got %s" % (self.readings.shape[1], len(readings)))
+
+            self.prepare_change(1)
+
+            # after the measurements with the same Z, so they keep the order they were taken in
+            index = int(np.searchsorted(self.readings[:self.count, -1], readings[-1], side="right"))
+
+            self.readings[index + 1:self.count + 1] = self.readings[index:self.count]
+            self.samples[index + 1:self.count + 1] = self.samples[index:self.count]
+
+            self.readings[index] = readings
+            self.samples[index] = number_of_samples or 0
+            self.count += 1
+
+            return index
+
+    def delete(self, indices):
+        """
+        :param indices: indices of the measurements to delete, in Z order
+        """
+        with self.lock:
+            if len(indices) == 0:
+                return
+
+            keep = np.ones(self.count, dtype=bool)
+            keep[np.asarray(indices, dtype=np.intp)] = False
+
+            self.prepare_change()
+
+            kept = int(keep.sum())
+            self.readings[:kept] = self.readings[:self.count][keep]
+            self.samples[:kept] = self.samples[:self.count][keep]
+            self.count = kept
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+
+            # allocated again on the next add; the next measurements may have another number of sensors
+            self.readings = None
+
+            # snapshots keep the old arrays
+            if self.shared:
+                self.samples = np.zeros(self.capacity, dtype=np.int32)
+                self.shared = False
+
+    def snapshot(self):
+        """
+        :return: tuple: (read-only array with one row per measurement, in Z order, and one column per sensor;
+                 read-only array with the number of frames each measurement was taken from, 0 if unknown)
+        """
+        with self.lock:
+            if self.readings is None:
+                readings = np.zeros((0, 0), dtype=np.float64)
+            else:
+                readings = self.readings[:self.count]
+            samples = self.samples[:self.count]
+
+            # read-only views; changes go to new arrays from now on
+            readings = readings.view()
+            readings.flags.writeable = False
+            samples = samples.view()
+            samples.flags.writeable = False
+            self.shared = True
+
+            return readings, samples
+
+    def z(self):
+        """
+        :return: read-only array with the Z reading of each measurement, in order
+        """
+        (readings, samples) = self.snapshot()
+
+        return readings[:, -1] if len(readings) else readings.reshape(0)
@@ -0,0 +1,106 @@
+import collections
+
+
+def same_value(a, b):
+    # arrays compare element-wise; anything that doesn't compare to a single bool is only the same as itself
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return a is b
+
+
+class StagedPipeline(object):
+    """
+    Values computed in stages, each one kept until something it depends on changes.
+
+    Parameters are set from outside; stages are computed from parameters and other stages the first time they're
+    asked for. A stage depends on exactly what it gets while it's computed, so a stage that only looks at something
+    in some cases doesn't depend on it in the others. Setting a parameter to a new value drops the stages that depend
+    on it, directly or through other stages, and only those; the rest are reused.
+    """
+
+    def __init__(self):
+        # stage name -> function computing it from the pipeline
+        self.stages = collections.OrderedDict()
+        # parameter or stage name -> value
+        self.values = {}
+        # name -> names of the stages that got it while being computed
+        self.dependents = collections.defaultdict(set)
+        # stages being computed, innermost last
+        self.computing = []
+
+        # stats: times each stage was computed
+        self.computed = collections.Counter()
+
+    def add_stage(self, name, compute):
+        """
+        :param name: name of the stage
+        :param compute: function taking the pipeline, and returning the value of the stage; it gets the parameters
+                        and stages it needs from the pipeline with get
+        """
+        self.stages[name] = compute
+
+    def set(self, name, value):
+        """
+        Sets a parameter. Stages that depend on it are computed again next time, unless the value didn't change.
+        """
+        if name in self.stages:
+            raise ValueError("%s is a stage, not a parameter" % name)
+
+        if name in self.values and same_value(self.values[name], value):
+            return
+
+        self.invalidate(name)
+        self.values[name] = value
+
+    def get(self, name, default=None):
+        """
+        :return: the value of a parameter, or of a stage, computed if needed; default for a parameter that isn't set
+        """
+        # whatever is being computed depends on this
+        if self.computing:
+            self.dependents[name].add(self.computing[-1])
+
+        if name in self.values:
+            return self.values[name]
+
+        compute = self.stages.get(name)
+        if compute is None:
+            return default
+
+        if name in self.computing:
+            raise ValueError("stage %s depends on itself" % name)
+
+        self.computing.append(name)
+        try:
+            value = compute(self)
+        finally:
+            self.computing.pop()
+
+        self.values[name] = value
+        self.computed[name] += 1
+
+        return value
+
+    def is_computed(self, name):
+        return name in self.stages and name in self.values
+
+    def invalidate(self, name):
+        """
+        Drops the stages that depend on a parameter or stage, and the stage itself.
+        """
+        pending = [name]
+
+        while pending:
+            current = pending.pop()
+            pending.extend(self.dependents.pop(current, ()))
+
+            if current in self.stages:
+                self.values.pop(current, None)
+
+    def clear(self):
+        """
+        Drops every parameter and stage value.
+        """
+        self.values.clear()
+        self.dependents.clear()
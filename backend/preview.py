@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def make_preview_base(image, max_size, region=None):
+    """
+    Downscales an image (or a region of it) to display resolution and converts it to PIL, in one pass.
+
+    :param image: source image in OpenCV (BGR) format
+    :param max_size: (max width, max height) of the preview; the image is never upscaled
+    :param region: optional (x, y, w, h) of the source image to use
+    :return: (PIL RGB image, preview pixels per source pixel, (x, y) of the region in the source image)
+    """
+    offset = (0, 0)
+    if region is not None:
+        (x, y, w, h) = region
+        image = image[y:y + h, x:x + w]
+        offset = (x, y)
+
+    (h, w) = image.shape[:2]
+    (max_w, max_h) = max_size
+    scale = min(max_w / w, max_h / h, 1.0)
+
+    if scale < 1.0:
+        image = cv2.resize(image, (max(int(w * scale), 1), max(int(h * scale), 1)), interpolation=cv2.INTER_AREA)
+
+    # swap color channels: BGR -> RGB
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    return Image.fromarray(image), scale, offset
+
+
+def scale_thickness(thickness, scale):
+    # keep lines visible once scaled down
+    return max(int(round(thickness * scale)), 2)
+
+
+class PreviewOverlay(object):
+    """
+    A transparent layer to draw on top of a preview base. Takes coordinates of the source image, and BGR colors,
+    like the rest of the OpenCV code; the base itself is never copied until the overlay is composited.
+    """
+
+    def __init__(self, base, scale, offset=(0, 0)):
+        self.base = base
+        self.scale = scale
+        self.offset = offset
+
+        # RGBA; fully transparent until something is drawn
+        self.layer = np.zeros((base.height, base.width, 4), dtype=np.uint8)
+
+        # line thickness used at full resolution, scaled for display
+        self.thickness = scale_thickness(5, scale)
+
+    def to_preview(self, points):
+        # source image coordinates -> preview coordinates
+        return (np.asarray(points, dtype=np.float64) - self.offset) * self.scale
+
+    def to_point(self, point):
+        (x, y) = self.to_preview(point)
+        return int(x), int(y)
+
+    @staticmethod
+    def to_rgba(color):
+        (b, g, r) = color
+        return r, g, b, 255
+
+    def draw_contour(self, contour, color):
+        contour = self.to_preview(contour).astype(np.int32)
+        cv2.drawContours(self.layer, [contour], 0, color=self.to_rgba(color), thickness=self.thickness)
+
+    def draw_point(self, point, color):
+        cv2.circle(self.layer, self.to_point(point), self.thickness, self.to_rgba(color), -1)
+
+    def draw_line(self, point_a, point_b, color):
+        cv2.line(self.layer, self.to_point(point_a), self.to_point(point_b), self.to_rgba(color),
+                 thickness=self.thickness)
+
+    def draw_text(self, text, origin, color, font_scale=3.0):
+        cv2.putText(self.layer, text, self.to_point(origin), cv2.FONT_HERSHEY_SIMPLEX,
+                    max(font_scale * self.scale, 1.0), self.to_rgba(color), thickness=self.thickness)
+
+    def composite(self):
+        """
+        Blends the overlay onto a copy of the base.
+
+        :return: image in PIL format, at display resolution
+        """
+        result = self.base.copy()
+
+        # the overlay's alpha band is the mask
+        overlay = Image.fromarray(self.layer, "RGBA")
+        result.paste(overlay, (0, 0), overlay)
+
+        return result
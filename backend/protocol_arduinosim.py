@@ -0,0 +1,281 @@
+"""
+A simulated Arduino for the BPC tool, as a pyserial URL handler.
+
+Speaks the same protocol as the real one: answers START with STARTREC and streams one line of ';'-separated sensor
+readings per frame, until it gets STOP, which it answers with STOPREC. Open it with serial.serial_for_url, once
+"backend" is in serial.protocol_handler_packages:
+
+    arduinosim://?sensors=13&rate=50&noise=0.05&seed=0
+
+Options:
+    sensors: readings per frame, the Z sensor last (default 13)
+    rate: frames per second; 0 sends them as fast as they're read (default 50)
+    distance: mean reading of the IR sensors, in cm (default 9.9)
+    z: mean reading of the Z sensor, in cm (default 10)
+    zspeed: speed the tool moves along the rail, in cm/s, as in a continuous scan; at 50 frames/s if the rate is
+        unlimited (default 0)
+    noise: standard deviation of the readings, in cm (default 0.05)
+    dropout: probability of a frame arriving cut short (default 0)
+    disconnect: seconds after START until the device is unplugged; 0 never (default 0)
+    boot: seconds after opening the port during which signals are ignored, like a resetting board (default 0)
+    seed: seed of the random readings, for repeatable runs
+"""
+import threading
+import time
+
+import numpy as np
+from serial.serialutil import SerialBase, SerialException
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+# frames generated at once when the rate is unlimited
+UNTHROTTLED_BATCH = 64
+
+
+class Serial(SerialBase):
+    """
+    Serial port implementation of a simulated Arduino.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.options = {}
+        self.lock = threading.Lock()
+        self.random = None
+
+        # bytes from the device, not read yet
+        self.output = bytearray()
+        # bytes to the device, not parsed yet
+        self.commands = bytearray()
+
+        self.opened_at = 0.0
+        self.streaming = False
+        self.stream_started_at = 0.0
+        self.frames_sent = 0
+        self.unplugged = False
+
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+
+        self.from_url(self.port)
+        self.random = np.random.RandomState(self.options["seed"])
+
+        self.output = bytearray()
+        self.commands = bytearray()
+        self.streaming = False
+        self.unplugged = False
+        self.opened_at = time.perf_counter()
+
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+        super(Serial, self).close()
+
+    def from_url(self, url):
+        """
+        Reads the simulation options from the URL.
+        """
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "arduinosim":
+            raise SerialException('expected a string in the form "arduinosim://[?option=value[&...]]": not starting '
+                                  'with arduinosim:// ({!r})'.format(parts.scheme))
+
+        options = dict(sensors=13, rate=50.0, distance=9.9, z=10.0, zspeed=0.0, noise=0.05, dropout=0.0,
+                       disconnect=0.0, boot=0.0, seed=None)
+
+        try:
+            for option, values in urlparse.parse_qs(parts.query, True).items():
+                if option not in options:
+                    raise ValueError("unknown option: {!r}".format(option))
+
+                options[option] = int(values[0]) if option in ("sensors", "seed") else float(values[0])
+        except ValueError as e:
+            raise SerialException('expected a string in the form "arduinosim://[?option=value[&...]]": {}'.format(e))
+
+        self.options = options
+
+    def _reconfigure_port(self):
+        # no settings to change
+        pass
+
+    def _update_dtr_state(self):
+        pass
+
+    def _update_rts_state(self):
+        pass
+
+    def _update_break_state(self):
+        pass
+
+    # DEVICE
+
+    def check_port(self):
+        if not self.is_open:
+            raise SerialException("Attempting to use a port that is not open")
+
+        disconnect = self.options["disconnect"]
+        if self.streaming and disconnect and time.perf_counter() - self.stream_started_at >= disconnect:
+            self.unplugged = True
+
+        if self.unplugged:
+            raise SerialException("device reports readiness to read but returned no data (device disconnected or "
+                                  "multiple access on port?)")
+
+    def handle_commands(self):
+        # still booting; signals are lost
+        if time.perf_counter() - self.opened_at < self.options["boot"]:
+            self.commands.clear()
+            return
+
+        while True:
+            start = self.commands.find(b"START")
+            stop = self.commands.find(b"STOP")
+            if start < 0 and stop < 0:
+                break
+
+            if stop < 0 or 0 <= start < stop:
+                del self.commands[:start + len(b"START")]
+                self.output += b"STARTREC\r\n"
+
+                if not self.streaming:
+                    self.streaming = True
+                    self.stream_started_at = time.perf_counter()
+                    self.frames_sent = 0
+            else:
+                del self.commands[:stop + len(b"STOP")]
+                self.streaming = False
+                self.output += b"STOPREC\r\n"
+
+        # keep a command that may be cut in half
+        del self.commands[:-len(b"START")]
+
+    def frames_due(self):
+        if not self.streaming:
+            return 0
+
+        rate = self.options["rate"]
+        if rate <= 0:
+            # keep some frames ready
+            return UNTHROTTLED_BATCH if len(self.output) < 1024 else 0
+
+        return int((time.perf_counter() - self.stream_started_at) * rate) - self.frames_sent
+
+    def generate_frames(self):
+        count = self.frames_due()
+        if count <= 0:
+            return
+
+        sensors = self.options["sensors"]
+        means = np.full(sensors, self.options["distance"])
+        means[-1] = self.options["z"]
+
+        readings = means + self.random.normal(0.0, self.options["noise"], size=(count, sensors))
+
+        # the tool moving along the rail
+        if self.options["zspeed"]:
+            rate = self.options["rate"] if self.options["rate"] > 0 else 50.0
+            readings[:, -1] += self.options["zspeed"] * np.arange(self.frames_sent, self.frames_sent + count) / rate
+
+        for frame in readings:
+            line = ";".join("%.2f" % value for value in frame)
+
+            # lost bytes; the frame arrives cut short
+            if self.random.random_sample() < self.options["dropout"]:
+                line = line[:self.random.randint(len(line))]
+
+            self.output += line.encode() + b"\r\n"
+
+        self.frames_sent += count
+
+    def time_to_next_frame(self):
+        rate = self.options["rate"]
+        if not self.streaming or rate <= 0:
+            return None
+
+        next_frame_at = self.stream_started_at + (self.frames_sent + 1) / rate
+        return max(next_frame_at - time.perf_counter(), 0.0)
+
+    # PORT
+
+    @property
+    def in_waiting(self):
+        with self.lock:
+            self.check_port()
+            self.generate_frames()
+
+            return len(self.output)
+
+    def read(self, size=1):
+        deadline = None if self._timeout is None else time.perf_counter() + self._timeout
+        data = bytearray()
+
+        while len(data) < size:
+            with self.lock:
+                self.check_port()
+                self.generate_frames()
+
+                taken = self.output[:size - len(data)]
+                del self.output[:len(taken)]
+                data += taken
+
+                wait = self.time_to_next_frame()
+
+            if len(data) >= size:
+                break
+
+            # wait for the next frame, or until the timeout
+            if deadline is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                wait = remaining if wait is None else min(wait, remaining)
+            elif wait is None:
+                wait = 0.01
+
+            time.sleep(wait)
+
+        return bytes(data)
+
+    def write(self, data):
+        with self.lock:
+            self.check_port()
+
+            self.commands += bytes(data)
+            self.handle_commands()
+
+        return len(data)
+
+    def reset_input_buffer(self):
+        with self.lock:
+            self.output.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    @property
+    def out_waiting(self):
+        return 0
+
+    @property
+    def cts(self):
+        return True
+
+    @property
+    def dsr(self):
+        return True
+
+    @property
+    def ri(self):
+        return False
+
+    @property
+    def cd(self):
+        return True
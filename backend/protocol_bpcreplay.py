@@ -0,0 +1,124 @@
+"""
+Replays a frame log (see backend/frame_log.py) as an Arduino, as a pyserial URL handler.
+
+Frames are sent back as the same ';'-separated lines the Arduino sends, so they go through the same parsing and
+cleaning as a live feed, and at the pace they were recorded at. Readings are sent with the 2 decimals the Arduino
+sends; logs of the first version stored them as float32, which holds them to within 0.01 up to about 65000 cm. Open it with serial.serial_for_url, once "backend" is
+in serial.protocol_handler_packages:
+
+    bpcreplay://path/to/session.bpclog?rate=0
+
+Once every frame of the log has been read, the device is unplugged: reads fail with a SerialException, like they do
+when an Arduino goes away, instead of waiting for frames that will never come.
+
+Options:
+    rate: frames per second; 0 sends them as fast as they're read (default: the times they were recorded at)
+"""
+import time
+
+import numpy as np
+from serial.serialutil import SerialException
+
+from backend import protocol_arduinosim
+from backend.frame_log import open_frame_log
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+
+class Serial(protocol_arduinosim.Serial):
+    """
+    Serial port implementation that replays a frame log.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.records = None
+        # next record to send
+        self.position = 0
+
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def from_url(self, url):
+        """
+        Reads the path of the frame log and the options from the URL.
+        """
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != "bpcreplay":
+            raise SerialException('expected a string in the form "bpcreplay://PATH[?rate=FPS]": not starting with '
+                                  'bpcreplay:// ({!r})'.format(parts.scheme))
+
+        options = dict(rate=None, disconnect=0.0, boot=0.0, seed=None)
+
+        try:
+            for option, values in urlparse.parse_qs(parts.query, True).items():
+                if option != "rate":
+                    raise ValueError("unknown option: {!r}".format(option))
+
+                options[option] = float(values[0])
+
+            self.records = open_frame_log(parts.netloc + parts.path)
+        except (IOError, ValueError) as e:
+            raise SerialException('expected a string in the form "bpcreplay://PATH[?rate=FPS]": {}'.format(e))
+
+        self.options = options
+        self.position = 0
+
+    def frames_due(self):
+        if self.options["rate"] is not None or not self.streaming:
+            return super(Serial, self).frames_due()
+
+        if self.position >= len(self.records):
+            return 0
+
+        # frames recorded up to now, counting from the first one
+        elapsed = time.perf_counter() - self.stream_started_at + float(self.records["time"][0])
+        return int(np.searchsorted(self.records["time"], elapsed, side="right")) - self.position
+
+    def time_to_next_frame(self):
+        if self.options["rate"] is not None:
+            return super(Serial, self).time_to_next_frame()
+
+        if not self.streaming or self.position >= len(self.records):
+            return None
+
+        # as long after the first frame as it was recorded
+        next_frame_at = self.stream_started_at + float(self.records["time"][self.position] - self.records["time"][0])
+        return max(next_frame_at - time.perf_counter(), 0.0)
+
+    def check_end(self):
+        # everything was read; the feed is over
+        if self.streaming and self.position >= len(self.records) and not self.output:
+            self.unplugged = True
+            raise SerialException("end of the frame log: %s frames replayed" % self.position)
+
+    @property
+    def in_waiting(self):
+        waiting = super(Serial, self).in_waiting
+        if not waiting:
+            with self.lock:
+                self.check_end()
+
+        return waiting
+
+    def read(self, size=1):
+        data = super(Serial, self).read(size)
+        if not data:
+            with self.lock:
+                self.check_end()
+
+        return data
+
+    def generate_frames(self):
+        count = min(self.frames_due(), len(self.records) - self.position)
+        if count <= 0:
+            return
+
+        readings = np.asarray(self.records["readings"][self.position:self.position + count], dtype=np.float64)
+
+        for frame in readings:
+            self.output += ";".join("%.2f" % value for value in frame).encode() + b"\r\n"
+
+        self.position += count
+        self.frames_sent += count
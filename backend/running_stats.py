@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class RunningStats(object):
+    """
+    Mean and variance of each sensor, updated one frame at a time (Welford's algorithm), without keeping the frames.
+
+    :param number_of_sensors: readings per frame
+    """
+
+    def __init__(self, number_of_sensors):
+        self.count = 0
+        self.mean = np.zeros(number_of_sensors, dtype=np.float64)
+        # sum of squared differences from the mean
+        self.m2 = np.zeros(number_of_sensors, dtype=np.float64)
+
+    def add(self, frame):
+        """
+        :param frame: one reading per sensor
+        """
+        frame = np.asarray(frame, dtype=np.float64)
+
+        self.count += 1
+        delta = frame - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (frame - self.mean)
+
+    def variance(self):
+        """
+        :return: sample variance of each sensor, or None if there are less than 2 frames
+        """
+        if self.count < 2:
+            return None
+
+        return self.m2 / (self.count - 1)
+
+    def stdev(self):
+        """
+        :return: sample standard deviation of each sensor, or None if there are less than 2 frames
+        """
+        if self.count < 2:
+            return None
+
+        return np.sqrt(self.variance())
+
+    def standard_error(self):
+        """
+        :return: standard error of the mean of each sensor, or None if there are less than 2 frames
+        """
+        if self.count < 2:
+            return None
+
+        return self.stdev() / np.sqrt(self.count)
+
+    def is_settled(self, tolerance):
+        """
+        :param tolerance: largest standard error allowed
+        :return: whether the mean of every sensor is known within the tolerance
+        """
+        standard_error = self.standard_error()
+
+        return standard_error is not None and bool(np.all(standard_error <= tolerance))
@@ -1,22 +1,47 @@
 import math
-import statistics
+import os
 import time
 import warnings
 
+import numpy as np
 import serial
 import serial.tools.list_ports
 
+from backend.running_stats import RunningStats
+from backend.serial_reader import SerialFrameReader
 from backend.utils import twoPointDistance
 
+# URL handlers of our own, like the simulated Arduino: arduinosim://
+serial.protocol_handler_packages.append("backend")
+
 sensorArray = []
-sensors_initialized = False
 
 numberOfSamples = 10
+
+# Adaptive capture: keep sampling until the mean of every sensor is known within
+# standardErrorTolerance (cm), between minNumberOfSamples and maxNumberOfSamples.
+# numberOfSamples is used instead when it's off, which is the default; set
+# BAMBOO_ADAPTIVE_SAMPLING=1 to turn it on. Steady readings then take fewer samples
+# than numberOfSamples.
+adaptiveSampling = os.environ.get("BAMBOO_ADAPTIVE_SAMPLING", "") not in ("", "0")
+minNumberOfSamples = 5
+maxNumberOfSamples = 50
+standardErrorTolerance = 0.05
+
 cacheStructuredSensorData = []
 usingCache = False
 
-arduinoSerial = None
-isPortOpen = False
+# Ports or pyserial URLs to use instead of searching for Arduinos, separated by spaces, e.g.
+# arduinosim://?rate=50 for the simulated one (see backend/protocol_arduinosim.py)
+arduinoUrl = os.environ.get("BAMBOO_ARDUINO_URL")
+
+# Seconds to wait for sensor data before giving control back to the caller
+readTimeout = 0.5
+
+# Seconds to wait for the Arduino to answer a START or STOP signal, including its boot
+# after the port is opened, and seconds between repeated signals
+handshakeTimeout = 6.0
+handshakeInterval = 0.25
 
 
 # Returns usingCache value. Determines if system looks for new data or uses
@@ -35,38 +60,45 @@ def clearCache():
     print("Cache Cleared")
 
 
-# Returns a line of raw data from Arduino.
+# Returns the latest frame of sensor readings from Arduino, as a float array.
 def getInstantRawSensorData():
-    global arduinoSerial, isPortOpen
+    openArduinoSerial()
+
+    return arduinoConnection.reader.read_latest_frame()
 
-    if isPortOpen:
-        readLine = arduinoSerial.readline()
-        lineFromPort = str(readLine)[2:len(readLine)]
 
-        splittedArray = lineFromPort.split(";")
+# Gets frames from Arduino until the capture is complete. Returns an array with one
+# row per sample and one column per sensor.
+def getRawSensorData():
+    openArduinoSerial()
+    arduinoReader = arduinoConnection.reader
 
-        return splittedArray
+    if not adaptiveSampling:
+        return arduinoReader.read_frames(numberOfSamples)
 
-    else:
-        openArduinoSerial()
-        return getInstantRawSensorData()
+    frames = []
+    stats = None
 
+    while stats is None or not isCaptureComplete(stats):
+        frame = arduinoReader.read_frame()
+        frames.append(frame)
 
-# Gets data from Arduino and stores it in an array containing strings of the
-# raw data from USB bus. Returns array with strings.
-def getRawSensorData():
-    ser = openArduinoSerial()
+        if stats is None:
+            stats = RunningStats(len(frame))
+        stats.add(frame)
 
-    resultsFromPort = []
+    return np.array(frames)
 
-    # Determines number of samples to be taken from USB bus
-    for i in range(numberOfSamples):
-        lineFromPortByteArray = ser.readline()
-        # Convert bytes from USB to string. Strips first two characters
-        lineFromPort = str(lineFromPortByteArray)[2:len(lineFromPortByteArray)]
-        resultsFromPort.append(lineFromPort)
 
-    return resultsFromPort
+# Whether enough frames have been captured, given the running stats of the frames so far.
+def isCaptureComplete(stats):
+    if not adaptiveSampling:
+        return stats.count >= numberOfSamples
+
+    if stats.count >= maxNumberOfSamples:
+        return True
+
+    return stats.count >= minNumberOfSamples and stats.is_settled(standardErrorTolerance)
 
 
 # Gets raw sensor data and creates an array of arrays. Each array contains sensor data
@@ -84,24 +116,8 @@ def getStructuredSensorData():
 
     else:
 
-        finalArray = []
-        resultsFromPort = getRawSensorData()
-        # Just to determine number of sensors reported by Arduino
-        firstSplit = resultsFromPort[0].split(";")
-        numberOfSensors = len(firstSplit)
-
-        # Creates an array per sensor
-        for i in range(numberOfSensors):
-            finalArray.append([])
-
-        # Iterates through samples and save each sensor data to its respective array
-        for i in range(0, len(resultsFromPort)):
-
-            splittedLine = resultsFromPort[i].split(";")
-            # print(splittedLine)
-
-            for j in range(numberOfSensors):
-                finalArray[j].append(float(splittedLine[j]))
+        # One row per sensor, with its samples
+        finalArray = getRawSensorData().T.tolist()
 
         # Cache data is now the data just collected
         # cacheStructuredSensorData = finalArray
@@ -113,140 +129,244 @@ def getStructuredSensorData():
 
 # Gets the Mean from each sensor data. Returns an array of floats.
 def getMeanSensorData(data):
-    try:
-        resultArray = []
-
-        for i in range(0, len(data)):
-            resultArray.append(round(statistics.mean(data[i]), 2))
-
-        return resultArray
+    data = np.asarray(data, dtype=np.float64)
 
-    except statistics.StatisticsError as e:
-        print("There was an error with the statistics module")
-        print(e)
+    if data.ndim != 2 or data.shape[1] < 1:
+        print("Mean requires at least one sample per sensor")
         return []
 
+    return roundSensorData(data.mean(axis=1))
+
 
 # Gets the Standard Deviation from each sensor data. Returns an array of floats.
 def getStdevSensorData(data):
-    try:
-        resultArray = []
+    data = np.asarray(data, dtype=np.float64)
+
+    if data.ndim != 2 or data.shape[1] < 2:
+        print("Standard deviation requires at least two samples per sensor")
+        return []
 
-        for i in range(0, len(data)):
-            resultArray.append(round(statistics.stdev(data[i]), 2))
+    return roundSensorData(data.std(axis=1, ddof=1))
 
-        return resultArray
 
-    except statistics.StatisticsError as e:
-        print("There was an error with the statistics module")
-        print(e)
-        return []
+# Rounds each value to 2 decimals, as Python's round() does; np.round can land on the
+# other side of a tie. Returns an array of floats.
+def roundSensorData(values):
+    return [round(x, 2) for x in values.tolist()]
 
 
 # Removes outliers using mean and stdev for each sensor data. After removing ouliers,
 # returns the average of the remaining data.
 def getCleanSensorData():
-    finalArray = []
-    structuredData = getStructuredSensorData()
-    meanData = getMeanSensorData(structuredData)
-    stdevData = getStdevSensorData(structuredData)
+    return cleanSensorData(getStructuredSensorData())
 
-    # print(structuredData)
-    # print(meanData)
-    # print(stdevData)
 
-    for i in range(0, len(structuredData)):
-        s = structuredData[i]
-        mean = meanData[i]
-        stdev = stdevData[i]
-        temp_list = [x for x in s if (x > mean - 2 * stdev)]
-        temp_list = [x for x in temp_list if (x < mean + 2 * stdev)]
+# Removes outliers from already collected data, one array of samples per sensor.
+# All sensors are done at once, as a 2-D array with one row per sensor.
+def cleanSensorData(structuredData):
+    data = np.asarray(structuredData, dtype=np.float64)
 
-        if (len(temp_list) > 0):
-            finalArray.append(round(statistics.mean(temp_list), 2))
+    # rounded like getMeanSensorData and getStdevSensorData
+    mean = np.array(roundSensorData(data.mean(axis=1)))
+    if data.shape[1] > 1:
+        stdev = np.array(roundSensorData(data.std(axis=1, ddof=1)))
+    else:
+        stdev = np.zeros_like(mean)
 
-        else:
-            finalArray.append(0.0)
+    # keep samples strictly within 2 stdev of the mean
+    lower = (mean - 2 * stdev)[:, np.newaxis]
+    upper = (mean + 2 * stdev)[:, np.newaxis]
+    inliers = (data > lower) & (data < upper)
 
-    return finalArray
+    kept = inliers.sum(axis=1)
+    total = np.where(inliers, data, 0.0).sum(axis=1)
 
+    # a steady sensor has no spread to keep samples within; its mean is its reading
+    clean = np.where(kept > 0, total / np.maximum(kept, 1), mean)
 
-# Looks for Arduino port and opens it.
-def openArduinoSerial():
-    global arduinoSerial, isPortOpen
+    return roundSensorData(clean)
+
+
+# Lists the ports with the word Arduino in their description, or the configured arduinoUrl.
+def findArduinoPorts():
+    if arduinoUrl:
+        return arduinoUrl.split()
+
+    return [p.device for p in serial.tools.list_ports.comports() if 'Arduino' in p.description]
+
+
+# Sends signal to Arduino until it answers with reply, or handshakeTimeout expires. Lines
+# read in between (sensor readings, boot messages) are ignored. Returns whether it answered.
+def arduinoHandshake(ser, signal, reply):
+    deadline = time.perf_counter() + handshakeTimeout
+    previousTimeout = ser.timeout
+    ser.timeout = handshakeInterval
+
+    # a line cut short by the read timeout
+    partialLine = b""
+
+    try:
+        while time.perf_counter() < deadline:
+            # Has to be encoded from string to bytes.
+            ser.write(signal.encode())
+
+            # give it until the next signal to answer
+            signalDeadline = min(time.perf_counter() + handshakeInterval, deadline)
+            while time.perf_counter() < signalDeadline:
+                readLine = partialLine + ser.readline()
+                if reply.encode() in readLine:
+                    return True
+
+                partialLine = b"" if readLine.endswith(b"\n") else readLine
+
+        return False
+
+    finally:
+        ser.timeout = previousTimeout
+
+
+class ArduinoConnection(object):
+    """
+    The serial connection to one Arduino: the port, the handshakes, and the reader of its feed.
+
+    Each Arduino gets its own, so several measuring rings can be read at once; the functions of this module use
+    arduinoConnection, the one of the program.
+
+    :param url: port or pyserial URL of the Arduino; searched with findArduinoPorts if None
+    """
+
+    def __init__(self, url=None):
+        self.url = url
+        self.serial = None
+        self.reader = None
+        self.is_open = False
+
+        # port where the Arduino was last found; tried first the next time
+        self.port = url
+
+    @property
+    def malformed_frames(self):
+        """
+        Number of lines from the Arduino that could not be decoded into sensor readings.
+        """
+        if self.reader is None:
+            return 0
+
+        return self.reader.malformed_frames
+
+    def open_port(self):
+        # Opens the port, without the handshake. The port it was found at last time is
+        # tried first, before searching all the ports.
+        if self.port is not None:
+            try:
+                return serial.serial_for_url(self.port, timeout=handshakeInterval)
+            except serial.SerialException:
+                print("Arduino is no longer at %s" % self.port)
+                self.port = self.url
+
+                # nowhere else to look
+                if self.url is not None:
+                    raise
 
-    if not isPortOpen:
         print("Searching for Arduino Port...")
 
-        arduino_ports = [  # List of ports containing the word Arduino in their description
-            p.device
-            for p in serial.tools.list_ports.comports()
-            if 'Arduino' in p.description
-        ]
+        arduino_ports = findArduinoPorts()
         if not arduino_ports:
             raise IOError("No Arduino found")
         if len(arduino_ports) > 1:
             warnings.warn('Multiple Arduinos found - using the first')
 
-        arduinoSerial = serial.Serial(arduino_ports[0])
-        print("Arduino Port found at %s" % (arduino_ports[0]))
+        return serial.serial_for_url(arduino_ports[0], timeout=handshakeInterval)
 
-        time.sleep(3)
+    def open(self):
+        """
+        Opens the port and starts the feed, if it's not open already.
 
-        print("NOTICE: START signal send to Arduino")
+        :return: the serial port
+        :raise IOError: if there's no Arduino, or it didn't answer
+        """
+        if self.is_open:
+            return self.serial
 
-        # Send START signal to Arduino. Has to be encoded from string to bytes.
-        arduinoSerial.write("START".encode())
-        readLine = arduinoSerial.readline()
+        ser = self.open_port()
+        print("Arduino Port found at %s" % ser.port)
 
-        # Checks for handshake STARTREC
-        while ("STARTREC" not in str(readLine)[2:len(readLine)]):
-            print("WARNING: START not received, trying again...")
-            print(readLine)
-            time.sleep(1)
-            # Send START signal again
-            arduinoSerial.write("START".encode())
-            readline = arduinoSerial.readline()
+        print("NOTICE: START signal send to Arduino")
+
+        # Arduino may be booting after the port was opened; keep asking until it's ready
+        if not arduinoHandshake(ser, "START", "STARTREC"):
+            ser.close()
+            self.port = self.url
+            raise IOError("Arduino did not answer the START signal")
 
         print("NOTICE: Arduino Handshake Received")
 
-        isPortOpen = True
+        self.port = ser.port
 
-    return arduinoSerial
+        # Sensor readings are read in bulk from here on; don't block forever if Arduino goes quiet
+        ser.timeout = readTimeout
+        self.serial = ser
+        self.reader = SerialFrameReader(ser)
+        self.is_open = True
 
+        return ser
 
-def closeArduinoSerial():
-    global arduinoSerial, isPortOpen
+    def close(self):
+        """
+        Stops the feed and closes the port.
+        """
+        if self.serial is None:
+            return
 
-    arduinoSerial.write("STOP".encode())
-    readLine = arduinoSerial.readline()
+        # Arduino keeps sending readings until it gets the STOP signal
+        if arduinoHandshake(self.serial, "STOP", "STOPREC"):
+            print("NOTICE: Arduino Handshake Received")
+        else:
+            print("WARNING: STOP not received, closing anyway")
 
-    # Checks for handshake STOPREC
-    while ("STOPREC" not in str(readLine)[2:len(readLine)]):
-        print("WARNING: STOP not received, trying again...")
-        time.sleep(1)
-        # Send STOP signal again
-        arduinoSerial.write("STOP".encode())
-        readLine = arduinoSerial.readline()
+        self.serial.close()
+        self.hard_reset()
 
-    print("NOTICE: Arduino Handshake Received")
+    def hard_reset(self):
+        """
+        Forgets the port without closing it, after the Arduino went away.
+        """
+        self.serial = None
+        self.reader = None
+        self.is_open = False
 
-    arduinoSerial.close()
-    isPortOpen = False
+    def read_available(self):
+        """
+        :return: tuple: (all the frames received since the last call, the time each one arrived), waiting up to the
+                 port's read timeout for data if there is none
+        """
+        self.reader.receive(block=True)
 
+        return self.reader.take_frames()
 
-def hardResetArduinoSerial():
-    global arduinoSerial, isPortOpen
 
-    arduinoSerial = None
-    isPortOpen = False
+# The Arduino of the program
+arduinoConnection = ArduinoConnection()
+
+
+# Looks for Arduino port and opens it.
+def openArduinoSerial():
+    return arduinoConnection.open()
+
+
+def closeArduinoSerial():
+    arduinoConnection.close()
+
+
+def hardResetArduinoSerial():
+    arduinoConnection.hard_reset()
 
 
 ###########################################################
 ## CALIBRATION
 ###########################################################
 def are_sensors_initialized():
-    return sensors_initialized
+    return sensorCalibration.initialized
 
 
 def threePointAngle(vertexp1, p2, p3):
@@ -282,51 +402,50 @@ def PointsInCircum(r, n):
     return [(math.cos(2.0 * math.pi / n * x) * r, math.sin(2.0 * math.pi / n * x) * r) for x in range(0, n + 1)]
 
 
-def initSensors(structureRadius=11.5):
-    global sensorArray
-
-    # clear sensor array
-    sensorArray.clear()
-
-    numberOfSensors = len(getStructuredSensorData())
-    # numberOfSensors = 13 #TEMPORAL TWEAK
-    # print(numberOfSensors)
+def initSensors(structureRadius=11.5, numberOfSensors=None):
+    if numberOfSensors is None:
+        numberOfSensors = len(getStructuredSensorData())
 
-    angle = 360
-    decrement = 360 / (numberOfSensors - 1)
+    sensorCalibration.init_sensors(structureRadius, numberOfSensors)
 
-    for i in range(0, numberOfSensors - 1):
-        # print(angle)
-        x = round(structureRadius * (math.cos(math.radians(angle))), 2)
-        y = round(structureRadius * (math.sin(math.radians(angle))), 2)
-        angle = angle - decrement
-        sensorArray.append(IRSensor(x, y))
 
-    sensorArray.append(UltSensor())
+# Calibrates all IR sensors at once. Each sensor is aimed at the point of the calibration
+# circle (centered at the origin) whose distance to the sensor matches its reading: the
+# intersection of the calibration circle with a circle of that radius around the sensor.
+# The two intersections are mirror images across the line from the sensor to the center;
+# the one counterclockwise of that line, seen from the center, is used for every sensor. If
+# the circles don't meet, the point of the calibration circle closest to the reading is used.
+def calibrateIRSensors(sensors, distancesMeasured, testRadius):
+    xi = np.array([s.xi for s in sensors], dtype=np.float64)
+    yi = np.array([s.yi for s in sensors], dtype=np.float64)
+    d = np.asarray(distancesMeasured, dtype=np.float64)
 
+    # sensor position in polar coordinates
+    sensorDistance = np.hypot(xi, yi)
+    sensorAngle = np.arctan2(yi, xi)
 
-def calibrateSingleIRSensor(s, distanceMeasured, testPoints):
-    closestDiff = 999999
-    closestPoint = (0, 0)
-    r = 0.0
+    # law of cosines: angle at the origin between the sensor and the point
+    cosSpread = (sensorDistance ** 2 + testRadius ** 2 - d ** 2) / (2.0 * sensorDistance * testRadius)
+    spread = np.arccos(np.clip(cosSpread, -1.0, 1.0))
 
-    for p in testPoints:
-        tempDistance = math.sqrt(pow((p[0] - s.xi), 2.0) + pow((p[1] - s.yi), 2.0))
-        tempDiff = math.fabs(tempDistance - distanceMeasured)
+    # counterclockwise of the sensor's axis
+    angle = sensorAngle + spread
 
-        if (tempDiff < closestDiff):
-            closestDiff = tempDiff
-            closestPoint = p
-            r = tempDistance
+    xf = np.cos(angle) * testRadius
+    yf = np.sin(angle) * testRadius
+    r = np.hypot(xf - xi, yf - yi)
 
-    s.xf = closestPoint[0]
-    s.yf = closestPoint[1]
-    s.r = r
+    # deviation of the sensor, between the calibration point and the origin
+    cosDeviation = (r ** 2 + sensorDistance ** 2 - testRadius ** 2) / (2.0 * r * sensorDistance)
+    deviation = np.degrees(np.arccos(np.clip(np.round(cosDeviation, 10), -1.0, 1.0)))
 
-    deviation = threePointAngle((s.xi, s.yi), closestPoint, (0.0, 0.0))  # HACER TEST
-    s.devAngle = round(deviation, 2)
+    for i, s in enumerate(sensors):
+        s.xf = float(xf[i])
+        s.yf = float(yf[i])
+        s.r = float(r[i])
+        s.devAngle = round(float(deviation[i]), 2)
 
-    return s
+    return sensors
 
 
 def calibrateSingleUltSensor(s, distanceMeasured, testDistance):
@@ -341,27 +460,111 @@ def calibrateSingleUltSensor(s, distanceMeasured, testDistance):
         return s
 
 
-def calibrateAllSensors(testRadius=1.58, testDistance=10):
-    global sensorArray, sensors_initialized
-
+def calibrateAllSensors(testRadius=1.58, testDistance=10, measuredDistances=None):
     if (len(sensorArray) == 0):
         initSensors()
 
-    # Generate virtual calibration object
-    testPoints = PointsInCircum(testRadius, 1000)
+    # Grab fresh sensor readings, unless they were already taken
+    if measuredDistances is None:
+        measuredDistances = getCleanSensorData()
 
-    # Grab fresh sensor readings
-    measuredDistances = getCleanSensorData()
+    sensorCalibration.calibrate(testRadius, testDistance, measuredDistances)
 
-    # calibrate IR sensors
-    for i in range(0, len(sensorArray) - 1):
-        sensorArray[i] = calibrateSingleIRSensor(sensorArray[i], measuredDistances[i], testPoints)
 
-    # calibrate ultrasonic sensor
-    sensorArray[-1] = calibrateSingleUltSensor(sensorArray[-1], measuredDistances[-1], testDistance)
+class SensorCalibration(object):
+    """
+    The sensors of one measuring ring, and their calibration.
+
+    Each ring gets its own, so several can be calibrated and measured at once; the functions of this module use
+    sensorCalibration, the one of the program, whose sensors are sensorArray.
+
+    :param sensors: list to keep the sensors in; a new one if None
+    """
+
+    def __init__(self, sensors=None):
+        # the IR sensors, then the ultrasonic one
+        self.sensors = [] if sensors is None else sensors
+        self.initialized = False
+
+        # calibrated geometry of the IR sensors, as arrays; see ir_geometry
+        self.geometry = None
+
+    def init_sensors(self, structureRadius, numberOfSensors):
+        """
+        Places the IR sensors evenly around a ring, uncalibrated.
+        """
+        sensors = self.sensors
+
+        # clear sensor array, in place; it may be shared
+        sensors.clear()
+        self.geometry = None
+
+        angle = 360
+        decrement = 360 / (numberOfSensors - 1)
+
+        for i in range(0, numberOfSensors - 1):
+            x = round(structureRadius * (math.cos(math.radians(angle))), 2)
+            y = round(structureRadius * (math.sin(math.radians(angle))), 2)
+            angle = angle - decrement
+            sensors.append(IRSensor(x, y))
+
+        sensors.append(UltSensor())
+
+    def calibrate(self, testRadius, testDistance, measuredDistances):
+        """
+        Calibrates every sensor against the calibration object.
+
+        :param measuredDistances: clean reading of each sensor, of the calibration object
+        """
+        sensors = self.sensors
+
+        # calibrate IR sensors against the calibration object
+        sensors[:-1] = calibrateIRSensors(sensors[:-1], measuredDistances[:len(sensors) - 1], testRadius)
+        self.geometry = None
+
+        # calibrate ultrasonic sensor
+        sensors[-1] = calibrateSingleUltSensor(sensors[-1], measuredDistances[-1], testDistance)
+
+        # flag that sensors have been initialized/calibrated
+        self.initialized = True
+
+    @property
+    def z_factor(self):
+        """
+        Calibration factor of the ultrasonic sensor; 1 until calibrated.
+        """
+        return self.sensors[-1].factor if self.sensors else 1
+
+    def ir_geometry(self):
+        """
+        Calibrated geometry of the IR sensors, as arrays with one element per sensor: where each sensor is, its
+        calibration point, and the distance between them. Computed once per calibration.
+
+        :return: tuple: (xi, yi, xf, yf, r)
+        """
+        if self.geometry is None:
+            irSensors = self.sensors[:-1]
+            self.geometry = tuple(np.array([getattr(s, attribute) for s in irSensors], dtype=np.float64)
+                                  for attribute in ("xi", "yi", "xf", "yf", "r"))
+
+        return self.geometry
+
+    def dist_to_points(self, distancesMeasured):
+        """
+        Same as distToPointSingleIRSensor, for all IR sensors and any number of captures at once.
+
+        :param distancesMeasured: one row per capture and one column per IR sensor
+        :return: tuple: (x, y), each shaped like distancesMeasured
+        """
+        (xi, yi, xf, yf, r) = self.ir_geometry()
+
+        t = np.asarray(distancesMeasured, dtype=np.float64) / r
+
+        return ((1.0 - t) * xi) + (t * xf), ((1.0 - t) * yi) + (t * yf)
+
 
-    # flag that sensors have been initialized/calibrated
-    sensors_initialized = True
+# The sensors of the program
+sensorCalibration = SensorCalibration(sensorArray)
 
 
 ###############################################################
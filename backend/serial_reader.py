@@ -0,0 +1,178 @@
+import collections
+import time
+
+import numpy as np
+
+# consecutive frames of the same length it takes to settle the number of sensors, when it isn't given
+SENSOR_COUNT_FRAMES = 5
+
+
+class SerialFrameReader(object):
+    """
+    Reads the Arduino's sensor feed: one frame per line, with readings separated by ';'.
+
+    Bytes are pulled from the port in bulk, split into lines as they arrive, and decoded straight into float arrays.
+    Lines that aren't a complete frame (handshakes, partial lines after opening the port, a different number of
+    readings) are counted as malformed and dropped.
+
+    If the number of readings per frame isn't given, it's settled by SENSOR_COUNT_FRAMES consecutive frames of the
+    same length; those frames are held back until then, and a truncated frame right after opening the port is just
+    dropped instead of deciding what every frame after it should look like.
+
+    Each frame is stamped with the time the bytes that completed it were received.
+
+    :param ser: an open serial port
+    :param number_of_sensors: readings per frame; settled from the feed if not given
+    """
+
+    def __init__(self, ser, number_of_sensors=None):
+        self.ser = ser
+        self.number_of_sensors = number_of_sensors
+
+        # bytes received after the last complete line
+        self.buffer = bytearray()
+        # decoded frames not yet handed out, and the time each one arrived
+        self.frames = collections.deque()
+        self.arrival_times = collections.deque()
+        # (arrival time, frame) of the same length, while the number of sensors isn't settled
+        self.unconfirmed_frames = []
+
+        # stats
+        self.frames_read = 0
+        self.malformed_frames = 0
+
+    def reset(self):
+        """
+        Drops everything received so far.
+        """
+        self.buffer.clear()
+        self.frames.clear()
+        self.arrival_times.clear()
+        self.unconfirmed_frames = []
+
+    def receive(self, block=False):
+        """
+        Pulls whatever bytes are waiting on the port and decodes the complete lines among them.
+
+        :param block: wait for at least one byte (up to the port's timeout) if nothing is waiting
+        """
+        waiting = self.ser.in_waiting
+        if waiting:
+            data = self.ser.read(waiting)
+        elif block:
+            data = self.ser.read(1)
+        else:
+            return
+
+        if not data:
+            return
+
+        arrival_time = time.time()
+        self.buffer += data
+
+        # split complete lines; the last piece is incomplete, keep it for later
+        lines = self.buffer.split(b"\n")
+        self.buffer = bytearray(lines.pop())
+
+        for line in lines:
+            frame = self.decode(line)
+            if frame is not None:
+                self.add(frame, arrival_time)
+
+    def decode(self, line):
+        """
+        Decodes a line into a frame of readings.
+
+        :param line: bytes, without the trailing newline
+        :return: float array with one reading per sensor, or None if the line is malformed
+        """
+        try:
+            frame = np.array([float(value) for value in line.split(b";")])
+        except ValueError:
+            self.malformed_frames += 1
+            return None
+
+        if self.number_of_sensors is not None and len(frame) != self.number_of_sensors:
+            self.malformed_frames += 1
+            return None
+
+        return frame
+
+    def add(self, frame, arrival_time):
+        """
+        Queues a decoded frame. While the number of sensors isn't settled, frames are held back until
+        SENSOR_COUNT_FRAMES consecutive frames agree on it; frames held for a length the feed didn't keep are
+        malformed.
+        """
+        if self.number_of_sensors is not None:
+            self.frames.append(frame)
+            self.arrival_times.append(arrival_time)
+            self.frames_read += 1
+            return
+
+        if self.unconfirmed_frames and len(self.unconfirmed_frames[0][1]) != len(frame):
+            self.malformed_frames += len(self.unconfirmed_frames)
+            self.unconfirmed_frames = []
+
+        self.unconfirmed_frames.append((arrival_time, frame))
+        if len(self.unconfirmed_frames) < SENSOR_COUNT_FRAMES:
+            return
+
+        self.number_of_sensors = len(frame)
+        for (arrival_time, frame) in self.unconfirmed_frames:
+            self.frames.append(frame)
+            self.arrival_times.append(arrival_time)
+        self.frames_read += len(self.unconfirmed_frames)
+        self.unconfirmed_frames = []
+
+    def take_frames(self):
+        """
+        :return: tuple: (the frames not handed out yet, the time each one arrived); they're handed out now
+        """
+        frames = list(self.frames)
+        arrival_times = list(self.arrival_times)
+        self.frames.clear()
+        self.arrival_times.clear()
+
+        return frames, arrival_times
+
+    def read_frame(self, timeout=None):
+        """
+        The next frame from the feed.
+
+        :param timeout: seconds to wait for it; waits indefinitely if None
+        :return: float array with one reading per sensor, or None if the timeout expired
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+
+        while not self.frames:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            self.receive(block=True)
+
+        self.arrival_times.popleft()
+        return self.frames.popleft()
+
+    def read_latest_frame(self, timeout=None):
+        """
+        The most recent frame of the feed; older frames are dropped. Waits for a new one if none has arrived.
+
+        :param timeout: seconds to wait for it; waits indefinitely if None
+        :return: float array with one reading per sensor, or None if the timeout expired
+        """
+        self.receive()
+
+        frame = self.read_frame(timeout)
+        while frame is not None and self.frames:
+            frame = self.read_frame()
+
+        return frame
+
+    def read_frames(self, count):
+        """
+        The next frames from the feed.
+
+        :param count: number of frames
+        :return: array with one row per frame and one column per sensor
+        """
+        return np.array([self.read_frame() for i in range(count)])
@@ -1,8 +1,8 @@
-import queue
+from concurrent.futures import CancelledError
 from tkinter import *
 from tkinter import messagebox
 
-from backend.bpc import saved_measurement
+from backend.bpc import saved_measurement, save_measurements, get_calibration_settings
 from backend.bpc_threading import *
 from gui.widgets.custom import HorizontalTable, YellowButton, GreenButton, VerticalTable
 from gui.widgets.helpers import make_rows_responsive, make_columns_responsive
@@ -18,15 +18,15 @@ class MeasureBPC(Frame):
         self.bind("<<ShowFrame>>", self.on_show_frame)
         self.bind("<<LeaveFrame>>", self.on_leave_frame)
 
-        # Queue where live feed thread writes data
-        self.queue = queue.LifoQueue()
-
-    def add_to_queue(self, data):
-        self.queue.put(data)
-
-    def clear_queue(self):
-        with self.queue.mutex:
-            self.queue.queue.clear()
+        # Runs acquisition callbacks on the GUI thread
+        self.bridge = TkBridge(self)
+        # live feed refresh
+        self.update_job = None
+        self.do_update = False
+        # capture or calibration in progress
+        self.command = None
+        # continuous scan in progress
+        self.scanning = False
 
     def initialize_widgets(self):
         # Watchers
@@ -61,6 +61,19 @@ class MeasureBPC(Frame):
         self.calibrate_button = GreenButton(self, text="Calibrate sensors", command=self.calibrate)
         self.calibrate_button.grid(row=0, column=1, pady=20)
 
+        # continuous scan: a station every few cm along the rail
+        self.scan_frame = Frame(self)
+        self.scan_frame.grid(row=1, column=1)
+
+        Label(self.scan_frame, text="Scan step (cm)").grid(row=0, column=0, padx=5)
+        self.scan_step = DoubleVar(value=2.0)
+        self.scan_step_box = Spinbox(self.scan_frame, from_=0.5, to=50, increment=0.5, width=5,
+                                     textvariable=self.scan_step)
+        self.scan_step_box.grid(row=0, column=1, padx=5)
+
+        self.scan_button = YellowButton(self.scan_frame, text="Start continuous scan", command=self.toggle_scan)
+        self.scan_button.grid(row=1, column=0, columnspan=2, pady=10)
+
         # captured count
         self.captured_count = Label(self, textvariable=self.count_str, font=self.controller.bold_font)
         self.captured_count.grid(row=2, column=1, sticky=S, pady=10)
@@ -83,183 +96,108 @@ class MeasureBPC(Frame):
 
         # Controls update callback
         self.do_update = True
-        # Flag to only update buttons and message when necessary
-        self.busy_message_set = False
 
-        # Open port and start reading
-        self.run_live_thread()
+        # Show loading message
+        self.status_var.set("Connecting to sensors...")
+        # restore to black font
+        self.status_message.configure(fg="black")
 
-        # start live GUI
-        self.update_live_gui()
+        # Disable buttons
+        self.disable_buttons()
 
-    def run_live_thread(self):
-        self.live_thread = LiveFeedThread(widget=self)
-        self.live_thread.start()
+        # clear previous live readings from table
+        self.table.clear_column(self.live_column)
 
-    def update_live_gui(self):
-        # No Arduino found alert
-        if no_arduino.is_set():
-            no_arduino.clear()
-
-            result = messagebox.askretrycancel("The Arduino is not connected",
-                                               "Make sure the Arduino is properly connected, and try again.",
-                                               icon="error")
-            # Retry
-            if result:
-                # open new thread
-                self.run_live_thread()
-            else:
-                self.controller.show_frame("ConfigBPC")
-                return
-
-        # Arduino disconnected alert
-        if disconnected.is_set():
-            disconnected.clear()
-
-            result = messagebox.askretrycancel("The Arduino has been disconnected",
-                                               "Reconnect the Arduino and try again.",
-                                               icon="error")
-            # Retry
-            if result:
-                # open new thread
-                self.run_live_thread()
-            else:
-                self.controller.show_frame("ConfigBPC")
-                return
+        # acquisition events arrive on another thread; handle them on the GUI's
+        self.bridge.start()
+        acquisition.add_listener(self.on_acquisition_event_threadsafe)
 
-        # Capturing data
-        if self.live_thread.capture_now.is_set():
-            # only set message once
-            if not self.busy_message_set:
-                # Show status message
-                self.status_var.set("Capturing data...")
-
-                # Disable buttons
-                self.disable_buttons()
+        # Open port and start reading
+        acquisition.connect()
 
-                # message has been set
-                self.busy_message_set = True
+        # start live GUI
+        self.update_live_gui()
 
-            # when data has been captured
-            if self.live_thread.capture_done.is_set():
-                last_captured = saved_measurement[-1]
+    def on_acquisition_event_threadsafe(self, event, *args):
+        self.bridge.call(self.on_acquisition_event, event, *args)
 
-                # update table with new data
-                self.table.update_column(self.captured_column, last_captured)
+    def on_acquisition_event(self, event, *args):
+        if event == "connected":
+            self.show_ready()
 
-                # clear flags
-                self.live_thread.capture_now.clear()
-                self.live_thread.capture_done.clear()
+        # No Arduino found alert
+        elif event == "no_arduino":
+            self.ask_retry("The Arduino is not connected",
+                           "Make sure the Arduino is properly connected, and try again.")
 
-                # update captured count label
-                self.count_number.set(self.count_number.get() + 1)
+        # a station of the continuous scan; already saved
+        elif event == "scan_capture":
+            data, number_of_samples = args
 
-                self.update_idletasks()
+            self.table.update_column(self.captured_column, data)
+            self.count_number.set(self.count_number.get() + 1)
 
-        # Calibrating sensors
-        elif self.live_thread.calibrate_now.is_set():
-            # only set message once
-            if not self.busy_message_set:
+        # Arduino disconnected alert
+        elif event == "disconnected":
+            self.table.clear_column(self.live_column)
+            self.show_scan_stopped()
 
-                # restore to black font
-                self.status_message.configure(fg="black")
+            self.ask_retry("The Arduino has been disconnected", "Reconnect the Arduino and try again.")
 
-                # Show status message
-                self.status_var.set("Calibrating sensors...")
+    def ask_retry(self, title, message):
+        result = messagebox.askretrycancel(title, message, icon="error")
 
-                # Disable buttons
-                self.disable_buttons()
+        # Retry
+        if result:
+            self.status_var.set("Connecting to sensors...")
+            self.status_message.configure(fg="black")
+            self.disable_buttons()
 
-                # message has been set
-                self.busy_message_set = True
+            acquisition.connect()
+        else:
+            self.controller.show_frame("ConfigBPC")
 
-            # when calibration is done
-            if self.live_thread.calibration_done.is_set():
-                deviations = []
+    def show_ready(self):
+        # sensors have been initialized
+        if are_sensors_initialized():
+            # restore to black font
+            self.status_message.configure(fg="black")
 
-                # exclude the last one; it's the ultrasonic
-                for i in range(len(sensorArray) - 1):
-                    # IR sensor deviation angle
-                    deviations.append(str(sensorArray[i].devAngle) + '°')
+            # Ready to capture or calibrate
+            self.status_var.set("Ready!")
 
-                # ultrasonic sensor is the last element of sensorArray
-                ultrasonic_factor = round(sensorArray[-1].factor, 2)
-                deviations.append(ultrasonic_factor)
+            # Restore buttons
+            self.restore_buttons()
 
-                # update table with new data
-                self.table.update_column(self.deviation_column, deviations)
+        # not initialized
+        else:
+            # must calibrate
+            self.status_var.set("Calibration required")
+            self.status_message.configure(fg="red")
 
-                # clear flags
-                self.live_thread.calibrate_now.clear()
-                self.live_thread.calibration_done.clear()
+            # enable calibrate button
+            self.calibrate_button.configure(state=NORMAL, cursor="hand2")
 
-                self.update_idletasks()
+            # Disable capture, scan, and view results
+            self.capture_button.configure(state=DISABLED, cursor="arrow")
+            self.scan_button.configure(state=DISABLED, cursor="arrow")
+            self.results_button.configure(state=DISABLED, cursor="arrow")
 
+    def update_live_gui(self):
         # Update live feed
-        elif self.live_thread.reading_sensors.is_set() and not self.live_thread.capture_now.is_set()\
-                and not self.live_thread.calibrate_now.is_set():
-            try:
-                while True:
-                    sensor_readings = self.queue.get_nowait()
-
-                    # Update table with new sensor data
-                    self.table.update_column(self.live_column, sensor_readings)
-
-                    # only set message once
-                    if self.busy_message_set:
-
-                        # sensors have been initialized
-                        if are_sensors_initialized():
-                            # Ready to capture or calibrate
-                            self.status_var.set("Ready!")
-
-                            # Restore buttons
-                            self.restore_buttons()
-
-                        # not initialized
-                        else:
-                            # must calibrate
-                            self.status_var.set("Calibration required")
-                            self.status_message.configure(fg="red")
-
-                            # enable calibrate button
-                            self.calibrate_button.configure(state=NORMAL, cursor="hand2")
-
-                            # Disable capture and view results
-                            self.capture_button.configure(state=DISABLED, cursor="arrow")
-                            self.results_button.configure(state=DISABLED, cursor="arrow")
-
-                        # no longer busy
-                        self.busy_message_set = False
-
-                    self.update_idletasks()
-
-            except queue.Empty:
-                pass
-
-        # Sensors are still initializing
-        elif not self.live_thread.reading_sensors.is_set() and self.do_update and not self.busy_message_set:
-            # Show loading message
-            self.status_var.set("Connecting to sensors...")
-            # restore to black font
-            self.status_message.configure(fg="black")
-
-            # Disable buttons
-            self.disable_buttons()
-
-            # clear previous live readings from table
-            self.table.clear_column(self.live_column)
-
-            # message has been set
-            self.busy_message_set = True
+        sensor_readings = acquisition.latest_frame
+        if sensor_readings is not None:
+            # Update table with new sensor data
+            self.table.update_column(self.live_column, sensor_readings)
 
         # Keep updating until we leave this frame
         if self.do_update:
-            self.after(100, self.update_live_gui)
+            self.update_job = self.after(100, self.update_live_gui)
 
     def restore_buttons(self):
         self.calibrate_button.configure(state=NORMAL, cursor="hand2")
         self.capture_button.configure(state=NORMAL, cursor="hand2")
+        self.scan_button.configure(state=NORMAL, cursor="hand2")
 
         # only enable view results if there are any
         if self.count_number.get():
@@ -272,31 +210,176 @@ class MeasureBPC(Frame):
     def disable_buttons(self):
         self.calibrate_button.configure(state=DISABLED, cursor="wait")
         self.capture_button.configure(state=DISABLED, cursor="wait")
+        self.scan_button.configure(state=DISABLED, cursor="wait")
         self.results_button.configure(state=DISABLED, cursor="wait")
 
     def on_leave_frame(self, event=None):
-        # kill thread and close serial port
-        self.live_thread.kill_thread.set()
-
         self.do_update = False
+        if self.update_job is not None:
+            self.after_cancel(self.update_job)
+            self.update_job = None
+
+        # abort a capture or calibration in progress
+        if self.command is not None:
+            self.command.cancel()
+            self.command = None
+
+        # stop scanning; the rail can't be watched from another page
+        if self.scanning:
+            acquisition.stop_scan()
+            self.show_scan_stopped()
+
+        # stop listening; the serial port stays open for the next visit
+        acquisition.remove_listener(self.on_acquisition_event_threadsafe)
+        self.bridge.stop()
 
     def calibrate(self):
-        # only one at a time
-        if not self.live_thread.calibrate_now.is_set():
-            # clear old values from table
-            self.table.clear_column(self.deviation_column)
+        # clear old values from table
+        self.table.clear_column(self.deviation_column)
+
+        # restore to black font
+        self.status_message.configure(fg="black")
+
+        # Show status message
+        self.status_var.set("Calibrating sensors...")
+
+        # Disable buttons; only one at a time
+        self.disable_buttons()
+
+        # fetch calibration settings
+        ring_diameter, calibration_obj_diameter, rail_z_distance = get_calibration_settings()
+
+        # Let the acquisition service handle it
+        self.command = acquisition.calibrate(ring_diameter, calibration_obj_diameter, rail_z_distance)
+        self.command.add_done_callback(lambda f: self.bridge.call(self.on_calibration_done, f))
 
-            # Let the worker thread handle it
-            self.live_thread.calibrate_now.set()
+    def on_calibration_done(self, future):
+        # aborted when leaving the page
+        if future is not self.command:
+            return
+        self.command = None
+
+        try:
+            future.result()
+        except (SerialException, CancelledError):
+            # the port went away; the disconnected alert takes it from here
+            print("calibration aborted")
+            return
+        except Exception as e:
+            print("calibration failed:", e)
+            self.show_ready()
+            return
+
+        deviations = []
+
+        # exclude the last one; it's the ultrasonic
+        for i in range(len(sensorArray) - 1):
+            # IR sensor deviation angle
+            deviations.append(str(sensorArray[i].devAngle) + '°')
+
+        # ultrasonic sensor is the last element of sensorArray
+        ultrasonic_factor = round(sensorArray[-1].factor, 2)
+        deviations.append(ultrasonic_factor)
+
+        # update table with new data
+        self.table.update_column(self.deviation_column, deviations)
+
+        self.show_ready()
 
     def capture(self):
-        # only one at a time
-        if not self.live_thread.capture_now.is_set():
-            # clear old values from table
-            self.table.clear_column(self.captured_column)
+        # clear old values from table
+        self.table.clear_column(self.captured_column)
+
+        # Show status message
+        self.status_var.set("Capturing data...")
+
+        # Disable buttons; only one at a time
+        self.disable_buttons()
+
+        # Let the acquisition service handle it
+        self.command = acquisition.capture()
+        self.command.add_done_callback(lambda f: self.bridge.call(self.on_capture_done, f))
+
+    def on_capture_done(self, future):
+        # aborted when leaving the page
+        if future is not self.command:
+            return
+        self.command = None
+
+        try:
+            data, number_of_samples = future.result()
+        except (SerialException, CancelledError):
+            # the port went away; the disconnected alert takes it from here
+            print("capture aborted")
+            return
+        except Exception as e:
+            print("capture failed:", e)
+            self.show_ready()
+            return
+
+        # Save data in backend
+        save_measurements(data, number_of_samples)
+
+        # update table with new data
+        self.table.update_column(self.captured_column, data)
+
+        # update captured count label
+        self.count_number.set(self.count_number.get() + 1)
+
+        self.show_ready()
+
+    def toggle_scan(self):
+        if self.scanning:
+            acquisition.stop_scan()
+            self.show_scan_stopped()
+            self.show_ready()
+            return
+
+        try:
+            z_step = self.scan_step.get()
+        except TclError:
+            z_step = 0
+        if z_step <= 0:
+            messagebox.showerror("Invalid scan step", "The scan step must be a positive number of cm.")
+            return
+
+        # clear old values from table
+        self.table.clear_column(self.captured_column)
+
+        self.scanning = True
+        self.status_var.set("Scanning: move the tool along the pole")
+        self.scan_button.configure(text="Stop continuous scan")
+        self.scan_step_box.configure(state=DISABLED)
+
+        # only the scan button stays enabled
+        self.calibrate_button.configure(state=DISABLED, cursor="arrow")
+        self.capture_button.configure(state=DISABLED, cursor="arrow")
+        self.results_button.configure(state=DISABLED, cursor="arrow")
+
+        # Let the acquisition service handle it
+        future = acquisition.start_scan(z_step)
+        future.add_done_callback(lambda f: self.bridge.call(self.on_scan_started, f))
+
+    def on_scan_started(self, future):
+        try:
+            future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            print("scan failed:", e)
+
+            # stopped already, or left the page
+            if not self.scanning:
+                return
+
+            self.show_scan_stopped()
+            self.show_ready()
+            messagebox.showerror("Could not start the scan", str(e) or repr(e))
 
-            # Let the worker thread handle it
-            self.live_thread.capture_now.set()
+    def show_scan_stopped(self):
+        self.scanning = False
+        self.scan_button.configure(text="Start continuous scan")
+        self.scan_step_box.configure(state=NORMAL)
 
     def update_count_label(self, *args):
         self.count_str.set(str(self.count_number.get()) + " measurements captured")
@@ -1,10 +1,9 @@
-import copy
 from datetime import datetime
 from subprocess import Popen
 from tkinter import *
 from tkinter import filedialog, messagebox
 
-from backend.bpc import generate_text_file, saved_measurement, delete_measurement, sort_ByZeta
+from backend.bpc import generate_text_file, saved_measurement, delete_measurement
 from gui.widgets.custom import HorizontalTable, YellowButton, RedButton, AutoScrollbar
 from gui.widgets.helpers import make_columns_responsive, make_rows_responsive
 
@@ -57,33 +56,31 @@ class ResultsBPC(Frame):
         # Enable save button
         self.save_button.configure(state=NORMAL, cursor="hand2")
 
-        # sort captured measurements by Z value
-        sort_ByZeta(saved_measurement)
-
         # Generate captured measurements table
         self.create_table()
 
     def create_table(self):
         # Create table if there are any captured measurements
         if saved_measurement:
-            # Make a copy of the captured measurements
-            self.captured_data = copy.deepcopy(saved_measurement)
+            # captured measurements, already sorted by Z; shared with the store, not copied
+            (snapshot, samples) = saved_measurement.snapshot()
+            self.captured_data = snapshot
 
             # Place Z as first element
-            for column in self.captured_data:
-                column.insert(0, column.pop())
+            rows = [-1] + list(range(snapshot.shape[1] - 1))
 
             # the results table
-            self.table = HorizontalTable(self.canvas, rows=len(self.captured_data[0]), columns=len(self.captured_data),
+            self.table = HorizontalTable(self.canvas, rows=len(rows), columns=len(snapshot),
                                          header_values=self.sensor_headers, can_select_columns=True,
                                          button_command=self.delete_z)
             # Set background of top row
-            for column in range(len(self.captured_data)):
+            for column in range(len(snapshot)):
                 self.table.cells[0][column].configure(bg="#5E5E5E", fg="#FFFFFF", font=self.controller.bold_font)
             self.table.headers[0].configure(bg="#5E5E5E", fg="#FFFFFF")
 
-            # load cells with captured measurements
-            self.table.update_cells(self.captured_data)
+            # load cells with captured measurements, one measurement per column
+            for (column, readings) in enumerate(snapshot):
+                self.table.update_column(column, readings[rows])
 
             # place the table inside the canvas
             self.canvas.create_window(0, 0, anchor=NW, window=self.table)
@@ -164,4 +161,4 @@ class ResultsBPC(Frame):
             self.controller.show_frame("Home")
 
     def reset(self):
-        self.captured_data.clear()
+        self.captured_data = []
@@ -43,6 +43,9 @@ class ConfigBSC(Frame):
         self.begin_button = YellowButton(self, text="BEGIN", command=self.begin, image=self.controller.arrow_right, compound=RIGHT)
         self.begin_button.grid(row=3, column=1, sticky=SE, padx=20, pady=20)
 
+        # measure a single slice of a tray instead, choosing its circumferences
+        self.pick_button = GreenButton(self, text="Choose one slice", command=self.pick_circumferences)
+
         # Update widgets
         self.on_image_path_change()
 
@@ -130,10 +133,14 @@ class ConfigBSC(Frame):
                 # make message green
                 self.message.configure(fg="#35AD35")
 
-                # 1 or 2 found
-                if self.circumferences_found <= 2:
+                # 1 or 2 found, or they make up a single slice
+                if self.circumferences_found <= 2 or get_number_slices() == 1:
                     self.message_var.set("Bamboo slice detected!\n No need to choose circumferences.")
 
+                # several slices
+                elif get_number_slices() > 1:
+                    self.message_var.set(str(get_number_slices()) + " slices found.\n All of them will be characterized.")
+
                 # more than 2 found
                 else:
                     self.message_var.set(str(self.circumferences_found) + " circumferences found.\n You must choose two of them.")
@@ -141,6 +148,12 @@ class ConfigBSC(Frame):
             # show the message
             self.message.grid(row=2, column=1, padx=20)
 
+            # one slice may be chosen out of several
+            if self.circumferences_found and get_number_slices() > 1:
+                self.pick_button.grid(row=3, column=1, sticky=SW, padx=20, pady=20)
+            else:
+                self.pick_button.grid_remove()
+
         # not selected
         else:
             self.begin_button.configure(state=DISABLED, cursor="arrow")
@@ -149,15 +162,17 @@ class ConfigBSC(Frame):
 
             # hide the message
             self.message.grid_remove()
+            self.pick_button.grid_remove()
 
     def begin(self):
-        # Go to pick circumferences if found more than 2
-        if get_number_original_circumferences() > 2:
-            self.controller.show_frame("PickCircumferencesBSC")
+        # every slice found, even if one was chosen before
+        measure_all_slices()
 
         # Go to configure scale
-        else:
-            self.controller.show_frame("RefObjectBSC")
+        self.controller.show_frame("RefObjectBSC")
+
+    def pick_circumferences(self):
+        self.controller.show_frame("PickCircumferencesBSC")
 
     def on_show_frame(self, event=None):
         self.visit_counter += 1
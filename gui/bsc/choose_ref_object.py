@@ -12,7 +12,7 @@ class RefObjectBSC(Frame):
         self.controller = controller
         self.title = "Configure the image's scale"
         self.responsive_image = None
-        self.boxes = []
+        self.number_boxes = 0
         self.box = None
         self.stage1_widgets = []
         self.stage2_widgets = []
@@ -126,8 +126,8 @@ class RefObjectBSC(Frame):
         self.selected_object_var.set("")
 
     def on_show_frame(self, event=None):
-        # fetch all reference objects
-        self.boxes = render_boxes()
+        # reference object images are rendered as they are shown
+        self.number_boxes = get_number_boxes()
 
         # Show the last object we were browsing, or the 1st one if this is a fresh session
         try:
@@ -139,13 +139,16 @@ class RefObjectBSC(Frame):
             self.on_show_frame()
 
     def show_contour(self, index):
-        self.box = self.boxes[index]
+        if not 0 <= index < self.number_boxes:
+            raise IndexError("contour box index out of range")
+
+        self.box = index
         self.current_contour_var.set(index)
         self.update_image()
 
     def update_image(self, *args):
         if self.box is not None:
-            image = self.box[self.dimension_type.get()][0]
+            image, size = render_box(self.box, self.dimension_type.get())
 
             if self.responsive_image is not None:
                 self.responsive_image.destroy()
@@ -161,7 +164,7 @@ class RefObjectBSC(Frame):
     def update_navigation(self, *args):
         current = self.current_contour_var.get()
         # update image title
-        self.ref_object_var.set("Object\n" + str(current + 1) + " of " + str(len(self.boxes)))
+        self.ref_object_var.set("Object\n" + str(current + 1) + " of " + str(self.number_boxes))
 
         # toggle prev
         if current == 0:
@@ -170,7 +173,7 @@ class RefObjectBSC(Frame):
             self.prev_button.configure(state=NORMAL, cursor="hand2")
 
         # toggle next
-        if current == len(self.boxes) - 1:
+        if current == self.number_boxes - 1:
             self.next_button.configure(state=DISABLED, cursor="arrow")
         else:
             self.next_button.configure(state=NORMAL, cursor="hand2")
@@ -278,7 +281,8 @@ class RefObjectBSC(Frame):
 
     def confirm(self):
         # pixels per metric = distance in pixels / distance in centimeters
-        ppm = self.box[self.dimension_type.get()][1] / float(self.real_dimension.get())
+        image, size = render_box(self.box, self.dimension_type.get())
+        ppm = size / float(self.real_dimension.get())
         set_pixels_per_metric(ppm)
 
         # Show results
@@ -301,7 +305,7 @@ class RefObjectBSC(Frame):
         self.selected_object_var.set("")
 
         # clear ref objects
-        self.boxes.clear()
+        self.number_boxes = 0
         self.box = None
 
         # Start showing 1st contour box
@@ -11,7 +11,7 @@ class PickCircumferencesBSC(Frame):
         Frame.__init__(self, parent)
         self.controller = controller
         self.title = "Select the circumferences of a bamboo slice"
-        self.circumferences = []
+        self.number_circumferences = 0
         self.selected_circumferences = []
         self.responsive_image = None
         self.initialize_widgets()
@@ -77,13 +77,13 @@ class PickCircumferencesBSC(Frame):
         make_rows_responsive(self, ignored=[0])
 
     def on_show_frame(self, event=None):
-        # fetch all circumferences
-        self.circumferences = render_all_circumferences()
+        # circumference images are rendered as they are shown
+        self.number_circumferences = get_number_original_circumferences()
 
         # initialize if it's empty
         if not self.selected_circumferences:
             # generate selected flags
-            self.selected_circumferences = [False] * len(self.circumferences)
+            self.selected_circumferences = [False] * self.number_circumferences
 
         # Show the last object we were browsing, or the 1st one if this is a fresh session
         try:
@@ -95,8 +95,8 @@ class PickCircumferencesBSC(Frame):
             self.on_show_frame()
 
     def show_circumference(self, index):
+        image = render_circumference(index)
         self.current_circumference_var.set(index)
-        image = self.circumferences[index]
 
         if self.responsive_image is not None:
             self.responsive_image.destroy()
@@ -105,7 +105,7 @@ class PickCircumferencesBSC(Frame):
 
     def update_navigation(self, *args):
         current = self.current_circumference_var.get()
-        self.circumference_title_var.set("Circumference\n" + str(current + 1) + " of " + str(len(self.circumferences)))
+        self.circumference_title_var.set("Circumference\n" + str(current + 1) + " of " + str(self.number_circumferences))
 
         # toggle prev
         if current == 0:
@@ -114,7 +114,7 @@ class PickCircumferencesBSC(Frame):
             self.prev_button.configure(state=NORMAL, cursor="hand2")
 
         # toggle next
-        if current == len(self.circumferences) - 1:
+        if current == self.number_circumferences - 1:
             self.next_button.configure(state=DISABLED, cursor="arrow")
         else:
             self.next_button.configure(state=NORMAL, cursor="hand2")
@@ -200,7 +200,7 @@ class PickCircumferencesBSC(Frame):
             self.responsive_image = None
 
         # clear circumferences
-        self.circumferences.clear()
+        self.number_circumferences = 0
         self.selected_circumferences.clear()
         self.selected_count_var.set(0)
 
@@ -23,12 +23,24 @@ class ResultsBSC(Frame):
         self.controller = controller
         self.title = "Slice processing results"
         self.responsive_image = None
+        self.plot = None
+        self.toolbar_container = None
         self.initialize_widgets()
         self.bind("<<ShowFrame>>", self.on_show_frame)
 
     def initialize_widgets(self):
 
-        # Result image row=0, col=0, columnspan=2
+        # list of the slices measured, when there are several; pick one to show it
+        self.slices_container = Frame(self)
+        self.slices_list = Listbox(self.slices_container, height=4, exportselection=False, activestyle=NONE,
+                                   cursor="hand2")
+        self.slices_list.bind("<<ListboxSelect>>", self.on_slice_selected)
+        self.slices_list.pack(side=LEFT, fill=BOTH, expand=True)
+        slices_scrollbar = Scrollbar(self.slices_container, command=self.slices_list.yview)
+        slices_scrollbar.pack(side=RIGHT, fill=Y)
+        self.slices_list.configure(yscrollcommand=slices_scrollbar.set)
+
+        # Result image row=1, col=0
 
         # Save button
         self.save_button = YellowButton(self, text="Save coordinates", command=self.save, image=self.controller.save_icon,
@@ -46,6 +58,34 @@ class ResultsBSC(Frame):
         make_columns_responsive(self)
 
     def on_show_frame(self, event=None):
+        final_slices = translate_slices()
+
+        # every slice of a tray, with its diameters
+        self.slices_list.delete(0, END)
+        if len(final_slices) > 1:
+            for (i, final_circumferences) in enumerate(final_slices):
+                diameters = ", ".join("%.2f" % avg_diameter for (points, centroid, avg_diameter) in final_circumferences)
+                self.slices_list.insert(END, "Slice %s: diameters %s cm" % (i + 1, diameters))
+            self.slices_list.selection_set(0)
+            self.slices_container.grid(row=0, column=0, sticky=NSEW, padx=20, pady=20)
+        else:
+            self.slices_container.grid_remove()
+
+        set_slice_index(0)
+        self.show_slice()
+
+    def on_slice_selected(self, event=None):
+        selection = self.slices_list.curselection()
+        if not selection:
+            return
+
+        set_slice_index(selection[0])
+        self.show_slice()
+
+    def show_slice(self):
+        # plot and region of interest of the slice selected
+        self.destroy_slice()
+
         final_circumferences = translate_coordinates()
 
         # create plot
@@ -77,6 +117,20 @@ class ResultsBSC(Frame):
         self.responsive_image = ResponsiveImage(self, self.image, anchor=CENTER)
         self.responsive_image.grid(row=1, column=0, sticky=NSEW, padx=20, pady=20)
 
+    def destroy_slice(self):
+        if self.responsive_image is not None:
+            self.responsive_image.destroy()
+            self.responsive_image = None
+            self.image = None
+
+        if self.plot is not None:
+            self.plot.get_tk_widget().destroy()
+            self.plot = None
+
+        if self.toolbar_container is not None:
+            self.toolbar_container.destroy()
+            self.toolbar_container = None
+
     def save(self):
         date = datetime.now().strftime('%Y-%m-%d_%H%M%S')
         save_path = filedialog.asksaveasfilename(title="Save as", defaultextension=".txt", initialfile="BSC_" + date)
@@ -84,15 +138,22 @@ class ResultsBSC(Frame):
         # make sure the user didn't cancel the dialog
         if len(save_path) > 0:
             if generate_text_file(save_path):
+                # one file per slice, when there are several
+                paths = get_text_file_paths(save_path)
+                if len(paths) > 1:
+                    saved_in = "%s files, from %s to %s" % (len(paths), paths[0], paths[-1])
+                else:
+                    saved_in = save_path
+
                 # ask to open text file
                 should_open_file = messagebox.askyesno("Open generated text file?",
-                                                       "The bamboo slice information has been saved in " + save_path
+                                                       "The bamboo slice information has been saved in " + saved_in
                                                        + "\n\nWould you like to open the text file now?")
 
-                # open the text file
+                # open the text file of the slice shown
                 if should_open_file:
                     try:
-                        Popen(save_path, shell=True)
+                        Popen(paths[min(self.shown_slice(), len(paths) - 1)], shell=True)
                     except OSError as e:
                         print("Error opening text file:", e)
 
@@ -107,12 +168,14 @@ class ResultsBSC(Frame):
             # go to home screen
             self.controller.show_frame("Home")
 
+    def shown_slice(self):
+        selection = self.slices_list.curselection()
+        return selection[0] if selection else 0
+
     def reset(self):
-        # destroy the image container
-        if self.responsive_image is not None:
-            self.responsive_image.destroy()
-            self.responsive_image = None
-            self.image = None
+        # destroy the image container and the plot
+        self.destroy_slice()
 
-        # destroy the plot
-        self.plot = None
+        # forget the slices
+        self.slices_list.delete(0, END)
+        self.slices_container.grid_remove()
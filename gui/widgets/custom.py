@@ -1,9 +1,7 @@
 from tkinter import *
 from tkinter import font
 
-from PIL import ImageTk
-
-from gui.widgets.helpers import resize_keep_aspect
+from PIL import Image, ImageTk
 
 
 class AutoScrollbar(Scrollbar):
@@ -260,6 +258,21 @@ class HorizontalTable(Frame):
 
 
 class ResponsiveImage(Frame):
+    """
+    An image that fills its container while keeping aspect ratio.
+
+    Resizing works off a chain of pre-downscaled copies of the image. While the container is being resized the image
+    is rendered with a fast filter; once resizing settles it's rendered again in high quality.
+
+    :param image: image in PIL format
+    :param tag: canvas tag of the image
+    :param anchor: N, CENTER, or NW
+    """
+
+    # smallest copy kept in the chain of downscaled images
+    MIN_CHAIN_SIZE = 256
+    # milliseconds without <Configure> events before the high quality render
+    SETTLE_DELAY = 150
 
     def __init__(self, parent, image, tag="IMG", anchor=N):
         Frame.__init__(self, parent)
@@ -271,37 +284,91 @@ class ResponsiveImage(Frame):
         # image anchor position
         self.anchor = anchor
 
+        # the original image, followed by copies of half the size of the previous one
+        self.chain = [self.original]
+        while min(self.chain[-1].size) >= 2 * self.MIN_CHAIN_SIZE:
+            previous = self.chain[-1]
+            self.chain.append(previous.resize((previous.width // 2, previous.height // 2), Image.BILINEAR))
+
+        # size of the canvas, and size and quality of the image currently shown
+        self.canvas_size = None
+        self.rendered = None
+        # pending high quality render
+        self.settle_job = None
+
         # make frame responsive
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
 
-        # source image in TK Image format
-        self.image = ImageTk.PhotoImage(self.original)
+        # placeholder until the first resize; the smallest copy is the cheapest to convert to TK Image format
+        self.image = ImageTk.PhotoImage(self.chain[-1])
 
         # create canvas and place image inside it
         self.canvas = Canvas(self, borderwidth=0, highlightthickness=0)
-        self.canvas.create_image(0, 0, image=self.image, anchor=NW, tags=self.tag)
+        self.canvas_image = self.canvas.create_image(0, 0, image=self.image, anchor=NW, tags=self.tag)
         self.canvas.grid(row=0, sticky=NSEW)
 
         # the magic
         self.bind("<Configure>", self.resize)
 
     def resize(self, event):
-        # resize while keeping aspect ratio
-        resized = resize_keep_aspect(image=self.original, max_w=event.width, max_h=event.height)
+        self.canvas_size = (event.width, event.height)
+
+        # fast render now, high quality once the resizing stops
+        self.render(high_quality=False)
 
-        # the new resized image, in TkImage format
-        self.image = ImageTk.PhotoImage(resized)
-        self.canvas.delete(self.tag)
+        if self.settle_job is not None:
+            self.after_cancel(self.settle_job)
+        self.settle_job = self.after(self.SETTLE_DELAY, self.settle)
+
+    def settle(self):
+        self.settle_job = None
+        self.render(high_quality=True)
+
+    def render(self, high_quality):
+        (width, height) = self.canvas_size
+
+        # size that fits the canvas while keeping aspect ratio
+        ratio = min(width / self.original.width, height / self.original.height)
+        size = (max(int(self.original.width * ratio), 1), max(int(self.original.height * ratio), 1))
+
+        # don't render again what is already shown, or a lower quality version of it
+        if self.rendered != (size, True) and self.rendered != (size, high_quality):
+            # smallest copy in the chain that is still bigger than the target
+            source = self.chain[0]
+            for image in self.chain:
+                if image.width >= size[0] and image.height >= size[1]:
+                    source = image
+
+            resized = source.resize(size, Image.LANCZOS if high_quality else Image.NEAREST)
+
+            if self.rendered is not None and self.rendered[0] == size:
+                # same size; reuse the Tk image
+                self.image.paste(resized)
+            else:
+                # the new resized image, in TkImage format
+                self.image = ImageTk.PhotoImage(resized)
+                self.canvas.itemconfigure(self.canvas_image, image=self.image)
+
+            self.rendered = (size, high_quality)
 
         # place image top-centered in the canvas
         if self.anchor == N:
-            self.canvas.create_image(event.width/2, 0, image=self.image, anchor=N, tags=self.tag)
+            self.canvas.coords(self.canvas_image, width / 2, 0)
         elif self.anchor == CENTER:
-            self.canvas.create_image(event.width / 2, event.height / 2, image=self.image, anchor=CENTER, tags=self.tag)
+            self.canvas.coords(self.canvas_image, width / 2, height / 2)
         # only NW for now
         else:
-            self.canvas.create_image(0, 0, image=self.image, anchor=NW, tags=self.tag)
+            self.canvas.coords(self.canvas_image, 0, 0)
+        self.canvas.itemconfigure(self.canvas_image, anchor=self.anchor if self.anchor in (N, CENTER) else NW)
+
+    def destroy(self):
+        # don't render after the widget is gone
+        if self.settle_job is not None:
+            self.after_cancel(self.settle_job)
+            self.settle_job = None
+
+        Frame.destroy(self)
 
 
 class EntryWithPlaceholder(Entry):
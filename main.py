@@ -4,7 +4,7 @@ from tkinter import font, messagebox
 from PIL import ImageTk, Image
 
 from backend.bpc import reset_bpc_backend
-from backend.bpc_threading import main_quit
+from backend.bpc_threading import acquisition
 from backend.bsc import reset_bsc_backend, get_number_original_circumferences
 from gui.bpc.configuration import ConfigBPC
 from gui.bpc.measure import MeasureBPC
@@ -274,8 +274,8 @@ if __name__ == "__main__":
         if type(app.active_frame) == Home or messagebox.askokcancel("Exit Program",
                                                                     "Are you sure you want to exit Bamboo Scanner?",
                                                                     default="cancel", icon="warning"):
-            # Close port before quitting
-            main_quit.set()
+            # Close port and stop the acquisition thread before quitting
+            acquisition.shutdown()
             # Exit
             app.destroy()
 
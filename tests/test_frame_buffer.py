@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from backend.frame_buffer import FrameRingBuffer
+
+
+class FrameRingBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        # 13 frames through a buffer of 5: the oldest 8 are overwritten, and the window wraps around
+        self.frames = np.arange(13 * 3, dtype=np.float64).reshape(13, 3) ** 1.5
+        self.buffer = FrameRingBuffer(5, 3)
+        self.buffer.extend(self.frames[:7])
+        for frame in self.frames[7:]:
+            self.buffer.append(frame)
+
+    def test_window_wraps_around(self):
+        self.assertEqual(len(self.buffer), 5)
+        np.testing.assert_array_equal(self.buffer.window(), self.frames[-5:])
+        np.testing.assert_array_equal(self.buffer.window(3), self.frames[-3:])
+        np.testing.assert_array_equal(self.buffer.latest(), self.frames[-1])
+
+    def test_mean(self):
+        np.testing.assert_allclose(self.buffer.mean(), self.frames[-5:].mean(axis=0))
+        np.testing.assert_allclose(self.buffer.mean(3), self.frames[-3:].mean(axis=0))
+        # no more than the frames kept
+        np.testing.assert_allclose(self.buffer.mean(100), self.frames[-5:].mean(axis=0))
+
+    def test_stdev(self):
+        np.testing.assert_allclose(self.buffer.stdev(), self.frames[-5:].std(axis=0, ddof=1))
+        np.testing.assert_allclose(self.buffer.stdev(2), self.frames[-2:].std(axis=0, ddof=1))
+        self.assertIsNone(self.buffer.stdev(1))
+
+    def test_empty(self):
+        buffer = FrameRingBuffer(5, 3)
+        self.assertIsNone(buffer.mean())
+        self.assertIsNone(buffer.stdev())
+
+        buffer.append(self.frames[0])
+        np.testing.assert_allclose(buffer.mean(), self.frames[0])
+        self.assertIsNone(buffer.stdev())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import serial
+
+import backend.sensors_manager  # registers the URL handlers
+from backend.frame_log import FRAME_LOG_HEADER, FrameRecorder, frame_log_dtype, open_frame_log
+from backend.serial_reader import SerialFrameReader
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "session.bpclog")
+
+        self.frames = np.arange(13.0) + np.arange(20.0)[:, np.newaxis]
+        # 10 frames a second
+        self.arrival_times = 1000.0 + np.arange(20) * 0.1
+
+        recorder = FrameRecorder(self.path, 13)
+        recorder.write(self.frames[:10], self.arrival_times[:10])
+        recorder.write(self.frames[10:], self.arrival_times[10:], commands=1)
+        recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self, query=""):
+        ser = serial.serial_for_url("bpcreplay://" + self.path + query, timeout=0.05)
+        ser.write(b"START")
+        self.assertEqual(ser.readline(), b"STARTREC\r\n")
+
+        return ser
+
+    def test_arrival_times_recorded(self):
+        records = open_frame_log(self.path)
+
+        np.testing.assert_allclose(records["time"], self.arrival_times)
+        np.testing.assert_allclose(records["readings"], self.frames)
+
+    def test_readings_full_precision(self):
+        path = os.path.join(self.dir, "precise.bpclog")
+        frames = np.full((2, 13), 123.45) + np.arange(13.0) / 3
+
+        recorder = FrameRecorder(path, 13)
+        recorder.write(frames)
+        recorder.close()
+
+        np.testing.assert_array_equal(open_frame_log(path)["readings"], frames)
+
+    def test_first_version_log(self):
+        path = os.path.join(self.dir, "v1.bpclog")
+        records = np.zeros(len(self.frames), dtype=frame_log_dtype(13, "<f4"))
+        records["time"] = self.arrival_times
+        records["readings"] = self.frames
+        with open(path, "wb") as f:
+            f.write(FRAME_LOG_HEADER.pack(b"BPCLOG01", 13))
+            f.write(records.tobytes())
+
+        recorder = FrameRecorder(path, 13)
+        recorder.write(self.frames[:1], self.arrival_times[:1])
+        recorder.close()
+
+        records = open_frame_log(path)
+        self.assertEqual(len(records), len(self.frames) + 1)
+        np.testing.assert_allclose(records["readings"], np.concatenate((self.frames, self.frames[:1])))
+
+    def test_end_of_log(self):
+        ser = self.open("?rate=0")
+        reader = SerialFrameReader(ser, number_of_sensors=13)
+
+        while len(reader.frames) < len(self.frames):
+            reader.receive(block=True)
+        np.testing.assert_allclose(np.array(reader.frames), self.frames)
+
+        with self.assertRaises(serial.SerialException):
+            reader.receive(block=True)
+
+    def test_recorded_pace(self):
+        ser = self.open()
+        reader = SerialFrameReader(ser, number_of_sensors=13)
+
+        reader.receive()
+        self.assertLess(len(reader.frames), 3)
+
+        reader.receive(block=True)
+        self.assertGreaterEqual(len(reader.frames), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
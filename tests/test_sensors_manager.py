@@ -0,0 +1,108 @@
+import math
+import unittest
+
+import numpy as np
+
+from backend.sensors_manager import SensorCalibration
+
+STRUCTURE_RADIUS = 11.5
+TEST_RADIUS = 1.58
+NUMBER_OF_SENSORS = 13
+
+
+class CalibrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calibration = SensorCalibration()
+        self.calibration.init_sensors(STRUCTURE_RADIUS, NUMBER_OF_SENSORS)
+        self.ir_sensors = self.calibration.sensors[:-1]
+
+    def calibrate(self, irDistances, zDistance=10.0, testDistance=10.0):
+        self.calibration.calibrate(TEST_RADIUS, testDistance, list(irDistances) + [zDistance])
+
+    def nearest_distances(self):
+        # reading of each sensor when it sees the nearest point of the calibration object
+        return [math.hypot(s.xi, s.yi) - TEST_RADIUS for s in self.ir_sensors]
+
+    def test_sensor_positions(self):
+        angles = [math.atan2(s.yi, s.xi) for s in self.ir_sensors]
+
+        np.testing.assert_allclose([math.hypot(s.xi, s.yi) for s in self.ir_sensors], STRUCTURE_RADIUS, atol=0.01)
+        # evenly spaced, clockwise from the x axis
+        np.testing.assert_allclose(np.mod(np.diff(angles), 2 * math.pi), 2 * math.pi - math.radians(30), atol=1e-3)
+
+    def test_aimed_at_center(self):
+        self.calibrate(self.nearest_distances())
+
+        for (s, distance) in zip(self.ir_sensors, self.nearest_distances()):
+            angle = math.atan2(s.yi, s.xi)
+            self.assertAlmostEqual(s.xf, TEST_RADIUS * math.cos(angle), places=6)
+            self.assertAlmostEqual(s.yf, TEST_RADIUS * math.sin(angle), places=6)
+            self.assertAlmostEqual(s.r, distance, places=9)
+            self.assertEqual(s.devAngle, 0.0)
+
+        self.assertTrue(self.calibration.initialized)
+
+    def test_point_counterclockwise_of_sensor_axis(self):
+        # the reading matches the points of the calibration object 60 degrees either side of the sensor's axis
+        index = 3
+        s = self.ir_sensors[index]  # on the negative y axis, at -90 degrees
+        point = (TEST_RADIUS * math.cos(math.radians(-30)), TEST_RADIUS * math.sin(math.radians(-30)))
+        distance = math.hypot(point[0] - s.xi, point[1] - s.yi)
+
+        distances = self.nearest_distances()
+        distances[index] = distance
+        self.calibrate(distances)
+
+        # -90 + 60 degrees, not -90 - 60
+        self.assertAlmostEqual(s.xf, point[0], places=9)
+        self.assertAlmostEqual(s.yf, point[1], places=9)
+        self.assertAlmostEqual(s.r, distance, places=9)
+
+        # angle at the sensor between the calibration point and the center, by the law of sines
+        expected = math.degrees(math.asin(TEST_RADIUS * math.sin(math.radians(60)) / distance))
+        self.assertEqual(s.devAngle, round(expected, 2))
+
+    def test_same_side_for_every_sensor(self):
+        # every sensor reads the point 45 degrees counterclockwise of its axis
+        points = []
+        distances = []
+        for s in self.ir_sensors:
+            angle = math.atan2(s.yi, s.xi) + math.radians(45)
+            point = (TEST_RADIUS * math.cos(angle), TEST_RADIUS * math.sin(angle))
+            points.append(point)
+            distances.append(math.hypot(point[0] - s.xi, point[1] - s.yi))
+
+        self.calibrate(distances)
+
+        np.testing.assert_allclose([(s.xf, s.yf) for s in self.ir_sensors], points, atol=1e-9)
+
+    def test_reading_out_of_reach(self):
+        # too short a reading gives the nearest point, too long one the farthest
+        distances = self.nearest_distances()
+        distances[0] -= 1.0
+        distances[6] = STRUCTURE_RADIUS + TEST_RADIUS + 1.0
+        self.calibrate(distances)
+
+        (near, far) = (self.ir_sensors[0], self.ir_sensors[6])
+        self.assertAlmostEqual(near.xf, TEST_RADIUS, places=9)
+        self.assertAlmostEqual(near.yf, 0.0, places=9)
+        self.assertAlmostEqual(far.xf, -math.cos(math.atan2(far.yi, far.xi)) * TEST_RADIUS, places=9)
+        self.assertAlmostEqual(far.yf, -math.sin(math.atan2(far.yi, far.xi)) * TEST_RADIUS, places=9)
+
+    def test_ultrasonic_factor(self):
+        self.calibrate(self.nearest_distances(), zDistance=8.0, testDistance=10.0)
+
+        self.assertAlmostEqual(self.calibration.z_factor, 1.25)
+
+    def test_points_of_calibration_readings(self):
+        distances = np.array(self.nearest_distances())
+        self.calibrate(distances)
+
+        # readings of the calibration object land on it
+        x, y = self.calibration.dist_to_points(distances[np.newaxis, :])
+        np.testing.assert_allclose(np.hypot(x, y), TEST_RADIUS, atol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from backend.serial_reader import SENSOR_COUNT_FRAMES, SerialFrameReader
+
+
+class FakePort(object):
+    """
+    A serial port with some bytes waiting on it.
+    """
+
+    def __init__(self, data=b""):
+        self.data = bytearray(data)
+
+    @property
+    def in_waiting(self):
+        return len(self.data)
+
+    def read(self, size=1):
+        data = bytes(self.data[:size])
+        del self.data[:size]
+        return data
+
+
+def feed(*frames):
+    return b"".join(b";".join(b"%.2f" % value for value in frame) + b"\r\n" for frame in frames)
+
+
+class SerialFrameReaderTest(unittest.TestCase):
+
+    def test_truncated_first_frame(self):
+        frames = [np.arange(13.0) + i for i in range(20)]
+        port = FakePort(feed(frames[0][:12], *frames))
+
+        reader = SerialFrameReader(port)
+        reader.receive()
+
+        self.assertEqual(reader.number_of_sensors, 13)
+        self.assertEqual(reader.frames_read, 20)
+        self.assertEqual(reader.malformed_frames, 1)
+        np.testing.assert_allclose(np.array(reader.frames), frames)
+
+    def test_frames_held_until_sensor_count_settles(self):
+        frames = [np.arange(13.0) + i for i in range(SENSOR_COUNT_FRAMES)]
+        port = FakePort(feed(*frames[:-1]))
+
+        reader = SerialFrameReader(port)
+        reader.receive()
+
+        self.assertIsNone(reader.number_of_sensors)
+        self.assertEqual(len(reader.frames), 0)
+
+        port.data += feed(frames[-1])
+        reader.receive()
+
+        self.assertEqual(reader.number_of_sensors, 13)
+        np.testing.assert_allclose(np.array(reader.frames), frames)
+
+    def test_given_sensor_count(self):
+        frames = [np.arange(13.0) + i for i in range(3)]
+        port = FakePort(feed(frames[0][:12], *frames) + b"1.0;2.")
+
+        reader = SerialFrameReader(port, number_of_sensors=13)
+        reader.receive()
+
+        self.assertEqual(reader.frames_read, 3)
+        self.assertEqual(reader.malformed_frames, 1)
+        np.testing.assert_allclose(np.array(reader.frames), frames)
+
+
+if __name__ == "__main__":
+    unittest.main()